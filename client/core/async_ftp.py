@@ -0,0 +1,495 @@
+"""
+Engine FTP bất đồng bộ (asyncio) để chạy nhiều phiên/transfer trong một tiến trình.
+
+Kênh điều khiển và kênh dữ liệu đều là asyncio stream, nên hàng trăm phiên
+chạy trên một event loop thay vì mỗi thao tác một thread. AsyncFTP có các
+lệnh chính giống FTP (connect, login, pwd/cwd, nlst/dir/entries, retr, stor,
+rename, delete); SyncFTP là lớp bọc đồng bộ của các lệnh chính đó cho script
+và test, chạy coroutine trên một event loop nền dùng chung cho mọi phiên.
+SyncFTP không có đủ các method mà FTPCommands/FTPHelpers dùng (resume, MODE Z,
+checksum, abort, ...) nên CLI và GUI vẫn chạy trên FTP.
+
+Mọi thao tác I/O có timeout (self.timeout). Nếu bị hủy (task.cancel()) hoặc
+hết thời gian giữa chừng, phiên bị đóng vì các phản hồi còn lại không thể ghép
+lại đúng lệnh được nữa.
+"""
+
+import asyncio
+import codecs
+import io
+import re
+import threading
+
+from .config import Config
+from .ftp_trace import tracer as wire_tracer, SENT, RECEIVED
+from .ftp_listing import parse_mlsd_line, parse_list_line
+from .ftp_features import Capabilities, feature_cache
+from .raw_socket_ftp import FTPError, FTPTempError, FTPPermError, FTPProtoError, MAXLINE
+
+_timeout = getattr(asyncio, 'timeout', None)
+
+_PASV_RE = re.compile(r'(\d+),(\d+),(\d+),(\d+),(\d+),(\d+)')
+_EPSV_RE = re.compile(r'\((.)\1\1(\d+)\1\)')
+
+# Trước Python 3.11, asyncio.wait_for raise asyncio.TimeoutError (khác lớp với TimeoutError)
+_TIMEOUTS = (TimeoutError, asyncio.TimeoutError)
+
+# Lỗi làm kênh điều khiển mất đồng bộ: đóng phiên thay vì dùng tiếp
+_FATAL = (asyncio.CancelledError, OSError, EOFError, FTPProtoError) + _TIMEOUTS
+
+
+class AsyncFTP:
+    """Một phiên FTP trên asyncio stream (chỉ passive mode)"""
+
+    def __init__(self, timeout=60, encoding='utf-8'):
+        self.host = None
+        self.port = 21
+        self.timeout = timeout
+        self.encoding = encoding
+        self.reader = None
+        self.writer = None
+        self.last_response = None
+        self.response_lines = []
+        self.features = None
+        # Tạo trong connect(), trên event loop chạy phiên: trước Python 3.10 Lock gắn
+        # với loop của thread tạo ra nó (SyncFTP tạo AsyncFTP ở thread của người gọi)
+        self.lock = None
+        self.tracer = wire_tracer
+        self.trace_id = wire_tracer.new_session_id()
+
+    # ---------- Kênh điều khiển ----------
+    async def _io(self, awaitable):
+        """Chờ một thao tác I/O với timeout của phiên"""
+        # asyncio.timeout (3.11+) không tạo task mới như wait_for
+        if _timeout is None:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        async with _timeout(self.timeout):
+            return await awaitable
+
+    async def _send_line(self, line):
+        data = (line + '\r\n').encode(self.encoding)
+        if self.tracer.level:
+            self.tracer.record(self.trace_id, SENT, data)
+        self.writer.write(data)
+        # Lệnh ngắn thường được ghi thẳng vào socket; chỉ chờ drain khi còn dữ liệu đệm
+        if self.writer.transport.get_write_buffer_size():
+            await self._io(self.writer.drain())
+
+    async def _recv_line(self):
+        try:
+            line = await self._io(self.reader.readline())
+        except ValueError:
+            raise FTPProtoError(f"got more than {MAXLINE} bytes")
+        if not line:
+            raise EOFError("Connection closed by server")
+        if self.tracer.level:
+            self.tracer.record(self.trace_id, RECEIVED, line)
+        return line.decode(self.encoding).rstrip('\r\n')
+
+    async def get_response(self):
+        """Nhận phản hồi (kể cả nhiều dòng), raise FTPTempError/FTPPermError với 4xx/5xx"""
+        resp = await self._recv_line()
+        lines = [resp]
+        if len(resp) >= 4 and resp[3] == '-':
+            code = resp[:3]
+            while True:
+                line = await self._recv_line()
+                lines.append(line)
+                if line.startswith(code + ' '):
+                    resp = line
+                    break
+        self.last_response = resp
+        self.response_lines = lines
+        if resp.startswith('4'):
+            raise FTPTempError(resp)
+        elif resp.startswith('5'):
+            raise FTPPermError(resp)
+        return resp
+
+    async def _command(self, cmd):
+        # Người gọi đã giữ self.lock
+        if self.writer is None:
+            raise FTPError("Not connected")
+        try:
+            await self._send_line(cmd)
+            return await self.get_response()
+        except _FATAL:
+            self.close()
+            raise
+
+    async def send_command(self, cmd):
+        """Gửi lệnh và nhận phản hồi"""
+        async with self.lock:
+            return await self._command(cmd)
+
+    voidcmd = send_command
+
+    # ---------- Phiên làm việc ----------
+    async def connect(self, host, port=21, timeout=None):
+        """Kết nối tới FTP server và đọc welcome message"""
+        if timeout is not None:
+            self.timeout = timeout
+        self.host = host
+        self.port = port
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        try:
+            self.reader, self.writer = await self._io(asyncio.open_connection(host, port, limit=MAXLINE))
+        except (OSError,) + _TIMEOUTS as e:
+            raise FTPError(f"Cannot connect to {host}:{port} - {e}")
+        async with self.lock:
+            try:
+                return await self.get_response()
+            except _FATAL:
+                self.close()
+                raise
+
+    async def login(self, user='anonymous', passwd='anonymous@'):
+        """Đăng nhập FTP server"""
+        async with self.lock:
+            resp = await self._command(f'USER {user}')
+            if resp.startswith('3'):  # Cần password
+                resp = await self._command(f'PASS {passwd}')
+            return resp
+
+    def close(self):
+        """Đóng kênh điều khiển mà không gửi QUIT"""
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    async def quit(self):
+        """Gửi QUIT rồi đóng phiên"""
+        if self.lock is None:
+            return None  # Chưa từng connect()
+        try:
+            async with self.lock:
+                return await self._command('QUIT')
+        except (FTPError, OSError, EOFError) + _TIMEOUTS:
+            return None
+        finally:
+            self.close()
+
+    # ---------- Thư mục và file ----------
+    async def pwd(self):
+        resp = await self.send_command('PWD')
+        match = re.search(r'"([^"]*)"', resp)
+        return match.group(1) if match else '/'
+
+    async def cwd(self, dirname):
+        return await self.send_command(f'CWD {dirname}')
+
+    async def mkd(self, dirname):
+        return await self.send_command(f'MKD {dirname}')
+
+    async def rmd(self, dirname):
+        return await self.send_command(f'RMD {dirname}')
+
+    async def delete(self, filename):
+        return await self.send_command(f'DELE {filename}')
+
+    async def rename(self, fromname, toname):
+        async with self.lock:
+            await self._command(f'RNFR {fromname}')
+            return await self._command(f'RNTO {toname}')
+
+    async def size(self, filename):
+        resp = await self.send_command(f'SIZE {filename}')
+        return int(resp[4:].strip())
+
+    async def feat(self):
+        """Capabilities của server (một lần cho mỗi phiên, dùng chung feature_cache với FTP)"""
+        async with self.lock:
+            return await self._feat()
+
+    async def _feat(self):
+        # Người gọi đã giữ self.lock
+        if self.features is None:
+            features = feature_cache.get(self.host, self.port)
+            if features is None:
+                try:
+                    await self._command('FEAT')
+                    features = Capabilities.parse(self.response_lines[1:-1])
+                except FTPPermError:
+                    features = Capabilities()  # Server không hỗ trợ FEAT
+                feature_cache.put(self.host, self.port, features)
+            self.features = features
+        return self.features
+
+    # ---------- Kênh dữ liệu ----------
+    async def _passive_address(self):
+        """EPSV (hoặc PASV nếu server không hỗ trợ), luôn kết nối tới địa chỉ kênh điều khiển
+
+        Lệnh đã dùng được được ghi vào Capabilities như FTP.make_pasv.
+        """
+        # Người gọi đã giữ self.lock
+        peer = self.writer.get_extra_info('peername')[0]
+        caps = await self._feat()
+        methods = ['EPSV', 'PASV']
+        if ':' in peer:
+            methods = ['EPSV']
+        elif caps.data_methods.get('passive') == 'PASV':
+            methods.reverse()
+        error = None
+        for method in methods:
+            try:
+                resp = await self._command(method)
+            except FTPPermError as e:
+                error = e
+                continue
+            match = (_EPSV_RE if method == 'EPSV' else _PASV_RE).search(resp)
+            if not match:
+                raise FTPProtoError(f"Invalid {method} response: {resp}")
+            if caps.data_methods.get('passive') != method:
+                caps.data_methods['passive'] = method
+                feature_cache.put(self.host, self.port, caps)
+            if method == 'EPSV':
+                return peer, int(match.group(2))
+            nums = [int(x) for x in match.groups()]
+            host = '.'.join(map(str, nums[:4])) if Config.PASV_TRUST_SERVER_ADDRESS else peer
+            return host, nums[4] * 256 + nums[5]
+        raise error
+
+    async def _open_data(self, cmd, rest=None):
+        # Người gọi đã giữ self.lock
+        host, port = await self._passive_address()
+        try:
+            reader, writer = await self._io(asyncio.open_connection(host, port))
+        except _FATAL:
+            self.close()
+            raise
+        try:
+            if rest:
+                await self._command(f'REST {rest}')
+            await self._command(cmd)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def retrbinary(self, cmd, callback, blocksize=65536, rest=None):
+        """Tải dữ liệu ở chế độ binary, gọi callback(block) cho mỗi block"""
+        async with self.lock:
+            reader, writer = await self._open_data(cmd, rest)
+            try:
+                while True:
+                    data = await self._io(reader.read(blocksize))
+                    if not data:
+                        break
+                    callback(data)
+            except BaseException:
+                writer.close()
+                self.close()
+                raise
+            writer.close()
+            try:
+                return await self.get_response()
+            except _FATAL:
+                self.close()
+                raise
+
+    async def retrieve(self, filename, rest=None):
+        """Tải cả file về bộ nhớ (bytes)"""
+        chunks = []
+        await self.retrbinary(f'RETR {filename}', chunks.append, rest=rest)
+        return b''.join(chunks)
+
+    async def storbinary(self, cmd, file_obj, blocksize=65536, rest=None):
+        """Upload từ file_obj (có read()) ở chế độ binary"""
+        async with self.lock:
+            reader, writer = await self._open_data(cmd, rest)
+            try:
+                while True:
+                    block = file_obj.read(blocksize)
+                    if not block:
+                        break
+                    writer.write(block)
+                    await self._io(writer.drain())
+                writer.close()
+                await self._io(writer.wait_closed())
+            except BaseException:
+                writer.close()
+                self.close()
+                raise
+            try:
+                return await self.get_response()
+            except _FATAL:
+                self.close()
+                raise
+
+    async def store(self, filename, data):
+        """Upload bytes thành file trên server"""
+        return await self.storbinary(f'STOR {filename}', io.BytesIO(data))
+
+    async def iter_lines(self, cmd, blocksize=65536):
+        """Async generator: từng dòng (khác rỗng) của kênh dữ liệu ngay khi nhận được
+
+        Giải mã tăng dần như FTP.iter_lines, nên bộ nhớ không phụ thuộc độ lớn
+        của danh sách. Phiên bị khóa cho tới khi generator kết thúc; nếu dừng
+        duyệt giữa chừng, phiên bị đóng vì phản hồi kết thúc không còn đọc đúng
+        lúc được nữa.
+        """
+        async with self.lock:
+            reader, writer = await self._open_data(cmd)
+            decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+            pending = ''
+            completed = False
+            try:
+                while True:
+                    data = await self._io(reader.read(blocksize))
+                    if not data:
+                        break
+                    lines = (pending + decoder.decode(data)).split('\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        line = line.rstrip('\r')
+                        if line:
+                            yield line
+                pending = (pending + decoder.decode(b'', final=True)).rstrip('\r')
+                if pending:
+                    yield pending
+                completed = True
+            finally:
+                writer.close()
+                if not completed:
+                    self.close()
+            try:
+                await self.get_response()
+            except _FATAL:
+                self.close()
+                raise
+
+    async def retrlines(self, cmd, callback=None):
+        """Chạy lệnh trả dữ liệu dạng dòng (LIST, NLST, MLSD)
+
+        Trả về danh sách dòng; nếu có callback thì gọi callback(line) cho từng
+        dòng khi nhận được (không giữ cả danh sách) và trả về None.
+        """
+        lines = []
+        async for line in self.iter_lines(cmd):
+            (callback or lines.append)(line)
+        return None if callback else lines
+
+    async def nlst(self, path=''):
+        return await self.retrlines(f'NLST {path}'.rstrip())
+
+    async def dir(self, path='', callback=None):
+        return await self.retrlines(f'LIST {path}'.rstrip(), callback)
+
+    async def entries(self, path=''):
+        """Danh sách RemoteEntry (MLSD nếu server hỗ trợ, ngược lại phân tích LIST)"""
+        if (await self.feat()).mlsd:
+            cmd, parse = f'MLSD {path}'.rstrip(), parse_mlsd_line
+        else:
+            cmd, parse = f'LIST {path}'.rstrip(), parse_list_line
+        result = []
+        async for line in self.iter_lines(cmd):
+            entry = parse(line)
+            if entry is None or entry.name in ('.', '..') or entry.type in ('cdir', 'pdir'):
+                continue
+            result.append(entry)
+        return result
+
+
+class LoopThread:
+    """Event loop chạy trên một thread nền, dùng chung cho mọi SyncFTP"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='ftp-asyncio', daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def background_loop():
+    """Event loop nền dùng chung (tạo khi cần lần đầu)"""
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = LoopThread()
+        return _loop_thread
+
+
+class SyncFTP:
+    """Lớp bọc đồng bộ của AsyncFTP, các lệnh chính có cùng tên method như FTP
+
+    Mọi phiên SyncFTP chạy trên cùng một event loop nền nên không tốn thêm
+    thread cho mỗi phiên.
+    """
+
+    def __init__(self, timeout=60, encoding='utf-8'):
+        self._runner = background_loop()
+        self.aftp = AsyncFTP(timeout, encoding)
+        self.passive_mode = True
+
+    def _run(self, coro):
+        return self._runner.run(coro)
+
+    @property
+    def last_response(self):
+        return self.aftp.last_response
+
+    def set_pasv(self, passive):
+        if not passive:
+            raise FTPError("Active mode is not supported by the asyncio engine")
+
+    def connect(self, host, port=21, timeout=60):
+        return self._run(self.aftp.connect(host, port, timeout))
+
+    def login(self, user='anonymous', passwd='anonymous@'):
+        return self._run(self.aftp.login(user, passwd))
+
+    def send_command(self, cmd):
+        return self._run(self.aftp.send_command(cmd))
+
+    voidcmd = send_command
+
+    def pwd(self):
+        return self._run(self.aftp.pwd())
+
+    def cwd(self, dirname):
+        return self._run(self.aftp.cwd(dirname))
+
+    def mkd(self, dirname):
+        return self._run(self.aftp.mkd(dirname))
+
+    def rmd(self, dirname):
+        return self._run(self.aftp.rmd(dirname))
+
+    def delete(self, filename):
+        return self._run(self.aftp.delete(filename))
+
+    def rename(self, fromname, toname):
+        return self._run(self.aftp.rename(fromname, toname))
+
+    def size(self, filename):
+        return self._run(self.aftp.size(filename))
+
+    def nlst(self, path=''):
+        return self._run(self.aftp.nlst(path))
+
+    def dir(self, path='', callback=None):
+        # callback chạy trên thread của event loop, ngay khi mỗi dòng tới
+        self._run(self.aftp.dir(path, callback or print))
+
+    def entries(self, path=''):
+        return self._run(self.aftp.entries(path))
+
+    def retrbinary(self, cmd, callback, blocksize=65536, rest=None):
+        return self._run(self.aftp.retrbinary(cmd, callback, blocksize, rest))
+
+    def storbinary(self, cmd, file_obj, blocksize=65536, rest=None):
+        return self._run(self.aftp.storbinary(cmd, file_obj, blocksize, rest))
+
+    def quit(self):
+        return self._run(self.aftp.quit())
+
+    def close(self):
+        self._runner.loop.call_soon_threadsafe(self.aftp.close)
@@ -16,5 +16,62 @@ class Config:
     LOG_FILE = 'ftp_client.log'    # Tên file log
     LOG_LEVEL = logging.INFO       # Mức độ log (DEBUG, INFO, WARNING, ERROR, CRITICAL)
 
+    # Cấu hình ghi vết kênh điều khiển (wire trace)
+    TRACE_LEVEL = 0                # 0 = tắt, 1 = chỉ lưu ring buffer, 2 = lưu và in ra màn hình
+    TRACE_RING_SIZE = 200          # Số dòng lệnh/phản hồi gần nhất được giữ lại
+
+    # Cấu hình truyền file
+    RESUME_DOWNLOADS = True        # Giữ file tải dở và tải tiếp bằng REST thay vì tải lại từ đầu
+    TRANSFER_RETRIES = 2           # Số lần thử lại khi truyền file bị lỗi giữa chừng
+    DOWNLOAD_USE_SPLICE = False    # Linux: chuyển dữ liệu socket -> file bằng os.splice (không qua bộ nhớ Python)
+    MODE_Z_LEVEL = 6               # Mức nén zlib (1-9) khi truyền ở MODE Z (lệnh 'mode z')
+    VERIFY_CHECKSUMS = False       # So checksum với server (HASH/XSHA256/XMD5/XCRC) sau mỗi lần truyền binary
+    HASH_QUEUE_BLOCKS = 64         # Số block tối đa chờ băm trên thread băm trước khi vòng lặp truyền phải đợi
+    DOWNLOAD_SEGMENTS = 4          # Số phiên song song khi tải một file lớn (1 = tắt tải phân đoạn)
+    SEGMENTED_DOWNLOAD_THRESHOLD = 64 * 1024 * 1024  # Chỉ tải phân đoạn với file từ kích thước này (byte)
+
+    # Cấu hình tinh chỉnh socket
+    CONTROL_TCP_NODELAY = True     # Tắt Nagle trên kênh điều khiển (lệnh ngắn, chờ phản hồi)
+    DATA_SOCKET_BUFFER = 4 * 1024 * 1024  # SO_RCVBUF/SO_SNDBUF cho kênh dữ liệu (0 = để hệ điều hành tự chỉnh)
+    BLOCK_SIZE_MIN = 64 * 1024     # Kích thước block đọc/ghi ban đầu của mỗi lần truyền
+    BLOCK_SIZE_MAX = 4 * 1024 * 1024  # Giới hạn trên khi tự tăng block theo thông lượng và RTT
+    FIXED_BLOCK_SIZE = None        # Số byte cố định cho mọi block (tắt tự điều chỉnh, dùng khi benchmark)
+
+    # Cấu hình kênh điều khiển
+    KEEPALIVE_INTERVAL = 60        # Gửi NOOP khi kênh điều khiển nhàn rỗi quá số giây này (0 = tắt)
+    AUTO_RECONNECT = True          # Tự kết nối, đăng nhập lại và khôi phục CWD/TYPE/MODE khi mất kết nối điều khiển
+    RECONNECT_ATTEMPTS = 5         # Số lần thử kết nối lại
+    RECONNECT_DELAY = 1.0          # Số giây chờ trước lần thử lại thứ hai (gấp đôi sau mỗi lần)
+    RECONNECT_DELAY_MAX = 30.0     # Giới hạn trên của thời gian chờ giữa hai lần thử
+    STAT_LISTING = True            # Server không có MLSD: liệt kê qua STAT trên kênh điều khiển khi nhanh hơn LIST
+    STAT_LISTING_MAX_ENTRIES = 500  # Thư mục nhiều mục hơn thì luôn liệt kê qua kênh dữ liệu
+    STAT_LISTING_PROBE = 20        # Cứ chừng này lần liệt kê thì đo lại cách đang chậm hơn (0 = không đo lại)
+
+    # Cấu hình thử lại lỗi tạm thời (4xx); số lần thử lại khi truyền file là TRANSFER_RETRIES
+    RETRY_CONTROL_ATTEMPTS = 2     # Số lần thử lại lệnh điều khiển bị lỗi 4xx
+    RETRY_LISTING_ATTEMPTS = 3     # Số lần thử lại lệnh liệt kê thư mục bị lỗi 4xx
+    RETRY_BASE_DELAY = 0.5         # Thời gian chờ tối đa (giây) trước lần thử lại đầu tiên, gấp đôi sau mỗi lần
+    RETRY_MAX_DELAY = 10.0         # Giới hạn trên của thời gian chờ (thời gian chờ thật là ngẫu nhiên từ 0)
+    RETRY_BUDGET_RATIO = 0.2       # Mỗi thao tác nạp thêm chừng này lượt thử lại vào ngân sách chung
+    RETRY_BUDGET_RESERVE = 10      # Số lượt thử lại tối đa tích lũy trong ngân sách (cũng là số lượt ban đầu)
+
+    # Cấu hình kênh dữ liệu
+    PASV_TRUST_SERVER_ADDRESS = False  # Kết nối tới địa chỉ trong phản hồi PASV thay vì địa chỉ của kênh điều khiển
+
+    # Cấu hình bộ nhớ đệm FEAT (khả năng của server) theo host:port
+    FEAT_CACHE_TTL = 3600          # Số giây kết quả FEAT được dùng lại cho các phiên sau (0 = luôn gửi FEAT)
+    FEAT_CACHE_FILE = None         # File JSON lưu cache qua các lần chạy (None = chỉ trong bộ nhớ)
+
+    # Cấu hình thống kê truyền file
+    STALL_THRESHOLD = 1.0          # Khoảng lặng (giây) giữa hai block được tính là một lần khựng
+    STATS_HISTORY = 100            # Số bản ghi thống kê gần nhất được giữ lại (lệnh stats)
+
+    # Cấu hình pool phiên FTP (dùng cho các thao tác đồng thời)
+    POOL_MIN_SESSIONS = 1          # Số phiên nhàn rỗi tối thiểu được giữ lại
+    POOL_MAX_SESSIONS = 4          # Số phiên tối đa tới mỗi server + tài khoản
+    POOL_IDLE_CHECK = 30           # Phiên nhàn rỗi quá số giây này được kiểm tra bằng NOOP trước khi dùng
+    POOL_IDLE_TIMEOUT = 300        # Phiên nhàn rỗi quá số giây này bị đóng (trừ min_size phiên)
+    POOL_LIMIT_COOLDOWN = 60       # Số giây sau lần 421 Too many connections cuối cùng thì pool trở lại max_size ban đầu
+
     # Cấu hình khác
     DOWNLOAD_DIR = os.path.join(os.getcwd(), 'downloads') # Thư mục mặc định để tải xuống
@@ -0,0 +1,176 @@
+"""
+Kiểm tra toàn vẹn file bằng checksum do server tính (HASH / XSHA256 / XSHA1 / XMD5 / XCRC).
+
+Dữ liệu được băm ngay trong lần truyền (không đọc lại file sau khi truyền):
+vòng lặp nhận/gửi chỉ đẩy từng block vào hàng đợi, BackgroundHasher băm trên
+một thread riêng (hashlib nhả GIL khi băm block lớn) nên việc băm chạy song
+song với I/O mạng. Sau khi truyền xong, digest cục bộ được so với digest server
+trả về cho lệnh mà server quảng bá trong FEAT.
+"""
+
+import hashlib
+import queue
+import re
+import threading
+import zlib
+
+from .config import Config
+from .raw_socket_ftp import FTPProtoError
+
+# Thuật toán theo thứ tự ưu tiên: (tên trong lệnh HASH, lệnh X*, số chữ số hex)
+ALGORITHMS = (
+    ('SHA-256', 'XSHA256', 64),
+    ('SHA-1', 'XSHA1', 40),
+    ('MD5', 'XMD5', 32),
+    ('CRC32', 'XCRC', 8),
+)
+
+
+class ChecksumError(FTPProtoError):
+    """Digest cục bộ khác digest server trả về"""
+
+
+class _CRC32:
+    """Giao diện giống hashlib cho zlib.crc32"""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+class Algorithm:
+    """Một cách lấy digest từ server: qua HASH (kèm OPTS HASH) hoặc qua lệnh X*"""
+
+    __slots__ = ('name', 'command', 'digits', 'select')
+
+    def __init__(self, name, command, digits, select=False):
+        self.name = name
+        self.command = command  # 'HASH' hoặc 'XSHA256', 'XMD5', ...
+        self.digits = digits
+        self.select = select    # Cần OPTS HASH <name> trước (server đang chọn thuật toán khác)
+
+    def new(self):
+        if self.name == 'CRC32':
+            return _CRC32()
+        return hashlib.new(self.name.replace('-', '').lower())
+
+    def __repr__(self):
+        return f"Algorithm({self.name!r}, {self.command!r})"
+
+
+def select_algorithm(features):
+    """Chọn thuật toán mạnh nhất mà server hỗ trợ theo FEAT, None nếu không có"""
+    offered = {}
+    if 'HASH' in features:
+        # 'HASH SHA-256*;SHA-1;MD5' - dấu * đánh dấu thuật toán đang được chọn
+        for item in features['HASH'].split(';'):
+            item = item.strip().upper()
+            if item:
+                offered[item.rstrip('*')] = item.endswith('*')
+    for name, command, digits in ALGORITHMS:
+        if name in offered:
+            return Algorithm(name, 'HASH', digits, select=not offered[name])
+        if command in features:
+            return Algorithm(name, command, digits)
+    return None
+
+
+def server_digest(ftp, path, algorithm):
+    """Hỏi server digest của path; trả về chuỗi hex thường"""
+    if algorithm.command == 'HASH':
+        commands = [f'OPTS HASH {algorithm.name}', f'HASH {path}'] if algorithm.select else [f'HASH {path}']
+        results = ftp.pipeline(commands)
+        for result in results:
+            if not result.ok:
+                raise result.error
+        resp = results[-1].response
+        # '213 SHA-256 0-1234 <digest> <path>'
+        fields = resp[4:].split(' ', 3)
+        if len(fields) < 3:
+            raise FTPProtoError(f"Invalid HASH response: {resp}")
+        return fields[2].lower()
+
+    resp = ftp.send_command(f'{algorithm.command} {path}')
+    # Các server trả khác nhau: '250 <digest>', '213 <digest>', '213 <path> <digest>', ...
+    pattern = r'[0-9A-Fa-f]{1,8}' if algorithm.name == 'CRC32' else r'[0-9A-Fa-f]{%d}' % algorithm.digits
+    for token in resp[4:].split():
+        if re.fullmatch(pattern, token):
+            return token.lower().zfill(algorithm.digits)
+    raise FTPProtoError(f"Invalid {algorithm.command} response: {resp}")
+
+
+class BackgroundHasher:
+    """Băm các block dữ liệu trên một thread riêng, theo đúng thứ tự được đẩy vào
+
+    update(data) chỉ đưa block vào hàng đợi (có giới hạn, nên vòng lặp truyền
+    bị chặn lại nếu việc băm tụt quá xa). Block phải là dữ liệu không bị ghi
+    đè sau đó (bytes); người gọi dùng buffer tái sử dụng thì phải sao chép.
+    """
+
+    def __init__(self, algorithm, max_pending=None):
+        self.algorithm = algorithm
+        self._hash = algorithm.new()
+        self._queue = queue.Queue(max_pending or Config.HASH_QUEUE_BLOCKS)
+        self._digest = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def update(self, data):
+        self._queue.put(data)
+
+    def update_file(self, path, length, blocksize=1024 * 1024):
+        """Băm length byte đầu của file cục bộ (phần đã có sẵn khi truyền tiếp)"""
+        self._queue.put((path, length, blocksize))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                if isinstance(item, tuple):
+                    self._hash_file(*item)
+                else:
+                    self._hash.update(item)
+            except Exception as e:
+                self._error = e
+
+    def _hash_file(self, path, length, blocksize):
+        with open(path, 'rb') as f:
+            while length > 0:
+                block = f.read(min(blocksize, length))
+                if not block:
+                    break
+                self._hash.update(block)
+                length -= len(block)
+
+    def close(self):
+        """Chờ thread băm xong mọi block đã đẩy vào (gọi nhiều lần cũng được)"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def hexdigest(self):
+        if self._digest is None:
+            self.close()
+            if self._error is not None:
+                raise self._error
+            self._digest = self._hash.hexdigest()
+        return self._digest
+
+
+def verify(ftp, path, hasher):
+    """So digest cục bộ với digest server; ném ChecksumError nếu khác nhau"""
+    local = hasher.hexdigest()
+    remote = server_digest(ftp, path, hasher.algorithm)
+    if local != remote:
+        raise ChecksumError(f"{hasher.algorithm.name} mismatch for {path}: local {local}, server {remote}")
+    return local
@@ -1,14 +1,21 @@
 import cmd
-from .raw_socket_ftp import FTP, all_errors, error_perm, error_temp, error_proto
+from .raw_socket_ftp import FTP, all_errors, error_perm, error_temp, error_proto, IDEMPOTENT_METHODS
 import os
 import glob
 import socket
 from .ftp_helpers import FTPHelpers
+from .ftp_pool import pool_for
+from .ftp_trace import tracer as wire_tracer
+from .ftp_stats import bus as stats_bus, TRANSFER, summarize, connect_latency_lines, rtt_histogram
+from .ftp_keepalive import Keepalive
+from .ftp_retry import policy_for, retry_summary
+from .ftp_checksum import select_algorithm
 from .virus_scan import VirusScan
 from .utils import Utils
 from .config import Config
 import logging
 import shlex
+import time
 
 class FTPCommands(cmd.Cmd):
     intro = "Welcome to FTP Client. Type 'help' or '?' to view commands.\n"
@@ -40,37 +47,77 @@ class FTPCommands(cmd.Cmd):
         try:
             # Đảm bảo chế độ passive được đặt đúng trước khi truyền dữ liệu
             is_data_transfer = func.__name__ in (
-                'nlst', 'retrbinary', 'retrlines', 'storbinary', 'storlines', 'dir'
+                'nlst', 'retrbinary', 'retrlines', 'storbinary', 'storlines', 'dir', 'entries', 'list_files'
             )
             if is_data_transfer:
                 self.ftp.set_pasv(self.passive_mode)
                 Utils.log_event(f"Set passive mode to {self.passive_mode} for {func.__name__}", level=logging.DEBUG)
 
-            return func(*args, **kwargs)
+            def attempt():
+                try:
+                    return func(*args, **kwargs)
+                except all_errors as e:
+                    # Mất kết nối: kết nối lại, khôi phục phiên rồi gọi lại lệnh chỉ đọc
+                    if not self._reconnect(e) or func.__name__ not in IDEMPOTENT_METHODS:
+                        raise
+                    return func(*args, **kwargs)
+
+            # Lỗi 4xx (lệnh chưa được thực hiện) được thử lại theo chính sách của loại thao tác
+            return policy_for(func.__name__).call(attempt)
         except error_perm as e:
             print(f"FTP permission error: {e}")
             Utils.log_event(f"FTP permission error: {e}", level=logging.ERROR)
+            self._dump_trace(e)
         except error_temp as e:
             print(f"FTP temporary error: {e}")
             Utils.log_event(f"FTP temporary error: {e}", level=logging.ERROR)
+            self._dump_trace(e)
         except error_proto as e:
             print(f"FTP protocol error: {e}")
             Utils.log_event(f"FTP protocol error: {e}", level=logging.ERROR)
+            self._dump_trace(e)
         except all_errors as e:
             print(f"FTP error: {e}")
             Utils.log_event(f"FTP error: {e}", level=logging.ERROR)
+            self._dump_trace(e)
         except socket.gaierror as e:
             print(f"Network error (address lookup): {e}")
             Utils.log_event(f"Network error (address lookup): {e}", level=logging.ERROR)
+            self._dump_trace(e)
             self.connected = False
             self.ftp = None
         except socket.error as e:
             print(f"Network error (socket): {e}")
             Utils.log_event(f"Network error (socket): {e}", level=logging.ERROR)
+            self._dump_trace(e)
             self.connected = False
             self.ftp = None
         return None
 
+    def _reconnect(self, error): # Kết nối lại khi kênh điều khiển bị mất; True nếu đã kết nối lại
+        if self.ftp is None or isinstance(error, error_perm) or self.ftp.connected or not self.ftp.auto_reconnect:
+            return False
+        print(f"Connection lost ({error}), reconnecting to {self.ftp.host}...")
+        try:
+            self.ftp.reconnect()
+        except all_errors as e:
+            print(f"Reconnect failed: {e}")
+            Utils.log_event(f"Reconnect to {self.ftp.host} failed: {e}", level=logging.ERROR)
+            return False
+        print(f"Reconnected. FTP directory: {self.ftp.state.get('CWD', '/')}")
+        Utils.log_event(f"Reconnected to {self.ftp.host} after: {error}", level=logging.WARNING)
+        return True
+
+    def _dump_trace(self, reason, last=10): # In các lệnh/phản hồi gần nhất khi có lỗi (nếu trace đang bật)
+        if not wire_tracer.level:
+            return
+        lines = wire_tracer.dump(last)
+        if lines:
+            print("Last FTP exchanges:")
+            for line in lines:
+                print(f"  {line}")
+        wire_tracer.dump_to_log(reason)
+
     def do_ls(self, args):
         """ls: Liệt kê các file và thư mục trên FTP server.
         Sử dụng: ls [đường_dẫn]
@@ -137,6 +184,40 @@ class FTPCommands(cmd.Cmd):
         if resp:
             print(f"Deleted file: {resp}")
 
+    def do_mdelete(self, args): # Xóa nhiều file trên FTP server, hỗ trợ wildcard (*).
+        """mdelete: Xóa nhiều file trên FTP server, hỗ trợ wildcard (*).
+        Sử dụng: mdelete <pattern>
+        """
+        if not args:
+            print("Please enter pattern.")
+            return
+        all_remote_file = self._ftp_cmd(self.ftp.nlst)
+        if all_remote_file is None:
+            return
+        import fnmatch
+        matching_files = [f for f in all_remote_file if fnmatch.fnmatch(f, args)]
+        if not matching_files:
+            print(f"No files matched the pattern \'{args}\'.")
+            return
+
+        if self.prompt_on_mget_mput:
+            confirm = input(f"Delete {len(matching_files)} file(s)? (y/n): ").lower().strip()
+            if confirm != 'y':
+                print("Skipped.")
+                return
+
+        # Gửi toàn bộ lệnh DELE theo pipeline, lỗi được báo riêng cho từng file
+        results = self._ftp_cmd(self.ftp.delete_many, matching_files)
+        if results is None:
+            return
+        deleted = 0
+        for result in results:
+            if result.ok:
+                deleted += 1
+            else:
+                print(f"Unable to delete {result.command[5:]}: {result.error}")
+        print(f"mdelete complete. Deleted {deleted} file(s).")
+
     def do_rename(self, args): # Đổi tên một file hoặc thư mục trên FTP server.
         """rename: Đổi tên một file hoặc thư mục trên FTP server.
         Sử dụng: rename <tên_cũ> <tên_mới>
@@ -185,7 +266,14 @@ class FTPCommands(cmd.Cmd):
         
         pattern = args
         try:
-            all_remote_file = self._ftp_cmd(self.ftp.nlst)
+            # Có MLSD: một lần liệt kê cho cả tên và kích thước (bỏ qua thư mục), không cần SIZE
+            caps = self._ftp_cmd(self.ftp.feat)
+            use_mlsd = bool(caps and caps.mlsd)
+            if use_mlsd:
+                sizes = self._ftp_cmd(self.ftp_helpers.list_files)
+                all_remote_file = list(sizes) if sizes is not None else None
+            else:
+                all_remote_file = self._ftp_cmd(self.ftp.nlst)
             if all_remote_file is None:
                 return 
             
@@ -201,6 +289,9 @@ class FTPCommands(cmd.Cmd):
 
             os.makedirs(Config.DOWNLOAD_DIR, exist_ok=True)
             download_count = 0
+            if not use_mlsd:
+                # Lấy kích thước tất cả file trong một lô SIZE pipeline thay vì từng lệnh một
+                sizes = self.ftp_helpers.remote_sizes(matching_files) if self.transfer_mode == 'binary' else {}
 
             for remote_file in matching_files:
                 local_file = os.path.join(Config.DOWNLOAD_DIR, os.path.basename(remote_file))
@@ -215,7 +306,8 @@ class FTPCommands(cmd.Cmd):
                         print(f"Skipped {remote_file}.")
                         continue
                 
-                if self.ftp_helpers._download_file(remote_file, local_file, self.transfer_mode):
+                if self.ftp_helpers._download_file(remote_file, local_file, self.transfer_mode,
+                                                   total_size=sizes.get(remote_file)):
                     print(f"Successfully downloaded {remote_file}.")
                     download_count += 1
                 else: 
@@ -228,7 +320,8 @@ class FTPCommands(cmd.Cmd):
 
     def do_put(self, args): # Tải 1 file từ máy cục bộ lên FTP server (phải qua quét virus trước).
         """put: Tải một file từ máy cục bộ lên FTP server (phải qua quét virus trước).
-        Sử dụng: put <tên_file_cục_bộ> [tên_file_từ_xa]
+        Sử dụng: put [--resume] <tên_file_cục_bộ> [tên_file_từ_xa]
+        --resume: upload tiếp phần còn thiếu nếu file trên server đang dở
         """
         if not args: 
             print("Please provide the local file name.")
@@ -240,7 +333,13 @@ class FTPCommands(cmd.Cmd):
         except ValueError:
             # Fallback to simple split if shlex fails
             args_list = args.split()
-            
+
+        resume = '--resume' in args_list
+        args_list = [a for a in args_list if a != '--resume']
+        if not args_list:
+            print("Please provide the local file name.")
+            return
+
         local_file = args_list[0]
         remote_file = args_list[1] if len(args_list) > 1 else os.path.basename(local_file)
 
@@ -253,7 +352,7 @@ class FTPCommands(cmd.Cmd):
 
         if is_clean:
             print(f"File {local_file} clean. Downloading...")
-            if self.ftp_helpers._upload_file(local_file, remote_file, self.transfer_mode):
+            if self.ftp_helpers._upload_file(local_file, remote_file, self.transfer_mode, resume=resume):
                 print(f"Successfully uploaded {local_file} to {remote_file}.")
             else: 
                 print(f"Unable to upload {local_file}.")
@@ -350,6 +449,101 @@ class FTPCommands(cmd.Cmd):
         self.transfer_mode = 'binary'
         print("Switched to Binary mode.")
 
+    def do_mode(self, args): # Chọn chế độ truyền trên kênh dữ liệu: stream hoặc nén deflate (MODE Z).
+        """mode: Chọn chế độ truyền trên kênh dữ liệu.
+        Sử dụng: mode             - xem chế độ hiện tại
+                 mode s           - stream mode (không nén)
+                 mode z [level]   - nén deflate (MODE Z, level 1-9) nếu server hỗ trợ
+        """
+        if not self.connected:
+            self.not_connected()
+            return
+        args = args.split()
+        if not args:
+            print(f"Data transfer mode: {'Z (deflate)' if self.ftp.compressed else 'S (stream)'}")
+            return
+        mode = args[0].upper()
+        level = None
+        if mode not in ('S', 'Z') or len(args) > 2:
+            print("Use: mode [s|z [level]]")
+            return
+        if len(args) > 1:
+            try:
+                level = int(args[1])
+            except ValueError:
+                level = 0
+            if not 1 <= level <= 9:
+                print("Compression level must be 1-9.")
+                return
+        ok = self._ftp_cmd(self.ftp.set_mode, mode, level)
+        if ok is False:
+            print("Server does not support MODE Z; staying in stream mode.")
+        elif ok:
+            print("Switched to MODE Z (deflate)." if mode == 'Z' else "Switched to stream mode.")
+
+    def do_verify(self, args): # Bật/tắt kiểm tra checksum với server sau mỗi lần truyền file.
+        """verify: Bật/tắt kiểm tra checksum (HASH/XSHA256/XMD5/XCRC) cho get/put/mget/mput/getdir/putdir.
+        Sử dụng: verify            - xem trạng thái hiện tại
+                 verify on|off     - bật/tắt (file sai checksum được truyền lại)
+        """
+        args = args.split()
+        if args and args[0].lower() in ('on', 'off'):
+            Config.VERIFY_CHECKSUMS = args[0].lower() == 'on'
+        elif args:
+            print("Use: verify [on|off]")
+            return
+        print(f"Checksum verification: {'ON' if Config.VERIFY_CHECKSUMS else 'OFF'}")
+        features = self._ftp_cmd(self.ftp.feat) if Config.VERIFY_CHECKSUMS and self.connected else None
+        if features is not None:
+            algorithm = select_algorithm(features)
+            if algorithm is None:
+                print("Server offers no checksum command; transfers will not be verified.")
+            else:
+                print(f"Using {algorithm.name} via {algorithm.command}.")
+
+    def do_feat(self, args): # Hiển thị các tính năng server hỗ trợ (FEAT, có cache theo host:port).
+        """feat: Hiển thị các tính năng server quảng bá trong FEAT.
+        Sử dụng: feat            - dùng kết quả đã cache (nếu còn hạn)
+                 feat refresh    - gửi FEAT lại và cập nhật cache
+        """
+        if not self.connected:
+            self.not_connected()
+            return
+        refresh = args.strip().lower() == 'refresh'
+        caps = self._ftp_cmd(self.ftp.feat, refresh)
+        if caps is None:
+            return
+        if not caps:
+            print("Server advertises no features (FEAT not supported).")
+            return
+        age = time.time() - caps.fetched
+        print(f"Server features ({'fetched now' if age < 1 else f'cached {age:.0f} s ago'}):")
+        for line in caps.describe():
+            print(f"  {line}")
+
+    def do_stats(self, args): # Hiển thị thống kê các lần truyền file gần nhất.
+        """stats: Hiển thị thống kê các lần truyền file gần nhất (thông lượng, ttfb, khựng, thử lại).
+        Sử dụng: stats [n]     - in n lần truyền gần nhất (mặc định 10) và dòng tổng hợp
+                 stats clear   - xóa lịch sử thống kê
+        """
+        args = args.split()
+        if args and args[0].lower() == 'clear':
+            stats_bus.clear(TRANSFER)
+            print("Transfer statistics cleared.")
+            return
+        try:
+            last = int(args[0]) if args else 10
+        except ValueError:
+            print("Use: stats [n|clear]")
+            return
+        records = stats_bus.recent(TRANSFER)
+        if not records:
+            print("No transfers recorded yet.")
+            return
+        for record in records[-last:]:
+            print(record.summary())
+        print(summarize(records))
+
     def do_status(self, args): # Hiển thị trạng thái kết nối hiện tại và các chế độ truyền.
         """status: Hiển thị trạng thái kết nối hiện tại và các chế độ truyền.
         Sử dụng: status
@@ -357,6 +551,14 @@ class FTPCommands(cmd.Cmd):
         if self.connected:
             print("Connection status: Connected.")
             print(f"Host: {self.ftp.host}, Port: {self.ftp.port}")
+            if self.ftp.connect_timing is not None:
+                print(f"Session setup: {self.ftp.connect_timing.phases()}")
+            if self.ftp.keepalive is not None:
+                print(f"Keepalive: {self.ftp.keepalive.describe()}")
+            if self.ftp.reconnects:
+                print(f"Reconnects: {self.ftp.reconnects}")
+            if self.ftp.features is not None and self.ftp.features.listing_times:
+                print(f"Directory listing: {self.ftp.features.describe_listing()}")
             print(f"Current local directory: {self.current_local_dir}")
             try:
                 print(f"Current FTP directory: {self.ftp.pwd()}")
@@ -367,7 +569,18 @@ class FTPCommands(cmd.Cmd):
         mode = 'ON' if self.prompt_on_mget_mput else 'OFF'
         print(f"Confirmation mode (prompt) for mget/mput: {mode}")
         print(f"File transfer mode: {self.transfer_mode}")
+        if self.connected:
+            print(f"Data transfer mode: {'Z (deflate)' if self.ftp.compressed else 'S (stream)'}")
+        print(f"Checksum verification: {'ON' if Config.VERIFY_CHECKSUMS else 'OFF'}")
+        print(f"Retries: {retry_summary()}")
         print(f"Passive FTP mode: {mode}")
+        latency = connect_latency_lines()
+        if latency:
+            print("Session setup latency (all sessions):")
+            for line in latency:
+                print(f"  {line}")
+        if rtt_histogram.count:
+            print(f"Control channel RTT (all sessions): {rtt_histogram.summary()}")
 
     def do_passive(self, args): # Bật/tắt chế độ passive FTP.
         """passive: Bật/tắt chế độ passive FTP.
@@ -379,6 +592,45 @@ class FTPCommands(cmd.Cmd):
         if self.connected:
             self._ftp_cmd(self.ftp.set_pasv, self.passive_mode)
     
+    def do_trace(self, args): # Bật/tắt ghi vết lệnh và phản hồi trên kênh điều khiển.
+        """trace: Bật/tắt ghi vết lệnh/phản hồi FTP trên kênh điều khiển.
+        Sử dụng: trace [off|ring|on]   - đặt mức ghi vết (ring: chỉ lưu để dump khi lỗi)
+                 trace dump [n]        - in n dòng gần nhất trong ring buffer
+                 trace size <n>        - đổi kích thước ring buffer
+                 trace clear           - xóa ring buffer
+        """
+        args = args.split()
+        if not args:
+            print(f"Wire trace: {wire_tracer.level_name()} (ring buffer {len(wire_tracer.ring)}/{wire_tracer.ring.maxlen})")
+            return
+        action = args[0].lower()
+        if action == 'dump':
+            try:
+                last = int(args[1]) if len(args) > 1 else None
+            except ValueError:
+                print("Use: trace dump [n]")
+                return
+            lines = wire_tracer.dump(last)
+            for line in lines:
+                print(line)
+            if not lines:
+                print("Trace ring buffer is empty.")
+        elif action == 'size':
+            try:
+                wire_tracer.resize(int(args[1]))
+            except (IndexError, ValueError):
+                print("Use: trace size <n>")
+                return
+            print(f"Trace ring buffer size: {wire_tracer.ring.maxlen}")
+        elif action == 'clear':
+            wire_tracer.clear()
+            print("Trace ring buffer cleared.")
+        elif action in ('off', 'ring', 'on'):
+            wire_tracer.set_level(action)
+            print(f"Wire trace: {action}")
+        else:
+            print("Use: trace [off|ring|on|dump [n]|size <n>|clear]")
+
     def do_help(self, args): # Hiển thị danh sách lệnh và hướng dẫn sử dụng.
         """help: Hiển thị danh sách lệnh và hướng dẫn sử dụng.
         Sử dụng: help [lệnh]
@@ -426,10 +678,12 @@ class FTPCommands(cmd.Cmd):
             login_resp = self.ftp.login(user, password)
             print(login_resp)
             self.connected = True
-            self.ftp_helpers = FTPHelpers(self.ftp)
             self.current_ftp_dir = self.ftp.pwd()
             print(f"Successfully connected to {host}. Logged in with user: {user}")
             self.ftp.set_pasv(self.passive_mode)
+            # Các phiên phụ (tải phân đoạn, ...) được mượn từ pool thay vì đăng nhập lại mỗi lần
+            self.ftp_helpers = FTPHelpers(self.ftp, pool=pool_for(self.ftp))
+            Keepalive(self.ftp).start()  # NOOP khi phiên nhàn rỗi, dừng khi close
         except all_errors as e:
             print(f"Error connected with FTP: {e}")
             Utils.log_event(f"Error connected to {host}:{port}: {e}", level=logging.ERROR)
@@ -448,6 +702,8 @@ class FTPCommands(cmd.Cmd):
         if not self.connected: 
             print("Not connected.")
             return
+        if self.ftp_helpers and self.ftp_helpers.pool:
+            self.ftp_helpers.pool.close()
         resp = self._ftp_cmd(self.ftp.quit)
         if resp: 
             print(resp)
@@ -577,29 +833,21 @@ class FTPCommands(cmd.Cmd):
             print(f"Error: Unable to access remote directory {remote_path}: {e}")
             Utils.log_event(f"Error: Unable to access remote directory {remote_path}: {e}", level=logging.ERROR)
 
-        items = []
-        self._ftp_cmd(self.ftp.dir, items.append) 
-
-        for line in items:
-            parts = line.split(maxsplit=8)
-            if len(parts) < 9:
-                continue
-            
-            permissions = parts[0]
-            item_name = parts[8]
-
-            if item_name in (".", ".."): 
-                continue
+        # MLSD (hoặc LIST đã phân tích) cho sẵn loại và kích thước, không cần SIZE cho từng file
+        entries = self._ftp_cmd(self.ftp.entries) or []
 
+        for entry in entries:
+            item_name = entry.name
             remote_item_path = item_name
             local_item_path = os.path.join(local_path, item_name)
 
-            if permissions.startswith("d"):
+            if entry.is_dir:
                 print(f"  Processing subdirectory: {remote_item_path}")
                 self._recursive_download(remote_item_path, local_item_path)
             else: 
                 print(f"  Downloading file: {remote_item_path}")
-                if self.ftp_helpers._download_file(remote_item_path, local_item_path, self.transfer_mode):
+                if self.ftp_helpers._download_file(remote_item_path, local_item_path, self.transfer_mode,
+                                                   total_size=entry.size if entry.is_file else None):
                     print(f"  Successfully downloaded {item_name}")  
                 else:  
                     print(f"  Unable to download {item_name}")
@@ -637,6 +885,18 @@ class FTPCommands(cmd.Cmd):
     def nlst(self):
         return self.ftp.nlst()
 
+    def iter_nlst(self, *args):
+        return self.ftp.iter_nlst(*args)
+
+    def iter_dir(self, path=None):
+        return self.ftp.iter_dir(path)
+
+    def iter_entries(self, path=None):
+        return self.ftp.list_entries(path)
+
+    def entries(self, path=None):
+        return self.ftp.entries(path)
+
     def dir(self, *args, **kwargs):
         return self.ftp.dir(*args, **kwargs)
 
@@ -652,6 +912,18 @@ class FTPCommands(cmd.Cmd):
     def rename(self, old, new):
         return self.ftp.rename(old, new)
 
+    def size(self, filename):
+        return self.ftp.size(filename)
+
+    def size_many(self, filenames):
+        return self.ftp.size_many(filenames)
+
+    def delete_many(self, filenames):
+        return self.ftp.delete_many(filenames)
+
+    def rename_many(self, pairs):
+        return self.ftp.rename_many(pairs)
+
     def set_pasv(self, passive):
         return self.ftp.set_pasv(passive)
 
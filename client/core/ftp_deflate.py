@@ -0,0 +1,80 @@
+"""
+MODE Z: nén dữ liệu trên kênh dữ liệu bằng deflate (zlib).
+
+Sau lệnh MODE Z, mọi lần truyền dữ liệu (RETR, STOR, LIST, ...) là một luồng
+zlib riêng: bên gửi nén, bên nhận giải nén. DeflateSocket bọc socket dữ liệu
+với cùng các method mà vòng lặp truyền đang dùng (recv, recv_into, sendall,
+close), nên retrbinary/storbinary/iter_lines không cần biết dữ liệu có nén
+hay không. Đường zero-copy (sendfile, splice) không dùng được với MODE Z.
+"""
+
+import zlib
+
+from .config import Config
+
+# Số byte nén đọc từ socket mỗi lần
+RAW_BLOCK = 65536
+
+
+class DeflateSocket:
+    """Socket dữ liệu cho MODE Z: nén khi gửi, giải nén khi nhận
+
+    wire_bytes đếm số byte thực sự đi qua mạng (đã nén), để so với số byte
+    dữ liệu gốc mà người gọi nhận/gửi.
+    """
+
+    def __init__(self, sock, level=None):
+        self.sock = sock
+        self.level = level or Config.MODE_Z_LEVEL
+        self.wire_bytes = 0
+        self._compressor = None
+        self._decompressor = zlib.decompressobj()
+        self._tail = b''
+        self._eof = False
+
+    def __getattr__(self, name):
+        # settimeout, getsockopt, fileno, ... đi thẳng tới socket gốc
+        return getattr(self.sock, name)
+
+    def sendall(self, data):
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(self.level)
+        self._send_raw(self._compressor.compress(data))
+
+    def _send_raw(self, data):
+        if data:
+            self.sock.sendall(data)
+            self.wire_bytes += len(data)
+
+    def recv(self, bufsize):
+        """Trả về tối đa bufsize byte đã giải nén, b'' khi hết luồng"""
+        while not self._eof:
+            if self._tail:
+                data = self._decompressor.decompress(self._tail, bufsize)
+                self._tail = self._decompressor.unconsumed_tail
+            else:
+                raw = self.sock.recv(RAW_BLOCK)
+                if not raw:
+                    self._eof = True
+                    return self._decompressor.flush()
+                self.wire_bytes += len(raw)
+                data = self._decompressor.decompress(raw, bufsize)
+                self._tail = self._decompressor.unconsumed_tail
+            if data:
+                return data
+        return b''
+
+    def recv_into(self, buffer, nbytes=0):
+        data = self.recv(nbytes or len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        # Kết thúc luồng zlib của lần upload trước khi đóng kết nối dữ liệu
+        if self._compressor is not None:
+            compressor, self._compressor = self._compressor, None
+            try:
+                self._send_raw(compressor.flush())
+            except OSError:
+                pass
+        self.sock.close()
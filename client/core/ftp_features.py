@@ -0,0 +1,194 @@
+"""
+Khả năng của server theo FEAT và bộ nhớ đệm FEAT theo host:port.
+
+FEAT được phân tích thành Capabilities (một dict {TÊN: tham số} như trước, kèm
+các thuộc tính mlsd, size, mdtm, rest_stream, epsv, utf8, mode_z, hash_algorithms)
+để các lớp trên chọn đường lệnh nhanh nhất mà server hỗ trợ. Kết quả được giữ
+trong feature_cache theo host:port (trong bộ nhớ, và trên đĩa nếu đặt
+Config.FEAT_CACHE_FILE) trong Config.FEAT_CACHE_TTL giây, nên các phiên sau và
+các phiên trong pool không phải gửi FEAT lại. Capabilities cũng ghi nhớ lệnh mở
+kênh dữ liệu đã dùng được (EPSV/PASV, EPRT/PORT) để lần sau dùng thẳng, và thời
+gian liệt kê thư mục qua STAT và qua kênh dữ liệu để chọn cách nhanh hơn.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from .config import Config
+
+
+class Capabilities(dict):
+    """Các tính năng server quảng bá trong FEAT: {TÊN_TÍNH_NĂNG: tham số}"""
+
+    def __init__(self, features=(), fetched=None, data_methods=None, listing_times=None):
+        super().__init__(features)
+        self.fetched = time.time() if fetched is None else fetched
+        # {'passive': 'EPSV' | 'PASV', 'active': 'EPRT' | 'PORT'}: lệnh đã dùng được trên server này
+        self.data_methods = dict(data_methods or {})
+        # {'STAT' | 'DATA': số giây trung bình một lần liệt kê}; 'STAT': None = server không liệt kê qua STAT
+        self.listing_times = dict(listing_times or {})
+
+    @classmethod
+    def parse(cls, lines):
+        """Phân tích các dòng giữa '211-' và '211 End' của phản hồi FEAT"""
+        features = {}
+        for line in lines:
+            name, _, params = line.strip().partition(' ')
+            if name:
+                features[name.upper()] = params.strip()
+        return cls(features)
+
+    def supports(self, name):
+        return name.upper() in self
+
+    def _params(self, name):
+        return self.get(name, '').upper().split()
+
+    @property
+    def mlsd(self):
+        """MLSD/MLST: liệt kê có sẵn loại, kích thước, thời gian trong một lần"""
+        return 'MLST' in self
+
+    @property
+    def size(self):
+        return 'SIZE' in self
+
+    @property
+    def mdtm(self):
+        return 'MDTM' in self
+
+    @property
+    def rest_stream(self):
+        """REST dùng được với STOR/RETR ở stream mode (tải tiếp, tải phân đoạn)"""
+        return 'REST' in self and (not self['REST'] or 'STREAM' in self._params('REST'))
+
+    @property
+    def epsv(self):
+        return 'EPSV' in self
+
+    @property
+    def utf8(self):
+        return 'UTF8' in self
+
+    @property
+    def mode_z(self):
+        return 'Z' in self._params('MODE')
+
+    @property
+    def mlst_facts(self):
+        """Các fact MLST server hỗ trợ (bỏ dấu * đánh dấu fact đang bật)"""
+        return [fact.rstrip('*').lower() for fact in self.get('MLST', '').split(';') if fact]
+
+    @property
+    def hash_algorithms(self):
+        return [name.strip().rstrip('*').upper() for name in self.get('HASH', '').split(';') if name.strip()]
+
+    def describe_listing(self):
+        """Thời gian liệt kê thư mục đã đo theo từng cách, để in ra lệnh status ('' nếu chưa đo)"""
+        parts = []
+        for method, label in (('STAT', 'STAT'), ('DATA', 'data channel')):
+            if method in self.listing_times:
+                seconds = self.listing_times[method]
+                parts.append(f"{label} unsupported" if seconds is None else f"{label} {seconds * 1000:.1f} ms")
+        return ', '.join(parts)
+
+    def describe(self):
+        """Một dòng cho mỗi tính năng, để in ra CLI"""
+        return [f"{name} {params}".rstrip() for name, params in sorted(self.items())]
+
+
+class FeatureCache:
+    """Bộ nhớ đệm Capabilities theo (host, port), có TTL và tùy chọn lưu ra file JSON
+
+    ttl/path = None: đọc Config.FEAT_CACHE_TTL / Config.FEAT_CACHE_FILE mỗi lần
+    dùng. File được đọc một lần khi cần và ghi lại (thay nguyên file) sau mỗi put.
+    """
+
+    def __init__(self, ttl=None, path=None):
+        self.ttl = ttl
+        self.path = path
+        self._entries = {}
+        self._loaded_path = None
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        ttl = Config.FEAT_CACHE_TTL if self.ttl is None else self.ttl
+        path = Config.FEAT_CACHE_FILE if self.path is None else self.path
+        return ttl, path
+
+    @staticmethod
+    def _key(host, port):
+        return f"{host}:{port}"
+
+    def get(self, host, port):
+        """Capabilities còn hạn của host:port, None nếu chưa có hoặc đã hết hạn"""
+        ttl, path = self._settings()
+        if not ttl or host is None:
+            return None
+        key = self._key(host, port)
+        with self._lock:
+            if path and self._loaded_path != path:
+                self._load(path)
+            caps = self._entries.get(key)
+            if caps is not None and time.time() - caps.fetched > ttl:
+                del self._entries[key]
+                caps = None
+            return caps
+
+    def put(self, host, port, caps):
+        ttl, path = self._settings()
+        if not ttl or host is None:
+            return
+        with self._lock:
+            if path and self._loaded_path != path:
+                self._load(path)
+            self._entries[self._key(host, port)] = caps
+            if path:
+                self._save(path)
+
+    def invalidate(self, host, port):
+        _, path = self._settings()
+        with self._lock:
+            if self._entries.pop(self._key(host, port), None) is not None and path:
+                self._save(path)
+
+    def clear(self):
+        """Xóa cache trong bộ nhớ (file trên đĩa được đọc lại ở lần get sau)"""
+        with self._lock:
+            self._entries.clear()
+            self._loaded_path = None
+
+    def _load(self, path):
+        self._loaded_path = path
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable FEAT cache {path}: {e}")
+            return
+        for key, entry in data.items():
+            # Mục trong bộ nhớ (mới hơn) được giữ nguyên
+            if key not in self._entries:
+                self._entries[key] = Capabilities(entry.get('features', {}), entry.get('fetched', 0),
+                                                  entry.get('data_methods'), entry.get('listing_times'))
+
+    def _save(self, path):
+        data = {key: {'fetched': caps.fetched, 'features': dict(caps), 'data_methods': caps.data_methods,
+                      'listing_times': caps.listing_times}
+                for key, caps in self._entries.items()}
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.warning(f"Cannot write FEAT cache {path}: {e}")
+
+
+# Cache dùng chung cho mọi phiên trong tiến trình
+feature_cache = FeatureCache()
@@ -1,108 +1,413 @@
-from .raw_socket_ftp import FTP 
+from .raw_socket_ftp import FTP, FTPError, FTPPermError, FTPProtoError, FTPAbortedError
+from .ftp_segmented import SegmentedDownload, mark_unfinished, is_unfinished, clear_marker
+from .ftp_stats import TransferStats, TRANSFER, bus
+from .ftp_checksum import BackgroundHasher, ChecksumError, select_algorithm, verify
+from .ftp_retry import retry_budget, retry_policies
 import os
 from .utils import Utils
 from .config import Config
 import logging
 
 class FTPHelpers:
-    def __init__(self, ftp_connection, root=None):
+    def __init__(self, ftp_connection, root=None, pool=None):
         self.ftp = ftp_connection
         self.root = root
+        self.pool = pool  # SessionPool cho các phiên phụ (tải phân đoạn), None = mở phiên riêng
 
-    def _download_file(self, remote_path, local_path, transfer_mode, progress_callback=None):
+    def _use_mlst_for_size(self):
+        """Server không quảng bá SIZE nhưng có MLST: lấy kích thước qua MLST (SIZE chắc chắn bị từ chối)"""
+        caps = self.ftp.feat()
+        return not caps.size and caps.mlsd
+
+    def remote_size(self, remote_path):
+        """Kích thước một file từ xa qua SIZE, hoặc MLST nếu server chỉ hỗ trợ MLST"""
+        if self._use_mlst_for_size():
+            return self.ftp.mlst(remote_path).size
+        return self.ftp.size(remote_path)
+
+    def remote_sizes(self, remote_paths):
+        """Lấy kích thước nhiều file bằng một lô lệnh SIZE pipeline (None nếu không lấy được)"""
+        remote_paths = list(remote_paths)
+        if not remote_paths:
+            return {}
+        try:
+            if self._use_mlst_for_size():
+                sizes = {}
+                for path in remote_paths:
+                    try:
+                        sizes[path] = self.ftp.mlst(path).size
+                    except (FTPPermError, FTPProtoError):
+                        sizes[path] = None
+                return sizes
+            return self.ftp.size_many(remote_paths)
+        except Exception as e:
+            Utils.log_event(f"Error while fetching remote sizes: {e}", level=logging.WARNING)
+            return dict.fromkeys(remote_paths)
+
+    def list_files(self, path=None):
+        """{tên: kích thước hoặc None} của các file trong thư mục từ xa
+
+        Có MLSD thì một lần liệt kê cho cả tên, loại và kích thước (bỏ qua thư
+        mục); không thì NLST rồi một lô SIZE pipeline.
+        """
+        if self.ftp.feat().mlsd:
+            return {entry.name: entry.size for entry in self.ftp.list_entries(path) if entry.is_file}
+        names = self.ftp.nlst(path) if path else self.ftp.nlst()
+        return self.remote_sizes(names)
+
+    def _recover(self, error):
+        """Sau một lần truyền lỗi: kết nối lại phiên chính nếu kênh điều khiển đã hỏng
+
+        Lần thử sau tải/gửi tiếp từ offset như bình thường. False nếu không kết
+        nối lại được (không thử lại nữa).
+        """
+        if isinstance(error, (FTPPermError, FTPAbortedError)) or not self.ftp.auto_reconnect:
+            return True
+        try:
+            if self.ftp.ensure_connected():
+                Utils.log_event(f"Reconnected to {self.ftp.host} after: {error}", level=logging.WARNING)
+        except FTPError as e:
+            Utils.log_event(f"Giving up, cannot reconnect: {e}", level=logging.ERROR)
+            return False
+        return True
+
+    def _retry(self, record, attempt):
+        """Chờ backoff trước lần thử lại kế tiếp; False nếu hết lượt hoặc hết ngân sách thử lại"""
+        policy = retry_policies['transfer']
+        if not policy.allow(attempt):
+            return False
+        record.retry_wait += policy.backoff(attempt)
+        return True
+
+    def _resume_offset(self, remote_path, local_path, total_size):
+        """Offset để tải tiếp từ file cục bộ tải dở (0 = tải lại từ đầu)
+
+        File cục bộ chỉ được dùng lại khi không lớn hơn file từ xa và file từ xa
+        không bị sửa sau khi file cục bộ được ghi (so MDTM với mtime cục bộ),
+        File đủ kích thước mà còn file đánh dấu là file đã cấp phát trước của
+        một lần tải bị dừng đột ngột (chưa kịp truncate): không tin, tải lại.
+        """
+        if total_size is None or not os.path.isfile(local_path):
+            return 0
+        local_size = os.path.getsize(local_path)
+        if local_size == 0 or local_size > total_size:
+            return 0
+        if local_size == total_size and is_unfinished(local_path):
+            Utils.log_event(f"{local_path} is left preallocated by an interrupted download, restarting",
+                            level=logging.WARNING)
+            return 0
+        remote_mtime = None  # Server không hỗ trợ MDTM: chỉ dựa vào kích thước
+        if self.ftp.feat().mdtm:
+            try:
+                remote_mtime = self.ftp.mdtm(remote_path)
+            except Exception:
+                pass
+        if remote_mtime is not None and remote_mtime > os.path.getmtime(local_path):
+            Utils.log_event(f"Remote file {remote_path} changed since the partial download, restarting",
+                            level=logging.WARNING)
+            return 0
+        return local_size
+
+    def _use_segments(self, offset, total_size, segments):
+        """Có tải phân đoạn song song không: file đủ lớn, tải từ đầu và server hỗ trợ REST
+
+        Không dùng khi phiên đang ở MODE Z: các phiên phụ truyền không nén.
+        """
+        if offset or segments <= 1 or total_size is None or total_size < Config.SEGMENTED_DOWNLOAD_THRESHOLD:
+            return False
+        if self.ftp.compressed:
+            return False
+        return self.ftp.user is not None and self.ftp.feat().rest_stream
+
+    def _collect(self, record, before):
+        """Gộp số liệu kết nối dữ liệu của lần thử vừa xong (nếu nó đã mở kết nối dữ liệu)"""
+        if self.ftp.last_transfer is not before:
+            record.add_attempt(self.ftp.last_transfer)
+
+    def _checksum_algorithm(self):
+        """Thuật toán checksum dùng để kiểm tra file (None = không kiểm tra)"""
+        if not Config.VERIFY_CHECKSUMS:
+            return None
+        algorithm = select_algorithm(self.ftp.feat())
+        if algorithm is None:
+            Utils.log_event("Server offers no checksum command (HASH/XSHA256/XMD5/XCRC), transfers are not verified",
+                            level=logging.WARNING)
+        return algorithm
+
+    def _hasher(self, algorithm, local_path, offset):
+        """BackgroundHasher cho một lần truyền; offset byte đầu (đã có sẵn) được băm từ file cục bộ"""
+        if algorithm is None:
+            return None
+        hasher = BackgroundHasher(algorithm)
+        if offset:
+            hasher.update_file(local_path, offset)
+        return hasher
+
+    def _verify(self, remote_path, hasher, record):
+        """Đối chiếu digest với server; chỉ ChecksumError (nội dung khác) làm lần truyền thất bại"""
+        try:
+            digest = verify(self.ftp, remote_path, hasher)
+        except ChecksumError:
+            raise
+        except FTPError as e:
+            Utils.log_event(f"Could not verify {remote_path} with the server: {e}", level=logging.WARNING)
+            return
+        record.checksum = hasher.algorithm.name
+        Utils.log_event(f"{hasher.algorithm.name} of {remote_path} matches the server: {digest}")
+
+    def _publish(self, record, ok):
+        """Phát bản ghi thống kê của một lần truyền file lên bus sự kiện"""
+        record.finish(ok)
+        Utils.log_event(f"Transfer stats: {record.summary()}", level=logging.DEBUG)
+        bus.publish(TRANSFER, record)
+        return ok
+
+    def _download_file(self, remote_path, local_path, transfer_mode, progress_callback=None, total_size=None,
+                       resume=None, segments=None):
         Utils.log_event(f"Downloading {remote_path} to {local_path} ({transfer_mode})...")
+        record = TransferStats('download', remote_path, local_path, host=self.ftp.host)
+        retry_budget.deposit()
+        if transfer_mode != 'binary':
+            return self._publish(record, self._download_ascii(remote_path, local_path, progress_callback, record))
+        return self._publish(record, self._download_binary(remote_path, local_path, progress_callback, total_size,
+                                                           resume, segments, record))
+
+    def _download_binary(self, remote_path, local_path, progress_callback, total_size, resume, segments, record):
+        resume = Config.RESUME_DOWNLOADS if resume is None else resume
+        segments = Config.DOWNLOAD_SEGMENTS if segments is None else segments
+        algorithm = self._checksum_algorithm()
+        if algorithm is not None:
+            segments = 1  # Các đoạn về không theo thứ tự, không băm được trong lúc tải
+
+        def report(done):
+            if progress_callback:
+                if self.root:
+                    self.root.after(0, lambda: progress_callback(done, total_size))
+                else:
+                    progress_callback(done, total_size)
+
+        for attempt in range(Config.TRANSFER_RETRIES + 1):
+            record.retries = attempt
+            before = self.ftp.last_transfer
+            hasher = None
+            try:
+                # Bỏ qua SIZE nếu kích thước đã được lấy sẵn (ví dụ qua remote_sizes)
+                if total_size is None:
+                    total_size = self.remote_size(remote_path)
+                offset = self._resume_offset(remote_path, local_path, total_size) if resume else 0
+                hasher = self._hasher(algorithm, local_path, offset)
+                if offset and offset == total_size:
+                    if hasher:
+                        self._verify(remote_path, hasher, record)
+                    Utils.log_event(f"{local_path} is already complete, nothing to download")
+                    report(offset)
+                    return True
+                if self._use_segments(offset, total_size, segments):
+                    Utils.log_event(f"Downloading {remote_path} in {segments} parallel segments")
+                    download = SegmentedDownload(self.ftp, remote_path, local_path, total_size, segments,
+                                                 progress=lambda done, total: report(done), pool=self.pool)
+                    record.segments = len(download.ranges)
+                    try:
+                        download.run()
+                    finally:
+                        record.add_attempt(download.meter.stats())
+                    return True
+                if offset:
+                    Utils.log_event(f"Resuming {remote_path} from byte {offset} of {total_size}")
+                transferred = [offset]
+
+                def handle_count(count):
+                    transferred[0] += count
+                    report(transferred[0])
+
+                if total_size:
+                    # Đánh dấu trước khi cấp phát: bị kill trước lúc truncate thì file
+                    # đủ kích thước nhưng còn lỗ, _resume_offset không được tin nó
+                    mark_unfinished(local_path)
+                # Mở file đích một lần cho cả lần tải (không mở/đóng lại cho mỗi block)
+                with open(local_path, "r+b" if offset else "wb") as f:
+                    if total_size:
+                        Utils.preallocate(f, total_size)
+                    f.seek(offset)
+                    try:
+                        self.ftp.retrfile(f"RETR {remote_path}", f, handle_count, rest=offset or None,
+                                          use_splice=Config.DOWNLOAD_USE_SPLICE, hasher=hasher)
+                    finally:
+                        # Bỏ phần đã cấp phát trước mà chưa ghi, để lần sau tải tiếp đúng offset
+                        f.truncate(transferred[0])
+
+                # Đối chiếu với SIZE: server có thể đóng kết nối dữ liệu sớm mà vẫn trả 226
+                local_size = os.path.getsize(local_path)
+                if total_size is not None and local_size != total_size:
+                    raise FTPProtoError(f"Size mismatch after download: got {local_size} of {total_size} bytes")
+                clear_marker(local_path)
+                if hasher:
+                    self._verify(remote_path, hasher, record)
+                return True
+
+            except Exception as e:
+                record.error = str(e)
+                Utils.log_event(f"Error while downloading file {remote_path}: {e}", level=logging.ERROR)
+                # Nội dung sai thì không tải tiếp từ file này được nữa
+                if not resume or isinstance(e, ChecksumError):
+                    self._remove_partial(local_path)
+                # Kết nối lại cả sau lần thử cuối, để file kế tiếp trong lô không lỗi theo
+                if not self._recover(e) or isinstance(e, (FTPPermError, FTPAbortedError)) or not self._retry(record, attempt):
+                    break
+                Utils.log_event(f"Retrying download of {remote_path} ({attempt + 1}/{Config.TRANSFER_RETRIES})",
+                                level=logging.WARNING)
+            finally:
+                if hasher:
+                    hasher.close()
+                self._collect(record, before)
+
+        if resume and os.path.exists(local_path):
+            Utils.log_event(f"Kept partial file {local_path} for a later resume", level=logging.WARNING)
+        return False
+
+    def _download_ascii(self, remote_path, local_path, progress_callback=None, record=None):
+        # Chế độ ASCII không tải tiếp được (offset byte khác nhau do chuyển đổi xuống dòng)
+        before = self.ftp.last_transfer
         try:
-            if transfer_mode == 'binary':
-                total_size = self.ftp.size(remote_path)
-                transferred = [0]
-
-                def handle_block(block):
-                    with open(local_path, "ab") as f:
-                        f.write(block)
-                    transferred[0] += len(block)
-                    if progress_callback:
-                        if self.root:
-                            self.root.after(0, lambda: progress_callback(transferred[0], total_size))
-                        else:
-                            progress_callback(transferred[0], total_size)
-                # Mở file ở chế độ ghi mới trước
-                open(local_path, "wb").close()
-                self.ftp.retrbinary(f"RETR {remote_path}", handle_block, blocksize=8192)
-            else:
-                with open(local_path, "w", encoding="utf-8") as f:
-                    lines = []
-
-                    def handle_line(line):
-                        lines.append(line)
-                        f.write(line + "\n")
-                        if progress_callback:
-                            progress_callback(len(lines), None)  # optional for ascii
+            with open(local_path, "w", encoding="utf-8") as f:
+                lines = []
 
-                    self.ftp.retrlines(f"RETR {remote_path}", handle_line)
+                def handle_line(line):
+                    lines.append(line)
+                    f.write(line + "\n")
+                    if progress_callback:
+                        progress_callback(len(lines), None)  # optional for ascii
 
-            # Utils.log_event(f"Successfully downloaded {remote_path} to {local_path}")
+                self.ftp.retrlines(f"RETR {remote_path}", handle_line)
             return True
 
         except Exception as e:
+            if record:
+                record.error = str(e)
             Utils.log_event(f"Error while downloading file {remote_path}: {e}", level=logging.ERROR)
+            self._remove_partial(local_path)
+            return False
+        finally:
+            if record:
+                self._collect(record, before)
 
-            if os.path.exists(local_path):
-                try:
-                    os.remove(local_path)
-                    Utils.log_event(f"Removed incomplete local file at {local_path}", level=logging.WARNING)
-                except OSError as ose:
-                    Utils.log_event(f"Failed to delete incomplete local file {local_path}: {ose}", level=logging.ERROR)
+    def _remove_partial(self, local_path):
+        clear_marker(local_path)
+        if os.path.exists(local_path):
+            try:
+                os.remove(local_path)
+                Utils.log_event(f"Removed incomplete local file at {local_path}", level=logging.WARNING)
+            except OSError as ose:
+                Utils.log_event(f"Failed to delete incomplete local file {local_path}: {ose}", level=logging.ERROR)
 
-            return False
+    def _remote_offset(self, remote_path, total_size):
+        """Số byte đã có trên server để upload tiếp (0 = upload lại từ đầu)"""
+        try:
+            remote_size = self.remote_size(remote_path)
+        except FTPPermError:
+            return 0  # File chưa tồn tại trên server
+        if remote_size is None or remote_size > total_size:
+            return 0
+        return remote_size
 
-        
-    def _upload_file(self, local_path, remote_path, transfer_mode, progress_callback=None):
+    def _upload_file(self, local_path, remote_path, transfer_mode, progress_callback=None, resume=False):
+        """Upload một file; resume=True thì gửi tiếp phần còn thiếu so với file trên server
+
+        Khi upload binary bị lỗi giữa chừng, các lần thử lại luôn upload tiếp
+        (SIZE rồi REST+STOR hoặc APPE) thay vì gửi lại toàn bộ file.
+        """
         Utils.log_event(f"Uploading {local_path} to {remote_path} ({transfer_mode})...")
-        try:
-            total_size = os.path.getsize(local_path)
-            transferred = [0]
-
-            def handle_block(block):
-                transferred[0] += len(block)
-                if progress_callback:
-                    if self.root:
-                        self.root.after(0, lambda: progress_callback(transferred[0], total_size))
-                    else:
-                        progress_callback(transferred[0], total_size)
-                return block
-            if transfer_mode == 'binary':
+        record = TransferStats('upload', remote_path, local_path, host=self.ftp.host)
+        retry_budget.deposit()
+        if transfer_mode != 'binary':
+            return self._publish(record, self._upload_ascii(local_path, remote_path, progress_callback, record))
+        return self._publish(record, self._upload_binary(local_path, remote_path, progress_callback, resume, record))
+
+    def _upload_binary(self, local_path, remote_path, progress_callback, resume, record):
+        total_size = os.path.getsize(local_path)
+        algorithm = self._checksum_algorithm()
+        restart = False  # Checksum sai: lần thử sau gửi lại từ đầu thay vì gửi tiếp
+
+        def report(done):
+            if progress_callback:
+                if self.root:
+                    self.root.after(0, lambda: progress_callback(done, total_size))
+                else:
+                    progress_callback(done, total_size)
+
+        for attempt in range(Config.TRANSFER_RETRIES + 1):
+            record.retries = attempt
+            before = self.ftp.last_transfer
+            hasher = None
+            try:
+                offset = self._remote_offset(remote_path, total_size) if (resume or attempt) and not restart else 0
+                hasher = self._hasher(algorithm, local_path, offset)
+                if offset and offset == total_size:
+                    if hasher:
+                        self._verify(remote_path, hasher, record)
+                    Utils.log_event(f"{remote_path} is already complete on the server, nothing to upload")
+                    report(offset)
+                    return True
+
                 with open(local_path, "rb") as f:
-                    class FileWithCallback:
-                        def __init__(self, file_obj, callback):
-                            self.file_obj = file_obj
-                            self.callback = callback
-
-                        def read(self, blocksize):
-                            block = self.file_obj.read(blocksize)
-                            if block:
-                                self.callback(block)
-                            return block
-
-                    wrapped_file = FileWithCallback(f, handle_block)
-                    self.ftp.storbinary(f"STOR {remote_path}", wrapped_file, blocksize=8192)
-            else:
-                with open(local_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                    total_lines = len(lines)
-
-                    def line_iter():
-                        for i, line in enumerate(lines, 1):
-                            if progress_callback:
-                                progress_callback(i, total_lines)
-                            yield line.rstrip('\n')
-
-                    self.ftp.storlines(f"STOR {remote_path}", line_iter())
-
-            # Utils.log_event(f"Successfully uploaded {local_path} to {remote_path}")
+                    transferred = [offset]
+
+                    # sendfile gửi thẳng từ file xuống socket; tiến độ được báo theo từng lát lớn
+                    def handle_sent(count):
+                        transferred[0] += count
+                        report(transferred[0])
+
+                    if not offset:
+                        self.ftp.storfile(f"STOR {remote_path}", f, handle_sent, hasher=hasher)
+                    else:
+                        Utils.log_event(f"Resuming upload of {local_path} from byte {offset} of {total_size}")
+                        f.seek(offset)
+                        report(offset)
+                        # REST STREAM cho phép STOR ghi từ offset; nếu không có thì dùng APPE
+                        if self.ftp.feat().rest_stream:
+                            self.ftp.storfile(f"STOR {remote_path}", f, handle_sent, rest=offset, hasher=hasher)
+                        else:
+                            self.ftp.storfile(f"APPE {remote_path}", f, handle_sent, hasher=hasher)
+                if hasher:
+                    self._verify(remote_path, hasher, record)
+                return True
+
+            except Exception as e:
+                record.error = str(e)
+                restart = isinstance(e, ChecksumError)
+                Utils.log_event(f"Error while uploading file {local_path}: {e}", level=logging.ERROR)
+                if not self._recover(e) or isinstance(e, (FTPPermError, FTPAbortedError)) or not self._retry(record, attempt):
+                    break
+                Utils.log_event(f"Retrying upload of {local_path} ({attempt + 1}/{Config.TRANSFER_RETRIES})",
+                                level=logging.WARNING)
+            finally:
+                if hasher:
+                    hasher.close()
+                self._collect(record, before)
+        return False
+
+    def _upload_ascii(self, local_path, remote_path, progress_callback=None, record=None):
+        # Chế độ ASCII không upload tiếp được (offset byte khác nhau do chuyển đổi xuống dòng)
+        before = self.ftp.last_transfer
+        try:
+            with open(local_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+                total_lines = len(lines)
+
+                def line_iter():
+                    for i, line in enumerate(lines, 1):
+                        if progress_callback:
+                            progress_callback(i, total_lines)
+                        yield line.rstrip('\n')
+
+                self.ftp.storlines(f"STOR {remote_path}", line_iter())
             return True
 
         except Exception as e:
-            # Utils.log_event(f"Error while uploading file {local_path}: {e}", level=logging.ERROR)
+            if record:
+                record.error = str(e)
+            Utils.log_event(f"Error while uploading file {local_path}: {e}", level=logging.ERROR)
             return False
-
-        
\ No newline at end of file
+        finally:
+            if record:
+                self._collect(record, before)
@@ -0,0 +1,112 @@
+"""
+Giữ kết nối điều khiển không bị server ngắt khi phiên nhàn rỗi lâu.
+
+Keepalive chạy một thread nền gửi NOOP khi kênh điều khiển đã im lặng quá
+interval giây. Thread chỉ lấy ftp.lock kiểu không chờ: nếu một lệnh hay một
+lần truyền dữ liệu đang giữ phiên thì bỏ qua và thử lại sau, nên NOOP không
+bao giờ chen vào giữa lệnh khác. Thời gian khứ hồi của NOOP là một mẫu RTT
+(ftp.rtt, rtt_histogram).
+
+Sử dụng:
+    Keepalive(ftp).start()   # Dừng khi ftp.close()/ftp.quit() hoặc keepalive.stop()
+"""
+
+import logging
+import threading
+import time
+
+from .config import Config
+from .raw_socket_ftp import FTPError
+
+# Khi phiên đang bận, thử lại sau chừng này giây (hoặc interval nếu ngắn hơn)
+BUSY_RETRY = 1.0
+
+
+class Keepalive:
+    """Gửi NOOP trên kênh điều khiển nhàn rỗi của một phiên FTP
+
+    interval = None: đọc Config.KEEPALIVE_INTERVAL mỗi lần (0 = tạm dừng).
+    Khi NOOP lỗi (server đã đóng kết nối, 421, ...), keepalive dừng và giữ lỗi
+    ở self.error; lệnh kế tiếp của người dùng sẽ gặp lỗi tương ứng.
+    """
+
+    def __init__(self, ftp, interval=None):
+        self.ftp = ftp
+        self.interval = interval
+        self.sent = 0       # Số NOOP đã gửi
+        self.skipped = 0    # Số lần tới hạn nhưng phiên đang bận
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        if ftp.keepalive is not None:
+            ftp.keepalive.stop()
+        ftp.keepalive = self
+
+    def _interval(self):
+        return Config.KEEPALIVE_INTERVAL if self.interval is None else self.interval
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if not self.running:
+            self.error = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='ftp-keepalive', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        if self.ftp.keepalive is self:
+            self.ftp.keepalive = None
+
+    def _run(self):
+        delay = self._interval() or BUSY_RETRY
+        while not self._stop.wait(delay):
+            interval = self._interval()
+            if not interval:
+                delay = BUSY_RETRY
+                continue
+            idle = time.monotonic() - self.ftp.last_activity
+            if idle < interval:
+                delay = interval - idle
+                continue
+            try:
+                sent = self.ping()
+            except (FTPError, OSError, EOFError) as e:
+                self.error = e
+                logging.warning(f"Keepalive NOOP to {self.ftp.host} failed, stopping keepalive: {e}")
+                break
+            delay = interval if sent else min(interval, BUSY_RETRY)
+
+    def ping(self):
+        """Gửi một NOOP nếu phiên đang rảnh; False nếu phiên bận (không gửi gì)"""
+        ftp = self.ftp
+        if not ftp.lock.acquire(blocking=False):
+            self.skipped += 1
+            return False
+        try:
+            if ftp.sock is None:
+                self._stop.set()
+                return False
+            start = time.monotonic()
+            ftp.send_command('NOOP')
+            ftp._note_rtt(time.monotonic() - start)
+            self.sent += 1
+            return True
+        finally:
+            ftp.lock.release()
+
+    def describe(self):
+        """Một dòng trạng thái cho CLI/GUI"""
+        interval = self._interval()
+        if self.error is not None:
+            return f"stopped ({self.error})"
+        if not self.running or not interval:
+            return "off"
+        return f"NOOP after {interval:g} s idle ({self.sent} sent, {self.skipped} deferred while busy)"
@@ -0,0 +1,156 @@
+"""
+Mô hình mục thư mục (RemoteEntry) dùng chung cho mọi thao tác duyệt thư mục.
+
+Kết quả MLSD/MLST (RFC 3659) được phân tích chính xác theo facts; khi server
+không hỗ trợ MLSD thì phân tích dòng LIST theo định dạng Unix (ls -l) hoặc
+DOS/Windows (IIS).
+"""
+
+import calendar
+import re
+import time
+
+TYPE_FILE = 'file'
+TYPE_DIR = 'dir'
+TYPE_LINK = 'link'
+
+
+class RemoteEntry:
+    """Một mục trong thư mục từ xa (gọn nhẹ nhờ __slots__)
+
+    modify là epoch (UTC, giây) hoặc None; unique là fact 'unique' của MLSD
+    (chỉ có khi server hỗ trợ MLSD).
+    """
+
+    __slots__ = ('name', 'type', 'size', 'modify', 'unique')
+
+    def __init__(self, name, type=TYPE_FILE, size=None, modify=None, unique=None):
+        self.name = name
+        self.type = type
+        self.size = size
+        self.modify = modify
+        self.unique = unique
+
+    @property
+    def is_dir(self):
+        return self.type == TYPE_DIR
+
+    @property
+    def is_file(self):
+        return self.type == TYPE_FILE
+
+    def modify_str(self, fmt="%Y-%m-%d %H:%M"):
+        if self.modify is None:
+            return ""
+        return time.strftime(fmt, time.localtime(self.modify))
+
+    def __repr__(self):
+        return f"RemoteEntry({self.name!r}, type={self.type!r}, size={self.size!r}, modify={self.modify!r})"
+
+
+def parse_mdtm(value):
+    """Chuyển thời gian dạng YYYYMMDDHHMMSS[.sss] (UTC) thành epoch, None nếu sai định dạng"""
+    match = re.match(r'^(\d{14})(?:\.(\d+))?$', value.strip())
+    if not match:
+        return None
+    try:
+        ts = calendar.timegm(time.strptime(match.group(1), '%Y%m%d%H%M%S'))
+    except ValueError:
+        return None
+    if match.group(2):
+        ts += float('0.' + match.group(2))
+    return ts
+
+
+def parse_mlsd_line(line):
+    """Phân tích một dòng MLSD/MLST: 'type=file;size=12;modify=...; name'"""
+    facts_part, sep, name = line.partition(' ')
+    if not sep:
+        return None
+    entry = RemoteEntry(name)
+    for fact in facts_part.split(';'):
+        key, eq, value = fact.partition('=')
+        if not eq:
+            continue
+        key = key.lower()
+        if key == 'type':
+            value = value.lower()
+            if value in ('dir', 'cdir', 'pdir'):
+                entry.type = TYPE_DIR if value == 'dir' else value
+            elif value.startswith('os.unix=symlink') or value.startswith('os.unix=slink'):
+                entry.type = TYPE_LINK
+            else:
+                entry.type = value
+        elif key == 'size' or (key == 'sizd' and entry.size is None):
+            try:
+                entry.size = int(value)
+            except ValueError:
+                pass
+        elif key == 'modify':
+            entry.modify = parse_mdtm(value)
+        elif key == 'unique':
+            entry.unique = value
+    return entry
+
+
+_MONTHS = {name: i for i, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+
+_DOS_RE = re.compile(
+    r'^(\d{2})-(\d{2})-(\d{2,4})\s+(\d{1,2}):(\d{2})\s*([AaPp][Mm])?\s+(<DIR>|\d+)\s+(.+)$')
+
+
+def _unix_mtime(month, day, year_or_time):
+    mon = _MONTHS.get(month[:3].lower())
+    if not mon or not day.isdigit():
+        return None
+    try:
+        if ':' in year_or_time:
+            # 'Mon DD HH:MM': năm hiện tại, hoặc năm trước nếu thời điểm nằm ở tương lai
+            hour, minute = (int(x) for x in year_or_time.split(':', 1))
+            year = time.gmtime().tm_year
+            ts = calendar.timegm((year, mon, int(day), hour, minute, 0))
+            if ts > time.time() + 86400:
+                ts = calendar.timegm((year - 1, mon, int(day), hour, minute, 0))
+            return ts
+        if year_or_time.isdigit():
+            return calendar.timegm((int(year_or_time), mon, int(day), 0, 0, 0))
+    except ValueError:
+        pass
+    return None
+
+
+def parse_list_line(line):
+    """Phân tích một dòng LIST (Unix hoặc DOS/IIS), None nếu không nhận dạng được"""
+    match = _DOS_RE.match(line)
+    if match:
+        month, day, year, hour, minute, ampm, size, name = match.groups()
+        year = int(year)
+        if year < 100:
+            year += 2000 if year < 70 else 1900
+        hour = int(hour)
+        if ampm:
+            hour = hour % 12 + (12 if ampm.lower() == 'pm' else 0)
+        try:
+            modify = calendar.timegm((year, int(month), int(day), hour, int(minute), 0))
+        except (ValueError, OverflowError):
+            modify = None
+        if size == '<DIR>':
+            return RemoteEntry(name, TYPE_DIR, None, modify)
+        return RemoteEntry(name, TYPE_FILE, int(size), modify)
+
+    parts = line.split(maxsplit=8)
+    if len(parts) < 9:
+        return None
+    permissions = parts[0]
+    name = parts[8]
+    kind = permissions[:1]
+    if kind == 'd':
+        entry_type = TYPE_DIR
+    elif kind == 'l':
+        entry_type = TYPE_LINK
+        name = name.split(' -> ', 1)[0]
+    else:
+        entry_type = TYPE_FILE
+    size = int(parts[4]) if parts[4].isdigit() else None
+    return RemoteEntry(name, entry_type, size, _unix_mtime(parts[5], parts[6], parts[7]))
@@ -0,0 +1,291 @@
+"""
+Pool các phiên FTP đã đăng nhập, theo từng host + tài khoản.
+
+Kết nối và đăng nhập chỉ tốn một lần cho mỗi phiên: các thao tác đồng thời
+(mget song song, tải phân đoạn, duyệt thư mục trong khi truyền file) mượn
+phiên bằng context manager và trả lại khi xong. Khi mượn, phiên được đưa về
+thư mục và TYPE/MODE yêu cầu (các lệnh cần thiết gửi chung một lô pipeline).
+Phiên nhàn rỗi lâu được kiểm tra bằng NOOP; phiên hỏng bị đóng và thay mới.
+Khi server từ chối thêm phiên (421 Too many connections), pool giảm max_size
+về số phiên đang mở và các thao tác chờ phiên được trả lại; sau limit_cooldown
+giây không gặp lại lỗi đó, pool trở lại max_size đã cấu hình.
+
+Sử dụng:
+    pool = get_pool(host, port, user, passwd)
+    with pool.session(cwd='/data') as ftp:
+        ftp.retrbinary('RETR a.bin', callback)
+"""
+
+import collections
+import contextlib
+import logging
+import posixpath
+import threading
+import time
+
+from .config import Config
+from .raw_socket_ftp import FTP, FTPError, FTPTempError, FTPProtoError, all_errors
+from .ftp_retry import too_many_connections
+from .utils import Utils
+
+
+def _is_broken(error):
+    """Lỗi khiến phiên không còn dùng tiếp được (mất kết nối, lệch phản hồi, 421)"""
+    if not isinstance(error, Exception):
+        return True  # KeyboardInterrupt, ...: có thể đang dở một lệnh
+    if isinstance(error, (OSError, EOFError, FTPProtoError)):
+        return True
+    return isinstance(error, FTPTempError) and str(error).startswith('421')
+
+
+class SessionPool:
+    """Giữ từ min_size tới max_size phiên đã đăng nhập tới một server"""
+
+    def __init__(self, host, port=21, user='anonymous', passwd='anonymous@', min_size=Config.POOL_MIN_SESSIONS,
+                 max_size=Config.POOL_MAX_SESSIONS, timeout=60, passive_mode=True,
+                 idle_check=Config.POOL_IDLE_CHECK, idle_timeout=Config.POOL_IDLE_TIMEOUT,
+                 limit_cooldown=Config.POOL_LIMIT_COOLDOWN):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.configured_max = self.max_size  # max_size khi server không giới hạn số phiên
+        self.timeout = timeout
+        self.passive_mode = passive_mode
+        self.idle_check = idle_check
+        self.idle_timeout = idle_timeout
+        self.limit_cooldown = limit_cooldown
+        self.features = None
+        self.home = None
+        self.created = 0  # Số lần đã kết nối + đăng nhập
+        self.limited = 0  # Số lần giảm max_size vì server báo quá nhiều kết nối
+        self._limited_until = None  # Thời điểm trả max_size về configured_max (None = không bị giới hạn)
+        self._idle = collections.deque()  # (phiên, thời điểm trả lại), bên phải là mới nhất
+        self._size = 0  # Số phiên đang mở (nhàn rỗi + đang được mượn)
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @classmethod
+    def from_session(cls, ftp, **kwargs):
+        """Tạo pool cùng server/tài khoản/chế độ với một phiên đã đăng nhập"""
+        pool = cls(ftp.host, ftp.port, ftp.user, ftp.passwd, timeout=ftp.timeout,
+                   passive_mode=ftp.passive_mode, **kwargs)
+        pool.features = ftp.features
+        return pool
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def _connect(self):
+        ftp = FTP()
+        ftp.passive_mode = self.passive_mode
+        ftp.features = self.features
+        ftp.connect(self.host, self.port, self.timeout)
+        try:
+            ftp.login(self.user, self.passwd)
+            if self.home is None:
+                self.home = ftp.pwd()
+            ftp.state['CWD'] = self.home
+        except all_errors:
+            ftp.close()
+            raise
+        self.created += 1
+        return ftp
+
+    def _alive(self, ftp):
+        try:
+            ftp.voidcmd('NOOP')
+            return True
+        except all_errors:
+            return False
+
+    def _discard(self, ftp=None):
+        if ftp is not None:
+            ftp.close()
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def warm(self):
+        """Mở trước cho đủ min_size phiên"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= max(self.min_size, 0):
+                    return
+                self._size += 1
+            try:
+                ftp = self._connect()
+            except all_errors:
+                self._discard()
+                raise
+            self.release(ftp)
+
+    def acquire(self, timeout=None):
+        """Mượn một phiên (chờ tối đa timeout giây nếu pool đã đủ max_size)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise FTPError(f"Session pool for {self.host}:{self.port} is closed")
+                if self._idle:
+                    ftp, since = self._idle.pop()  # Phiên vừa dùng gần nhất
+                    break
+                self._lift_limit()
+                if self._size < self.max_size:
+                    self._size += 1
+                    ftp, since = None, None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise FTPTempError(f"421 No free session in pool for {self.host}:{self.port}")
+                if self._limited_until is not None:
+                    # Thức dậy khi hết thời gian giới hạn để mở thêm phiên
+                    lift = max(0.0, self._limited_until - time.monotonic())
+                    remaining = lift if remaining is None else min(remaining, lift)
+                self._cond.wait(remaining)
+
+        # Kiểm tra / kết nối ngoài khóa để không chặn các thread khác
+        if ftp is not None and time.monotonic() - since >= self.idle_check and not self._alive(ftp):
+            ftp.close()
+            ftp = None
+        if ftp is None:
+            try:
+                ftp = self._connect()
+            except all_errors as e:
+                self._discard()
+                if not (too_many_connections(e) and self._shrink(e)):
+                    raise
+                # Chờ một phiên đang mượn được trả lại thay vì mở thêm
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                return self.acquire(remaining)
+        return ftp
+
+    def _shrink(self, error):
+        """Server từ chối thêm phiên: giảm max_size về số phiên đang mở; False nếu không còn phiên nào"""
+        with self._cond:
+            if self._size < 1:
+                return False
+            if self._size < self.max_size:
+                Utils.log_event(f"{self.host}: {error}; limiting pool to {self._size} sessions",
+                                level=logging.WARNING)
+                self.max_size = self._size
+                self.limited += 1
+            # Mỗi lần 421 kéo dài thời gian giới hạn
+            self._limited_until = time.monotonic() + self.limit_cooldown
+            return True
+
+    def _lift_limit(self):
+        """Trả max_size về configured_max khi đã hết limit_cooldown (gọi khi giữ self._cond)"""
+        if self._limited_until is None or time.monotonic() < self._limited_until:
+            return
+        self._limited_until = None
+        if self.max_size < self.configured_max:
+            Utils.log_event(f"{self.host}: no connection limit for {self.limit_cooldown}s, "
+                            f"pool back to {self.configured_max} sessions")
+            self.max_size = self.configured_max
+
+    def release(self, ftp, broken=False):
+        """Trả phiên về pool; broken=True thì đóng phiên thay vì giữ lại"""
+        if broken or ftp.sock is None:
+            self._discard(ftp)
+            return
+        expired = []
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                expired.append(ftp)
+            else:
+                self._idle.append((ftp, time.monotonic()))
+                # Đóng bớt phiên nhàn rỗi quá lâu, nhưng giữ tối thiểu min_size phiên
+                now = time.monotonic()
+                while self._idle and self._size > self.min_size and now - self._idle[0][1] >= self.idle_timeout:
+                    expired.append(self._idle.popleft()[0])
+                    self._size -= 1
+                self._cond.notify()
+        for old in expired:
+            old.quit()
+
+    def restore(self, ftp, cwd=None, type='I', mode='S', passive=None):
+        """Đưa phiên về thư mục và TYPE/MODE yêu cầu, chỉ gửi các lệnh cần thiết"""
+        ftp.passive_mode = self.passive_mode if passive is None else passive
+        if cwd is None:
+            cwd = self.home
+        elif not cwd.startswith('/') and self.home:
+            cwd = posixpath.normpath(posixpath.join(self.home, cwd))
+        commands = []
+        if cwd and ftp.state.get('CWD') != cwd:
+            commands.append(f'CWD {cwd}')
+        if type and ftp.state.get('TYPE') != type:
+            commands.append(f'TYPE {type}')
+        if mode and ftp.state.get('MODE', 'S') != mode:
+            commands.append(f'MODE {mode}')
+        if commands:
+            for result in ftp.pipeline(commands):
+                if not result.ok:
+                    raise result.error
+
+    @contextlib.contextmanager
+    def session(self, cwd=None, type='I', mode='S', passive=None, timeout=None):
+        """Mượn một phiên trong khối with, đã khôi phục thư mục và TYPE/MODE"""
+        ftp = self.acquire(timeout)
+        broken = False
+        try:
+            self.restore(ftp, cwd, type, mode, passive)
+            yield ftp
+        except BaseException as e:
+            broken = _is_broken(e)
+            raise
+        finally:
+            self.release(ftp, broken)
+
+    def close(self):
+        """Đóng mọi phiên nhàn rỗi; phiên đang mượn sẽ bị đóng khi được trả lại"""
+        with self._cond:
+            self._closed = True
+            idle = [ftp for ftp, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for ftp in idle:
+            ftp.quit()
+        with _pools_lock:
+            for key, pool in list(_pools.items()):
+                if pool is self:
+                    del _pools[key]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, port=21, user='anonymous', passwd='anonymous@', **kwargs):
+    """Pool dùng chung cho mỗi (host, port, user, passwd), tạo mới nếu chưa có"""
+    key = (host, port, user, passwd)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SessionPool(host, port, user, passwd, **kwargs)
+        return pool
+
+
+def pool_for(ftp, **kwargs):
+    """Pool dùng chung cho server và tài khoản của một phiên đã đăng nhập"""
+    key = (ftp.host, ftp.port, ftp.user, ftp.passwd)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SessionPool.from_session(ftp, **kwargs)
+        return pool
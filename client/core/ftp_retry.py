@@ -0,0 +1,173 @@
+"""
+Chính sách thử lại lỗi tạm thời (4xx) theo loại thao tác, với backoff ngẫu nhiên và ngân sách thử lại.
+
+Phản hồi 4xx nghĩa là lệnh chưa được thực hiện và có thể thử lại sau (RFC 959),
+nên mọi lệnh đều thử lại được. Mỗi loại thao tác (control: lệnh điều khiển,
+listing: liệt kê thư mục, transfer: truyền file) có số lần thử riêng. Thời gian
+chờ giữa các lần thử là backoff lũy thừa với "full jitter" (ngẫu nhiên trong
+[0, min(max_delay, base_delay * 2^n)]) để nhiều phiên không thử lại cùng lúc.
+
+Ngân sách thử lại (RetryBudget) dùng chung cho mọi phiên: mỗi thao tác nạp
+thêm Config.RETRY_BUDGET_RATIO token, mỗi lần thử lại tiêu một token. Khi
+server lỗi liên tục, số lần thử lại chỉ còn khoảng RETRY_BUDGET_RATIO lần mỗi
+thao tác thay vì nhân lên theo số lần thử.
+
+Sử dụng:
+    retry_policies['listing'].call(ftp.nlst)
+"""
+
+import logging
+import random
+import threading
+import time
+
+from .config import Config
+from .raw_socket_ftp import FTPError, FTPTempError
+
+# Method của FTP/FTPHelpers theo loại thao tác (các method khác là control)
+LISTING_METHODS = frozenset({'nlst', 'dir', 'entries', 'list_entries', 'list_files', 'mlst', 'stat_lines'})
+TRANSFER_METHODS = frozenset({'retrbinary', 'retrlines', 'storbinary', 'storlines', 'retrfile', 'storfile',
+                              '_download_file', '_upload_file'})
+
+
+def is_transient(error):
+    """Lỗi 4xx có thể thử lại nguyên lệnh (trừ 426: dữ liệu đã truyền một phần)"""
+    return isinstance(error, FTPTempError) and not str(error).startswith('426')
+
+
+def too_many_connections(error):
+    """Server từ chối thêm phiên: 421 khi kết nối/đăng nhập, hoặc thông báo 'too many ...'"""
+    if not isinstance(error, FTPError):
+        return False
+    text = str(error)
+    return text.startswith('421') or 'too many' in text.lower()
+
+
+class RetryBudget:
+    """Ngân sách thử lại dạng token bucket dùng chung
+
+    Bắt đầu và tối đa Config.RETRY_BUDGET_RESERVE token; deposit() sau mỗi thao
+    tác nạp Config.RETRY_BUDGET_RATIO token, withdraw() tiêu một token cho một
+    lần thử lại (False nếu không đủ).
+    """
+
+    def __init__(self, ratio=None, reserve=None):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.denied = 0  # Số lần thử lại bị từ chối vì hết ngân sách
+        self._tokens = None
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        ratio = Config.RETRY_BUDGET_RATIO if self.ratio is None else self.ratio
+        reserve = Config.RETRY_BUDGET_RESERVE if self.reserve is None else self.reserve
+        return ratio, reserve
+
+    @property
+    def tokens(self):
+        with self._lock:
+            return self._settings()[1] if self._tokens is None else self._tokens
+
+    def deposit(self):
+        ratio, reserve = self._settings()
+        with self._lock:
+            current = reserve if self._tokens is None else self._tokens
+            self._tokens = min(reserve, current + ratio)
+
+    def withdraw(self):
+        _, reserve = self._settings()
+        with self._lock:
+            current = reserve if self._tokens is None else self._tokens
+            if current < 1:
+                self.denied += 1
+                return False
+            self._tokens = current - 1
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._tokens = None
+            self.denied = 0
+
+
+class RetryPolicy:
+    """Số lần thử lại và backoff cho một loại thao tác
+
+    attempts = None: đọc Config.<setting> mỗi lần (số lần thử lại, không tính lần đầu).
+    """
+
+    def __init__(self, name, setting=None, attempts=None, base_delay=None, max_delay=None, budget=None):
+        self.name = name
+        self.setting = setting
+        self._attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retries = 0      # Số lần đã thử lại
+        self.waited = 0.0     # Tổng số giây đã chờ backoff
+
+    @property
+    def attempts(self):
+        if self._attempts is not None:
+            return self._attempts
+        return getattr(Config, self.setting) if self.setting else 0
+
+    def delay(self, retry):
+        """Thời gian chờ trước lần thử lại thứ retry + 1 (full jitter)"""
+        base = Config.RETRY_BASE_DELAY if self.base_delay is None else self.base_delay
+        cap = Config.RETRY_MAX_DELAY if self.max_delay is None else self.max_delay
+        return random.uniform(0, min(cap, base * 2 ** retry))
+
+    def allow(self, retry):
+        """Còn được thử lại lần thứ retry + 1 không (tính cả ngân sách)"""
+        if retry >= self.attempts:
+            return False
+        return self.budget is None or self.budget.withdraw()
+
+    def backoff(self, retry):
+        """Chờ trước lần thử lại; trả về số giây đã chờ"""
+        seconds = self.delay(retry)
+        time.sleep(seconds)
+        self.retries += 1
+        self.waited += seconds
+        return seconds
+
+    def call(self, func, *args, retry_if=is_transient, **kwargs):
+        """Gọi func, thử lại khi retry_if(lỗi) đúng và chính sách/ngân sách còn cho phép"""
+        if self.budget is not None:
+            self.budget.deposit()
+        retry = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not retry_if(e) or not self.allow(retry):
+                    raise
+                logging.warning(f"Temporary error '{e}', retrying {self.name} operation ({retry + 1}/{self.attempts})")
+                self.backoff(retry)
+                retry += 1
+
+
+# Ngân sách và các chính sách dùng chung cho mọi phiên trong tiến trình
+retry_budget = RetryBudget()
+retry_policies = {
+    'control': RetryPolicy('control', 'RETRY_CONTROL_ATTEMPTS', budget=retry_budget),
+    'listing': RetryPolicy('listing', 'RETRY_LISTING_ATTEMPTS', budget=retry_budget),
+    'transfer': RetryPolicy('transfer', 'TRANSFER_RETRIES', budget=retry_budget),
+}
+
+
+def policy_for(method_name):
+    """Chính sách theo tên method (listing, transfer, còn lại là control)"""
+    if method_name in LISTING_METHODS:
+        return retry_policies['listing']
+    if method_name in TRANSFER_METHODS:
+        return retry_policies['transfer']
+    return retry_policies['control']
+
+
+def retry_summary():
+    """Một dòng cho lệnh status: số lần thử lại theo loại và ngân sách còn lại"""
+    counts = ', '.join(f"{name} {policy.retries}" for name, policy in retry_policies.items())
+    return (f"{counts}; backoff {sum(p.waited for p in retry_policies.values()):.1f} s; "
+            f"budget {retry_budget.tokens:.1f} tokens, {retry_budget.denied} denied")
@@ -0,0 +1,223 @@
+"""
+Tải một file lớn qua nhiều kết nối dữ liệu song song (segmented download).
+
+Một luồng RETR bị giới hạn bởi cửa sổ TCP của một kết nối; trên đường truyền
+có độ trễ lớn, chia file thành K đoạn và tải mỗi đoạn trên một phiên riêng
+(REST <đầu đoạn> + RETR, đóng kết nối dữ liệu ở cuối đoạn) tận dụng băng
+thông tốt hơn. Các đoạn được ghi thẳng vào đúng vị trí của file đã cấp phát
+trước, nên không cần ghép file sau khi tải. Trong lúc tải, file đánh dấu
+<local_path>.segments tồn tại: nếu tiến trình bị kill, file đích có đủ kích
+thước nhưng còn lỗ, và lần tải sau phải tải lại từ đầu thay vì tin kích thước.
+Tải một luồng (FTPHelpers) cũng cấp phát trước nên dùng cùng file đánh dấu.
+"""
+
+import contextlib
+import os
+import threading
+
+from .raw_socket_ftp import FTPAbortedError, FTPPermError, FTPProtoError, FTPTempError
+from .ftp_stats import TransferMeter
+from .utils import Utils
+
+
+MARKER_SUFFIX = '.segments'
+
+
+def marker_path(local_path):
+    """File đánh dấu local_path đang được tải phân đoạn (chưa hoàn tất)"""
+    return local_path + MARKER_SUFFIX
+
+
+def mark_unfinished(local_path):
+    """Đánh dấu local_path sắp được cấp phát trước: kích thước của nó không đáng tin cho tới clear_marker"""
+    open(marker_path(local_path), 'w').close()
+
+
+def is_unfinished(local_path):
+    """True nếu local_path là file tải phân đoạn bị dừng đột ngột (kích thước không đáng tin)"""
+    return os.path.exists(marker_path(local_path))
+
+
+def clear_marker(local_path):
+    try:
+        os.remove(marker_path(local_path))
+    except FileNotFoundError:
+        pass
+
+
+def split_ranges(total_size, parts):
+    """Chia [0, total_size) thành tối đa parts đoạn liên tiếp [(start, end), ...]"""
+    parts = max(1, min(parts, total_size))
+    step = total_size // parts
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = total_size if i == parts - 1 else start + step
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+class SegmentedDownload:
+    """Tải remote_path về local_path bằng nhiều phiên song song
+
+    Các phiên được mượn từ pool nếu có, ngược lại nhân bản từ ftp (FTP.clone).
+    progress(done, total) được gọi sau mỗi block (từ các thread tải). meter đo
+    chung mọi đoạn (thiết lập kết nối và byte đầu tiên tính theo đoạn nhanh nhất).
+    Trong lúc run(), ftp.abort() (từ thread khác) gọi cancel() để hủy mọi đoạn.
+    """
+
+    def __init__(self, ftp, remote_path, local_path, total_size, parts, progress=None, blocksize=None,
+                 pool=None):
+        self.ftp = ftp
+        self.pool = pool
+        # Đường dẫn tương đối được hiểu theo thư mục hiện tại của phiên chính
+        self.cwd = ftp.state.get('CWD') or ftp.pwd()
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.total_size = total_size
+        self.ranges = split_ranges(total_size, parts)
+        self.done = [0] * len(self.ranges)
+        self.transferred = 0
+        self.progress = progress
+        self.blocksize = blocksize
+        self.errors = []
+        self.meter = TransferMeter()
+        self.cancelled = False
+        self._failed = threading.Event()
+        self._lock = threading.Lock()
+        self._sessions = set()  # Phiên phụ đang tải một đoạn, để cancel() gửi ABOR
+
+    def run(self):
+        """Tải tất cả các đoạn; lỗi thì cắt file về phần liền mạch đã tải và ném lại lỗi"""
+        # Đánh dấu trước khi cấp phát: file đủ kích thước chỉ đáng tin khi đã bỏ dấu
+        mark_unfinished(self.local_path)
+        # Cấp phát trước file đích để mỗi đoạn ghi thẳng vào vị trí của nó
+        with open(self.local_path, 'wb') as f:
+            Utils.preallocate(f, self.total_size)
+
+        threads = [threading.Thread(target=self._worker, args=(i,), daemon=True)
+                   for i in range(len(self.ranges))]
+        self.ftp.segmented = self
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            self.ftp.segmented = None
+
+        if self.errors or self.cancelled:
+            # Giữ lại phần đầu liền mạch để lần thử sau tải tiếp bằng REST
+            with open(self.local_path, 'r+b') as f:
+                f.truncate(self.contiguous_prefix())
+            clear_marker(self.local_path)
+            if self.cancelled:
+                raise FTPAbortedError(f"Segmented download of {self.remote_path} cancelled")
+            raise self.errors[0]
+
+        size = os.path.getsize(self.local_path)
+        if size != self.total_size or self.transferred != self.total_size:
+            # Giữ dấu: lần sau tải lại từ đầu
+            raise FTPProtoError(f"Segmented download incomplete: got {self.transferred} of {self.total_size} bytes")
+        clear_marker(self.local_path)
+        return self.transferred
+
+    def cancel(self):
+        """Hủy tải: dừng mọi đoạn và gửi ABOR trên các phiên phụ đang truyền
+
+        Gọi được từ thread khác. run() raise FTPAbortedError sau khi các đoạn
+        dừng. Trả về False nếu đã hủy rồi.
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.cancelled = True
+            self._failed.set()
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.abort()
+        return True
+
+    def contiguous_prefix(self):
+        """Số byte liền mạch tính từ đầu file đã tải xong"""
+        prefix = 0
+        for (start, end), done in zip(self.ranges, self.done):
+            prefix = start + done
+            if done < end - start:
+                break
+        return prefix
+
+    @contextlib.contextmanager
+    def _session(self):
+        if self.pool is not None:
+            with self.pool.session(cwd=self.cwd, type='I', passive=self.ftp.passive_mode) as session:
+                yield session
+            return
+        session = self.ftp.clone()
+        try:
+            session.cwd(self.cwd)
+            session.voidcmd('TYPE I')
+            yield session
+        finally:
+            session.quit()
+
+    def _worker(self, index):
+        start, end = self.ranges[index]
+        try:
+            with self._session() as session, open(self.local_path, 'r+b') as f:
+                f.seek(start)
+                try:
+                    self._fetch_range(session, f, index, end - start)
+                finally:
+                    with self._lock:
+                        self._sessions.discard(session)
+        except Exception as e:
+            with self._lock:
+                self.errors.append(e)
+            self._failed.set()
+
+    def _fetch_range(self, session, f, index, length):
+        start = self.ranges[index][0]
+        remaining = length
+        with session.lock:
+            if self._failed.is_set():
+                return
+            data_socket = session.transfer_cmd(f'RETR {self.remote_path}', rest=start or None)
+            with self._lock:
+                self.meter.connected()
+                self._sessions.add(session)
+                if self.cancelled:
+                    session.abort()  # cancel() chạy trước khi phiên này được đăng ký
+            sizer = session.block_sizer(data_socket, self.blocksize)
+            buf = memoryview(bytearray(sizer.size))
+            try:
+                while remaining and not self._failed.is_set():
+                    want = min(remaining, len(buf))
+                    n = data_socket.recv_into(buf[:want])
+                    if not n:
+                        break
+                    f.write(buf[:n])
+                    remaining -= n
+                    self._advance(index, n)
+                    if sizer.update(n, n == want) > len(buf):
+                        buf = memoryview(bytearray(sizer.size))
+            finally:
+                # Đóng kết nối dữ liệu ở cuối đoạn; server sẽ trả 426/451 thay vì 226.
+                # _end_transfer bỏ đăng ký kênh dữ liệu để phiên trả về pool không giữ
+                # socket cũ, và raise FTPAbortedError nếu cancel() đã gửi ABOR
+                try:
+                    session._end_transfer(data_socket)
+                except (FTPTempError, FTPPermError):
+                    if remaining:
+                        raise
+        if remaining:
+            raise FTPProtoError(f"Segment at {start} ended early, {remaining} of {length} bytes missing")
+
+    def _advance(self, index, n):
+        with self._lock:
+            self.done[index] += n
+            self.transferred += n
+            self.meter.add(n)
+            if self.progress:
+                self.progress(self.transferred, self.total_size)
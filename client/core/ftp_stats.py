@@ -0,0 +1,348 @@
+"""
+Thống kê từng lần truyền file và bus sự kiện trong tiến trình.
+
+TransferMeter đo một kết nối dữ liệu ngay trong vòng lặp đọc/ghi (mỗi block chỉ
+tốn một lần đọc đồng hồ): thời gian thiết lập kết nối dữ liệu, thời gian tới
+byte đầu tiên, thông lượng trung bình và đỉnh, số lần khựng. Khi truyền xong
+một file (thành công hay thất bại), FTPHelpers gom số liệu của mọi lần thử
+thành một TransferStats và phát lên bus (topic TRANSFER); CLI (lệnh stats),
+GUI và test nhận qua bus.subscribe() hoặc bus.recent().
+
+Mỗi lần thiết lập phiên, FTP ghi thời gian từng giai đoạn (phân giải tên, TCP
+connect, banner, USER/PASS, thiết lập sau đăng nhập tới PWD đầu tiên) vào một
+ConnectTiming, phát lên topic SESSION và cộng vào connect_histograms. Mỗi mẫu
+RTT trên kênh điều khiển (EPSV/PASV/PORT, NOOP keepalive) được cộng vào
+rtt_histogram.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from .config import Config
+
+TRANSFER = 'transfer'  # Topic: một TransferStats sau mỗi lần truyền file
+SESSION = 'session'    # Topic: một ConnectTiming sau mỗi lần đăng nhập
+
+# Các giai đoạn thiết lập phiên, theo thứ tự
+CONNECT_PHASES = ('dns', 'connect', 'banner', 'login', 'setup')
+
+# Thông lượng đỉnh được tính trên các cửa sổ dài chừng này (giây)
+PEAK_WINDOW = 0.25
+
+MiB = 1024 * 1024
+
+
+class TransferMeter:
+    """Đo một lần truyền trên một kết nối dữ liệu
+
+    Gọi connected() khi kết nối dữ liệu sẵn sàng (server đã trả 150), add(n)
+    sau mỗi block và stats() khi xong. Một khoảng lặng giữa hai block dài
+    hơn Config.STALL_THRESHOLD giây được tính là một lần khựng.
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.connect_time = None
+        self.ttfb = None
+        self.bytes = 0
+        self.peak = 0.0
+        self.stalls = 0
+        self.stall_threshold = Config.STALL_THRESHOLD
+        self._last = self._window_start = self.start
+        self._window_bytes = 0
+        self._data_start = None
+
+    def connected(self):
+        if self.connect_time is None:
+            now = time.monotonic()
+            self.connect_time = now - self.start
+            self._last = self._window_start = self._data_start = now
+
+    def add(self, nbytes):
+        now = time.monotonic()
+        if self.ttfb is None:
+            self.ttfb = now - self.start
+        elif now - self._last >= self.stall_threshold:
+            self.stalls += 1
+        self._last = now
+        self.bytes += nbytes
+        self._window_bytes += nbytes
+        elapsed = now - self._window_start
+        if elapsed >= PEAK_WINDOW:
+            self.peak = max(self.peak, self._window_bytes / elapsed)
+            self._window_start = now
+            self._window_bytes = 0
+
+    def stats(self):
+        """Số liệu đến thời điểm hiện tại dưới dạng dict"""
+        now = time.monotonic()
+        data_time = now - (self._data_start or self.start)
+        mean = self.bytes / data_time if data_time > 0 else 0.0
+        return {'bytes': self.bytes, 'seconds': now - self.start, 'connect_time': self.connect_time,
+                'ttfb': self.ttfb, 'mean_bps': mean, 'peak_bps': max(self.peak, mean), 'stalls': self.stalls}
+
+
+class TransferStats:
+    """Bản ghi thống kê của một lần truyền file (gộp mọi lần thử lại)
+
+    connect_time và ttfb lấy từ lần thử đầu tiên có kết nối dữ liệu; bytes,
+    stalls cộng dồn qua các lần thử; peak_bps là lớn nhất; seconds là tổng
+    thời gian từ lúc bắt đầu tới khi xong (kể cả các lần thử lại).
+    """
+
+    __slots__ = ('direction', 'remote_path', 'local_path', 'host', 'started', 'ok', 'error', 'bytes',
+                 'seconds', 'data_seconds', 'connect_time', 'ttfb', 'peak_bps', 'stalls', 'retries', 'retry_wait',
+                 'segments', 'mode', 'block_size', 'checksum', '_t0')
+
+    def __init__(self, direction, remote_path, local_path, host=None):
+        self.direction = direction
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.host = host
+        self.started = time.time()
+        self.ok = False
+        self.error = None
+        self.bytes = 0
+        self.seconds = 0.0
+        self.data_seconds = 0.0
+        self.connect_time = None
+        self.ttfb = None
+        self.peak_bps = 0.0
+        self.stalls = 0
+        self.retries = 0
+        self.retry_wait = 0.0  # Tổng số giây chờ backoff giữa các lần thử
+        self.segments = 1
+        self.mode = 'S'
+        self.block_size = None
+        self.checksum = None  # Tên thuật toán khi nội dung đã được đối chiếu với server
+        self._t0 = time.monotonic()
+
+    @property
+    def mean_bps(self):
+        """Thông lượng trung bình trong thời gian có kết nối dữ liệu (byte/giây)"""
+        return self.bytes / self.data_seconds if self.data_seconds > 0 else 0.0
+
+    def add_attempt(self, stats):
+        """Gộp số liệu một kết nối dữ liệu (FTP.last_transfer hoặc TransferMeter.stats())"""
+        self.bytes += stats.get('bytes', 0)
+        self.data_seconds += stats.get('seconds', 0.0) - (stats.get('connect_time') or 0.0)
+        if self.connect_time is None:
+            self.connect_time = stats.get('connect_time')
+        if self.ttfb is None:
+            self.ttfb = stats.get('ttfb')
+        self.peak_bps = max(self.peak_bps, stats.get('peak_bps', 0.0))
+        self.stalls += stats.get('stalls', 0)
+        self.mode = stats.get('mode', self.mode)
+        self.block_size = stats.get('block_size', self.block_size)
+
+    def finish(self, ok):
+        """Chốt kết quả; error (lỗi của lần thử cuối) chỉ giữ lại khi thất bại"""
+        self.ok = ok
+        if ok:
+            self.error = None
+        self.seconds = time.monotonic() - self._t0
+        return self
+
+    def as_dict(self):
+        record = {name: getattr(self, name) for name in self.__slots__ if not name.startswith('_')}
+        record['mean_bps'] = self.mean_bps
+        return record
+
+    def summary(self):
+        """Một dòng tóm tắt để in ra CLI/GUI"""
+        status = 'ok' if self.ok else f'FAILED ({self.error})'
+        parts = [f"{self.direction} {self.remote_path}: {self.bytes / MiB:.2f} MiB in {self.seconds:.2f} s",
+                 f"{self.mean_bps / MiB:.2f} MiB/s (peak {self.peak_bps / MiB:.2f})"]
+        if self.connect_time is not None:
+            parts.append(f"setup {self.connect_time * 1000:.0f} ms")
+        if self.ttfb is not None:
+            parts.append(f"ttfb {self.ttfb * 1000:.0f} ms")
+        parts.append(f"{self.stalls} stalls, {self.retries} retries")
+        if self.retry_wait:
+            parts[-1] += f" ({self.retry_wait:.1f} s backoff)"
+        if self.segments > 1:
+            parts.append(f"{self.segments} segments")
+        if self.mode != 'S':
+            parts.append(f"MODE {self.mode}")
+        if self.checksum:
+            parts.append(f"{self.checksum} verified")
+        return ', '.join(parts) + f" - {status}"
+
+    def __repr__(self):
+        return f"TransferStats({self.summary()})"
+
+
+def summarize(records):
+    """Một dòng tổng hợp cho nhiều bản ghi TransferStats"""
+    records = list(records)
+    failed = sum(not r.ok for r in records)
+    total = sum(r.bytes for r in records)
+    data_seconds = sum(r.data_seconds for r in records)
+    mean = total / data_seconds if data_seconds > 0 else 0.0
+    slowest = min((r for r in records if r.ok and r.bytes), key=lambda r: r.mean_bps, default=None)
+    line = (f"{len(records)} transfers ({failed} failed), {total / MiB:.2f} MiB, mean {mean / MiB:.2f} MiB/s, "
+            f"{sum(r.retries for r in records)} retries ({sum(r.retry_wait for r in records):.1f} s backoff), "
+            f"{sum(r.stalls for r in records)} stalls")
+    if slowest is not None:
+        line += f"; slowest: {slowest.remote_path} at {slowest.mean_bps / MiB:.2f} MiB/s"
+    return line
+
+
+class LatencyHistogram:
+    """Histogram độ trễ với các ngăn cố định theo thang log (giây)"""
+
+    BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)  # Ngăn cuối: lớn hơn BOUNDS[-1]
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        index = next((i for i, bound in enumerate(self.BOUNDS) if seconds <= bound), len(self.BOUNDS))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Cận trên của ngăn chứa phân vị p (0-100); None nếu chưa có mẫu"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = p / 100 * self.count
+            seen = 0
+            for index, n in enumerate(self.counts):
+                seen += n
+                if n and seen >= rank:
+                    return self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return "no samples"
+        return (f"n={self.count}, mean {self.total / self.count * 1000:.1f} ms, "
+                f"p50 <= {self.percentile(50) * 1000:.0f} ms, p95 <= {self.percentile(95) * 1000:.0f} ms, "
+                f"max {self.max * 1000:.1f} ms")
+
+    def clear(self):
+        with self._lock:
+            self.counts = [0] * (len(self.BOUNDS) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+
+class ConnectTiming:
+    """Thời gian từng giai đoạn thiết lập một phiên FTP (giây, None = chưa/không đo)
+
+    lap(phase) ghi thời gian từ lần lap trước (hoặc lúc tạo) tới hiện tại và
+    cộng vào connect_histograms. handoff=True khi socket điều khiển được mở
+    sẵn ở nơi khác rồi giao cho phiên (dns/connect đo ở nơi mở socket).
+    """
+
+    __slots__ = ('host', 'port', 'started', 'handoff') + CONNECT_PHASES + ('_last',)
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.started = time.time()
+        self.handoff = False
+        for phase in CONNECT_PHASES:
+            setattr(self, phase, None)
+        self._last = time.monotonic()
+
+    def lap(self, phase):
+        now = time.monotonic()
+        seconds = now - self._last
+        self._last = now
+        setattr(self, phase, seconds)
+        connect_histograms[phase].add(seconds)
+        return seconds
+
+    @property
+    def total(self):
+        return sum(getattr(self, phase) or 0.0 for phase in CONNECT_PHASES)
+
+    def phases(self):
+        """'dns 0.1 ms, tcp 0.3 ms, ...' cho các giai đoạn đã đo"""
+        names = {'connect': 'tcp'}
+        return ', '.join(f"{names.get(phase, phase)} {getattr(self, phase) * 1000:.1f} ms"
+                         for phase in CONNECT_PHASES if getattr(self, phase) is not None)
+
+    def summary(self):
+        return f"{self.host}:{self.port}: {self.phases()} (total {self.total * 1000:.1f} ms)"
+
+    def __repr__(self):
+        return f"ConnectTiming({self.summary()})"
+
+
+# Histogram độ trễ của từng giai đoạn, gộp mọi phiên trong tiến trình
+connect_histograms = {phase: LatencyHistogram() for phase in CONNECT_PHASES}
+
+# RTT kênh điều khiển của mọi phiên
+rtt_histogram = LatencyHistogram()
+
+
+def connect_latency_lines():
+    """Mỗi giai đoạn thiết lập phiên một dòng tóm tắt histogram (bỏ giai đoạn chưa có mẫu)"""
+    return [f"{phase:<8}{connect_histograms[phase].summary()}"
+            for phase in CONNECT_PHASES if connect_histograms[phase].count]
+
+
+class EventBus:
+    """Bus sự kiện đồng bộ trong tiến trình
+
+    publish() gọi lần lượt các subscriber ngay trên thread phát sự kiện (GUI
+    cần tự chuyển về main thread); lỗi trong một subscriber chỉ được ghi log.
+    Mỗi topic giữ lại history sự kiện gần nhất cho recent().
+    """
+
+    def __init__(self, history=100):
+        self.history = history
+        self._subscribers = collections.defaultdict(list)
+        self._recent = collections.defaultdict(lambda: collections.deque(maxlen=self.history))
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, callback):
+        """Đăng ký callback(event) cho topic; trả về callback để unsubscribe sau này"""
+        with self._lock:
+            self._subscribers[topic].append(callback)
+        return callback
+
+    def unsubscribe(self, topic, callback):
+        with self._lock:
+            if callback in self._subscribers[topic]:
+                self._subscribers[topic].remove(callback)
+
+    def publish(self, topic, event):
+        with self._lock:
+            self._recent[topic].append(event)
+            subscribers = list(self._subscribers[topic])
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logging.exception(f"Event subscriber for {topic!r} failed")
+
+    def recent(self, topic, last=None):
+        """Các sự kiện gần nhất của topic (cũ trước, mới sau)"""
+        with self._lock:
+            events = list(self._recent[topic])
+        return events[-last:] if last else events
+
+    def clear(self, topic=None):
+        with self._lock:
+            if topic is None:
+                self._recent.clear()
+            else:
+                self._recent.pop(topic, None)
+
+
+# Bus dùng chung cho cả tiến trình
+bus = EventBus(Config.STATS_HISTORY)
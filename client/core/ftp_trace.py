@@ -0,0 +1,97 @@
+"""
+Ghi vết (trace) kênh điều khiển FTP.
+
+Thay cho việc print() mọi lệnh/phản hồi: mặc định tắt và gần như không tốn chi
+phí (chỉ một phép so sánh level). Khi bật, các lệnh và phản hồi được lưu dạng
+bytes thô vào một ring buffer giới hạn kích thước; chỉ giải mã khi in ra
+(level ECHO) hoặc khi dump lúc có lỗi.
+"""
+
+import collections
+import itertools
+import logging
+import threading
+import time
+
+from .config import Config
+
+TRACE_OFF = 0    # Không ghi gì
+TRACE_RING = 1   # Chỉ lưu vào ring buffer (để dump khi có lỗi)
+TRACE_ECHO = 2   # Lưu vào ring buffer và in ra màn hình như trước đây
+
+LEVEL_NAMES = {'off': TRACE_OFF, 'ring': TRACE_RING, 'on': TRACE_ECHO}
+
+SENT = '>>>'
+RECEIVED = '<<<'
+
+
+class WireTracer:
+    """Ring buffer các lệnh/phản hồi gần nhất trên kênh điều khiển"""
+
+    def __init__(self, level=TRACE_OFF, size=200):
+        self.level = level
+        self.ring = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def new_session_id(self):
+        return next(self._ids)
+
+    def set_level(self, level):
+        if isinstance(level, str):
+            level = LEVEL_NAMES[level.lower()]
+        self.level = level
+
+    def level_name(self):
+        for name, value in LEVEL_NAMES.items():
+            if value == self.level:
+                return name
+        return str(self.level)
+
+    def resize(self, size):
+        with self._lock:
+            self.ring = collections.deque(self.ring, maxlen=size)
+
+    def record(self, session_id, direction, raw):
+        """Ghi một dòng thô; người gọi đã kiểm tra self.level trước khi gọi"""
+        entry = (time.time(), session_id, direction, raw)
+        with self._lock:
+            self.ring.append(entry)
+        if self.level >= TRACE_ECHO:
+            print(self.format_entry(entry))
+
+    @staticmethod
+    def format_entry(entry, with_time=False):
+        ts, session_id, direction, raw = entry
+        text = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+        # Không bao giờ in mật khẩu ra log
+        if direction == SENT and text[:5].upper() == 'PASS ':
+            text = 'PASS ****'
+        line = f"{direction} {text}"
+        if with_time:
+            stamp = time.strftime('%H:%M:%S', time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+            line = f"{stamp} [#{session_id}] {line}"
+        return line
+
+    def dump(self, last=None):
+        """Trả về các dòng đã định dạng của ring buffer (last dòng cuối nếu có)"""
+        with self._lock:
+            entries = list(self.ring)
+        if last:
+            entries = entries[-last:]
+        return [self.format_entry(e, with_time=True) for e in entries]
+
+    def dump_to_log(self, reason, last=None):
+        """Ghi ring buffer vào log khi xảy ra lỗi"""
+        lines = self.dump(last)
+        if not lines:
+            return
+        logging.error("FTP wire trace (%s), last %d exchange(s):\n%s", reason, len(lines), "\n".join(lines))
+
+    def clear(self):
+        with self._lock:
+            self.ring.clear()
+
+
+# Tracer dùng chung cho mọi phiên FTP trong tiến trình
+tracer = WireTracer(Config.TRACE_LEVEL, Config.TRACE_RING_SIZE)
@@ -0,0 +1,161 @@
+"""
+Tinh chỉnh socket và kích thước block cho các kết nối FTP.
+
+Kênh điều khiển gửi lệnh ngắn rồi chờ phản hồi nên tắt Nagle (TCP_NODELAY).
+Kênh dữ liệu dùng bộ đệm gửi/nhận lớn, đặt trước connect/listen để cửa sổ TCP
+được mở rộng ngay từ bắt tay. Kích thước block đọc/ghi của ứng dụng bắt đầu
+từ Config.BLOCK_SIZE_MIN và tăng dần theo thông lượng và RTT đo được;
+Config.FIXED_BLOCK_SIZE cố định block (và tắt tự điều chỉnh) để benchmark lặp
+lại được.
+"""
+
+import socket
+import struct
+import sys
+import time
+
+from .config import Config
+
+# Mỗi lần lấy mẫu thông lượng gồm ít nhất chừng này lần đọc/ghi
+SAMPLE_CALLS = 8
+# Block lớn hơn chỉ được giữ nếu thông lượng tăng ít nhất tỉ lệ này
+MIN_GAIN = 1.1
+
+# Linux: giá trị tối đa cho SO_RCVBUF/SO_SNDBUF; đặt lớn hơn sẽ bị cắt xuống và
+# còn tắt cơ chế tự điều chỉnh bộ đệm của kernel
+_BUFFER_LIMITS = {
+    socket.SO_RCVBUF: '/proc/sys/net/core/rmem_max',
+    socket.SO_SNDBUF: '/proc/sys/net/core/wmem_max',
+}
+
+
+def _buffer_limit(option):
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        with open(_BUFFER_LIMITS[option]) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _set_buffer(sock, option, size):
+    try:
+        if sock.getsockopt(socket.SOL_SOCKET, option) >= size:
+            return
+        limit = _buffer_limit(option)
+        if limit is not None and size > limit:
+            return  # Để kernel tự điều chỉnh còn tốt hơn bị khóa ở rmem_max/wmem_max
+        sock.setsockopt(socket.SOL_SOCKET, option, size)
+    except OSError:
+        pass
+
+
+def tune_control_socket(sock):
+    """Tắt Nagle trên socket điều khiển (nếu Config.CONTROL_TCP_NODELAY)"""
+    if not Config.CONTROL_TCP_NODELAY:
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        pass
+
+
+def tune_data_socket(sock):
+    """Đặt bộ đệm gửi/nhận lớn cho socket dữ liệu (gọi trước connect/listen)"""
+    size = Config.DATA_SOCKET_BUFFER
+    if size:
+        _set_buffer(sock, socket.SO_RCVBUF, size)
+        _set_buffer(sock, socket.SO_SNDBUF, size)
+
+
+def socket_buffers(sock):
+    """Kích thước bộ đệm thực tế {'rcvbuf': ..., 'sndbuf': ...} của socket"""
+    try:
+        return {'rcvbuf': sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+                'sndbuf': sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)}
+    except OSError:
+        return {}
+
+
+def tcp_rtt(sock):
+    """RTT (giây) do kernel ước lượng cho socket, None nếu không lấy được (chỉ Linux)"""
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+        # struct tcp_info: tcpi_rtt (micro giây) nằm ở offset 68
+        return struct.unpack_from('I', info, 68)[0] / 1e6 or None
+    except (OSError, struct.error):
+        return None
+
+
+def _round_up_pow2(n):
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+class BlockSizer:
+    """Chọn kích thước block đọc/ghi cho một lần truyền dữ liệu
+
+    Sau mỗi lần đọc/ghi gọi update(số_byte, full). Cứ mỗi mẫu (ít nhất
+    SAMPLE_CALLS lần và một RTT), block được tăng lên lũy thừa của 2 gần nhất
+    không nhỏ hơn thông lượng x RTT, hoặc gấp đôi nếu phần lớn các lần đọc lấp
+    đầy buffer (kernel còn dữ liệu chờ, ứng dụng đang là nút thắt). Nếu lần
+    tăng trước không làm thông lượng tăng ít nhất MIN_GAIN lần thì quay về block
+    cũ và dừng điều chỉnh (block quá lớn tốn cấp phát và cache). Block không
+    vượt quá maximum.
+    """
+
+    def __init__(self, rtt=None, fixed=None, minimum=None, maximum=None):
+        fixed = fixed or Config.FIXED_BLOCK_SIZE
+        self.minimum = minimum or Config.BLOCK_SIZE_MIN
+        self.maximum = max(self.minimum, maximum or Config.BLOCK_SIZE_MAX)
+        self.adaptive = not fixed
+        self.settled = bool(fixed)  # True: không điều chỉnh nữa
+        self.size = fixed or self.minimum
+        self.rtt = rtt
+        self.throughput = 0.0
+        self._previous = None  # (block, thông lượng) trước lần tăng gần nhất
+        self._calls = 0
+        self._full = 0
+        self._bytes = 0
+        self._start = time.monotonic()
+
+    def update(self, nbytes, full=False):
+        """Ghi nhận một lần đọc/ghi nbytes byte; trả về kích thước block cho lần tiếp theo"""
+        if self.settled:
+            return self.size
+        self._calls += 1
+        self._bytes += nbytes
+        self._full += full
+        if self._calls < SAMPLE_CALLS:
+            return self.size
+        now = time.monotonic()
+        elapsed = now - self._start
+        if elapsed <= 0 or (self.rtt and elapsed < self.rtt):
+            return self.size
+        self.throughput = self._bytes / elapsed
+        mostly_full = self._full * 2 >= self._calls
+        self._calls = self._full = self._bytes = 0
+        self._start = now
+
+        if self._previous:
+            size, throughput = self._previous
+            if self.throughput < throughput * MIN_GAIN:
+                self.size = size
+                self.settled = True
+                return self.size
+
+        target = self.size
+        if self.rtt:
+            target = max(target, _round_up_pow2(self.throughput * self.rtt))
+        if mostly_full:
+            target = max(target, self.size * 2)
+        target = min(self.maximum, target)
+        self._previous = (self.size, self.throughput) if target > self.size else None
+        self.size = target
+        return self.size
+
+    def stats(self):
+        return {'block_size': self.size, 'adaptive': self.adaptive, 'rtt': self.rtt,
+                'throughput': self.throughput}
@@ -1,21 +1,47 @@
 #!/usr/bin/env python3
 """
-Raw Socket FTP Implementation - Không dùng class wrapper, chỉ socket thô
+Raw Socket FTP Implementation - chỉ dùng socket thô, không dùng ftplib
+
+Mỗi đối tượng FTP là một phiên (session) độc lập: có socket điều khiển, bộ đọc,
+chế độ truyền và khóa riêng, nên một tiến trình có thể giữ nhiều kết nối cùng
+lúc. Các hàm ftp_* ở cấp module vẫn được giữ lại và thao tác trên một phiên
+mặc định để tương thích với code cũ.
 """
 
 import socket
 import re
+import codecs
 import os
 import logging
+import posixpath
+import select
+import stat
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có fcntl/splice
+    fcntl = None
 
-# Global variables để lưu trạng thái FTP connection
-ftp_socket = None
-ftp_host = None
-ftp_port = 21
-ftp_timeout = 60
-ftp_passive_mode = True
-ftp_encoding = 'utf-8'
-ftp_last_response = None
+from .config import Config
+from .ftp_trace import tracer as wire_tracer, SENT, RECEIVED
+from .ftp_listing import parse_mlsd_line, parse_list_line, parse_mdtm
+from .ftp_tuning import BlockSizer, tune_control_socket, tune_data_socket, socket_buffers, tcp_rtt
+from .ftp_deflate import DeflateSocket
+from .ftp_features import Capabilities, feature_cache
+from .ftp_stats import TransferMeter, ConnectTiming, SESSION, bus as stats_bus, rtt_histogram
+
+# Độ dài tối đa của một dòng phản hồi trên kênh điều khiển
+MAXLINE = 8192
+SENDFILE_SLICE = 4 * 1024 * 1024  # Số byte mỗi lần sendfile (mỗi lần báo tiến độ một lần)
+SPLICE_CHUNK = 1024 * 1024  # Dung lượng pipe (và số byte tối đa mỗi lần splice)
+# Số lệnh tối đa được gửi đi mà chưa nhận phản hồi khi pipeline
+PIPELINE_DEPTH = 16
+LISTING_EWMA = 0.3  # Trọng số của lần đo mới khi làm mượt thời gian liệt kê thư mục
+# Telnet IAC IP IAC: byte IAC cuối được gửi dạng urgent (MSG_OOB), DM (0xF2) đứng đầu dòng ABOR (RFC 959, 4.1.3)
+TELNET_IP_SYNCH = b'\xff\xf4\xff'
+TELNET_DM = b'\xf2'
 
 # Exception classes
 class FTPError(Exception):
@@ -30,402 +56,1037 @@ class FTPTempError(FTPError):
 class FTPProtoError(FTPError):
     pass
 
+class FTPAbortedError(FTPError):
+    """Lần truyền bị hủy bằng FTP.abort() (phiên vẫn dùng tiếp được)"""
+    pass
+
 # Compatibility
-all_errors = (FTPError, FTPPermError, FTPTempError, FTPProtoError, socket.error, OSError)
+all_errors = (FTPError, FTPPermError, FTPTempError, FTPProtoError, FTPAbortedError, socket.error, OSError, EOFError)
 error_perm = FTPPermError
 error_temp = FTPTempError
 error_proto = FTPProtoError
 
-def ftp_send_line(line):
-    """Gửi một dòng lệnh tới FTP server"""
-    global ftp_socket, ftp_encoding
-    if not isinstance(line, bytes):
-        line = line.encode(ftp_encoding)
-    line += b'\r\n'
-    ftp_socket.sendall(line)
-    print(f">>> {line.decode(ftp_encoding).strip()}")
+class ControlReader:
+    """Bộ đọc có đệm cho kênh điều khiển.
 
-def ftp_recv_line():
-    """Nhận một dòng phản hồi từ FTP server"""
-    global ftp_socket, ftp_encoding
-    line = b''
-    while True:
-        char = ftp_socket.recv(1)
-        if not char:
-            break
-        line += char
-        if line.endswith(b'\r\n'):
-            break
-    
-    response = line.decode(ftp_encoding).rstrip('\r\n')
-    print(f"<<< {response}")
-    return response
+    Nhận dữ liệu theo từng khối lớn bằng recv_into, tách dòng theo CRLF và giữ
+    lại phần dư cho lần đọc tiếp theo thay vì gọi recv(1) cho từng byte.
+    """
 
-def ftp_get_response():
-    """Nhận phản hồi từ server và xử lý multi-line response"""
-    global ftp_last_response
-    
-    resp = ftp_recv_line()
-    ftp_last_response = resp
-    
-    # Xử lý multi-line response
-    if len(resp) >= 4 and resp[3] == '-':
-        code = resp[:3]
-        while True:
-            line = ftp_recv_line()
-            if line.startswith(code + ' '):
-                resp = line
-                ftp_last_response = resp
-                break
-    
-    # Kiểm tra lỗi
-    if resp.startswith('4'):
-        raise FTPTempError(resp)
-    elif resp.startswith('5'):
-        raise FTPPermError(resp)
-    
-    return resp
+    def __init__(self, sock, bufsize=8192):
+        self.sock = sock
+        self._chunk = bytearray(bufsize)
+        self._view = memoryview(self._chunk)
+        self._buf = bytearray()
+        self._pos = 0
+        self.recv_calls = 0
 
-def ftp_send_command(cmd):
-    """Gửi lệnh và nhận phản hồi"""
-    ftp_send_line(cmd)
-    return ftp_get_response()
+    def pending(self):
+        """Số byte đã nhận nhưng chưa được đọc"""
+        return len(self._buf) - self._pos
 
-def ftp_connect(host, port=21, timeout=60):
-    """Kết nối tới FTP server"""
-    global ftp_socket, ftp_host, ftp_port, ftp_timeout
-    
-    ftp_host = host
-    ftp_port = port
-    ftp_timeout = timeout
-    
-    try:
-        ftp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        ftp_socket.settimeout(timeout)
-        ftp_socket.connect((host, port))
-        
-        # Đọc welcome message
-        welcome = ftp_get_response()
-        print(f"Connected to {host}:{port}")
-        return welcome
-        
-    except socket.error as e:
-        if ftp_socket:
-            ftp_socket.close()
-            ftp_socket = None
-        raise FTPError(f"Cannot connect to {host}:{port} - {e}")
+    def _fill(self):
+        # Dồn phần dư lên đầu bộ đệm trước khi nhận thêm
+        if self._pos:
+            del self._buf[:self._pos]
+            self._pos = 0
+        n = self.sock.recv_into(self._chunk)
+        self.recv_calls += 1
+        if n:
+            self._buf += self._view[:n]
+        return n
 
-def ftp_login(user='anonymous', passwd='anonymous@'):
-    """Đăng nhập FTP server"""
-    resp = ftp_send_command(f'USER {user}')
-    if resp.startswith('3'):  # Cần password
-        resp = ftp_send_command(f'PASS {passwd}')
-    return resp
+    def readline(self):
+        """Trả về một dòng (kể cả CRLF), hoặc phần còn lại nếu server đóng kết nối"""
+        while True:
+            idx = self._buf.find(b'\n', self._pos)
+            if idx >= 0:
+                line = bytes(self._buf[self._pos:idx + 1])
+                self._pos = idx + 1
+                return line
+            if self.pending() > MAXLINE:
+                raise FTPProtoError(f"Line too long (more than {MAXLINE} bytes)")
+            if not self._fill():
+                line = bytes(self._buf[self._pos:])
+                self._buf.clear()
+                self._pos = 0
+                return line
 
-def ftp_quit():
-    """Thoát FTP session"""
-    global ftp_socket
-    try:
-        resp = ftp_send_command('QUIT')
-    except (FTPError, socket.error):
-        resp = None
-    finally:
-        if ftp_socket:
-            ftp_socket.close()
-            ftp_socket = None
-    return resp
 
-def ftp_pwd():
-    """Lấy thư mục hiện tại"""
-    resp = ftp_send_command('PWD')
-    # Trích xuất path từ response như '257 "/path" is current directory'
-    match = re.search(r'"([^"]*)"', resp)
-    if match:
-        return match.group(1)
-    return '/'
+def _is_regular_file(file_obj):
+    """file_obj có file descriptor của một file thường không (dùng được với sendfile)"""
+    try:
+        return stat.S_ISREG(os.fstat(file_obj.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        return False
 
-def ftp_cwd(dirname):
-    """Thay đổi thư mục"""
-    return ftp_send_command(f'CWD {dirname}')
 
-def ftp_mkd(dirname):
-    """Tạo thư mục"""
-    resp = ftp_send_command(f'MKD {dirname}')
-    match = re.search(r'"([^"]*)"', resp)
-    if match:
-        return match.group(1)
-    return dirname
+def _can_splice(file_obj):
+    """Có thể splice socket -> file_obj không (Linux, file thường, không mở ở chế độ append)"""
+    return hasattr(os, 'splice') and _is_regular_file(file_obj) and 'a' not in getattr(file_obj, 'mode', 'a')
 
-def ftp_rmd(dirname):
-    """Xóa thư mục"""
-    return ftp_send_command(f'RMD {dirname}')
 
-def ftp_delete(filename):
-    """Xóa file"""
-    return ftp_send_command(f'DELE {filename}')
+def open_control_socket(host, port, timeout, timing=None):
+    """Mở kết nối TCP tới kênh điều khiển; ghi thời gian phân giải tên và connect vào timing
 
-def ftp_rename(fromname, toname):
-    """Đổi tên file"""
-    resp = ftp_send_command(f'RNFR {fromname}')
-    if resp.startswith('3'):
-        return ftp_send_command(f'RNTO {toname}')
-    return resp
+    Socket trả về có thể giao cho FTP.connect(..., sock=sock) để không phải
+    bắt tay TCP lần nữa (ví dụ khi cửa sổ đăng nhập đã kiểm tra kết nối).
+    """
+    timing = timing or ConnectTiming(host, port)
+    addresses = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    timing.lap('dns')
+    error = None
+    # Thử lần lượt các địa chỉ (IPv6 và IPv4) như socket.create_connection
+    for family, socktype, proto, _, address in addresses:
+        sock = socket.socket(family, socktype, proto)
+        try:
+            tune_control_socket(sock)
+            sock.settimeout(timeout)
+            sock.connect(address)
+        except OSError as e:
+            sock.close()
+            error = e
+            continue
+        except BaseException:
+            sock.close()
+            raise
+        timing.lap('connect')
+        return sock
+    raise error or OSError(f"getaddrinfo returned no addresses for {host}")
 
-def ftp_size(filename):
-    """Lấy kích thước file"""
-    resp = ftp_send_command(f'SIZE {filename}')
-    try:
-        return int(resp.split()[1])
-    except (IndexError, ValueError):
-        raise FTPProtoError(f"Invalid SIZE response: {resp}")
 
-def ftp_set_pasv(passive):
-    """Đặt chế độ passive"""
-    global ftp_passive_mode
-    ftp_passive_mode = passive
+# Các method của FTP/FTPHelpers chỉ đọc trạng thái server, gọi lại được sau khi kết nối lại
+IDEMPOTENT_METHODS = frozenset({'pwd', 'cwd', 'nlst', 'dir', 'entries', 'list_entries', 'list_files', 'feat',
+                                'size', 'size_many', 'mdtm', 'mlst', 'stat_lines', 'remote_size', 'remote_sizes'})
 
-def ftp_make_pasv():
-    """Tạo kết nối passive mode"""
-    global ftp_timeout
-    
-    resp = ftp_send_command('PASV')
-    # Parse PASV response như '227 Entering Passive Mode (192,168,1,1,20,21)'
-    match = re.search(r'\((\d+),(\d+),(\d+),(\d+),(\d+),(\d+)\)', resp)
-    if not match:
-        raise FTPProtoError(f"Invalid PASV response: {resp}")
-    
-    nums = [int(x) for x in match.groups()]
-    host = '.'.join(map(str, nums[:4]))
-    port = nums[4] * 256 + nums[5]
-    
-    # Tạo data connection
-    data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    data_socket.settimeout(ftp_timeout)
-    data_socket.connect((host, port))
-    return data_socket
 
-def ftp_make_port():
-    """Tạo kết nối active mode"""
-    global ftp_timeout
-    
-    # Tạo listening socket
-    data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    data_socket.bind(('', 0))
-    data_socket.listen(1)
-    
-    # Lấy local IP và port
-    host, port = data_socket.getsockname()
-    hbytes = host.split('.')
-    pbytes = [str(port // 256), str(port % 256)]
-    
-    # Gửi lệnh PORT
-    port_cmd = f"PORT {','.join(hbytes + pbytes)}"
-    ftp_send_command(port_cmd)
-    
-    return data_socket
-
-def ftp_transfer_cmd(cmd):
-    """Thiết lập kết nối truyền dữ liệu"""
-    global ftp_passive_mode
-    
-    if ftp_passive_mode:
-        data_socket = ftp_make_pasv()
-        ftp_send_command(cmd)
-        return data_socket
-    else:
-        data_socket = ftp_make_port()
-        ftp_send_command(cmd)
-        conn, addr = data_socket.accept()
-        data_socket.close()
-        return conn
+class CommandResult:
+    """Kết quả của một lệnh trong pipeline: phản hồi hoặc lỗi FTP của riêng lệnh đó"""
 
-def ftp_nlst(*args):
-    """Lấy danh sách tên file"""
-    global ftp_encoding
-    
-    cmd = 'NLST'
-    if args:
-        cmd += ' ' + ' '.join(args)
-    
-    data_socket = ftp_transfer_cmd(cmd)
-    
-    try:
-        data = b''
-        while True:
-            chunk = data_socket.recv(8192)
-            if not chunk:
-                break
-            data += chunk
-    finally:
-        data_socket.close()
-        ftp_get_response()  # Nhận phản hồi hoàn thành
-    
-    if not data:
-        return []
-    
-    files = data.decode(ftp_encoding).strip().split('\n')
-    return [f.strip() for f in files if f.strip()]
+    __slots__ = ('command', 'response', 'error')
 
-def ftp_dir(path=None, callback=None):
-    """Lấy danh sách chi tiết thư mục"""
-    global ftp_encoding
-    
-    cmd = 'LIST'
-    if path:
-        cmd += f' {path}'
-    
-    data_socket = ftp_transfer_cmd(cmd)
-    
-    try:
-        data = b''
-        while True:
-            chunk = data_socket.recv(8192)
-            if not chunk:
-                break
-            data += chunk
-    finally:
-        data_socket.close()
-        ftp_get_response()  # Nhận phản hồi hoàn thành
-    
-    if data:
-        lines = data.decode(ftp_encoding).strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if line:
-                if callback:
-                    callback(line)
-                else:
-                    print(line)
+    def __init__(self, command):
+        self.command = command
+        self.response = None
+        self.error = None
 
-def ftp_retrbinary(cmd, callback, blocksize=8192):
-    """Tải file ở chế độ binary"""
-    data_socket = ftp_transfer_cmd(cmd)
-    
-    try:
-        while True:
-            data = data_socket.recv(blocksize)
-            if not data:
-                break
-            callback(data)
-    finally:
-        data_socket.close()
-        ftp_get_response()
+    @property
+    def ok(self):
+        return self.error is None
 
-def ftp_retrlines(cmd, callback=None):
-    """Tải file ở chế độ ASCII"""
-    global ftp_encoding
-    
-    data_socket = ftp_transfer_cmd(cmd)
-    
-    try:
-        data = b''
-        while True:
-            chunk = data_socket.recv(8192)
-            if not chunk:
-                break
-            data += chunk
-    finally:
-        data_socket.close()
-        ftp_get_response()
-    
-    if data:
-        lines = data.decode(ftp_encoding).split('\n')
-        for line in lines:
-            line = line.rstrip('\r')
-            if callback:
-                callback(line)
-            else:
-                print(line)
+    def __repr__(self):
+        return f"CommandResult({self.command!r}, response={self.response!r}, error={self.error!r})"
 
-def ftp_storbinary(cmd, file_obj, blocksize=8192):
-    """Upload file ở chế độ binary"""
-    global ftp_encoding
-    
-    data_socket = ftp_transfer_cmd(cmd)
-    
-    try:
-        while True:
-            data = file_obj.read(blocksize)
-            if not data:
-                break
-            if isinstance(data, str):
-                data = data.encode(ftp_encoding)
-            data_socket.sendall(data)
-    finally:
-        data_socket.close()
-        ftp_get_response()
 
-def ftp_storlines(cmd, lines):
-    """Upload file ở chế độ ASCII"""
-    global ftp_encoding
-    
-    data_socket = ftp_transfer_cmd(cmd)
-    
-    try:
-        for line in lines:
-            if isinstance(line, str):
-                line = line.encode(ftp_encoding)
-            if not line.endswith(b'\r\n'):
-                line += b'\r\n'
-            data_socket.sendall(line)
-    finally:
-        data_socket.close()
-        ftp_get_response()
+class FTP:
+    """Một phiên FTP trên raw socket (giao diện tương tự ftplib.FTP)
 
-def ftp_voidcmd(cmd):
-    """Gửi lệnh và trả về phản hồi"""
-    return ftp_send_command(cmd)
+    Mọi lệnh đều chạy dưới self.lock (RLock), nên nhiều thread dùng chung một
+    phiên (ví dụ GUI làm mới danh sách trong khi thread khác đang truyền file)
+    sẽ lần lượt chờ nhau thay vì ghi xen kẽ vào cùng một socket.
+    """
 
-# Wrapper class để tương thích với code cũ
-class FTP:
-    """Wrapper class sử dụng raw socket functions"""
-    
     def __init__(self):
         self.host = None
         self.port = 21
-        
-    def connect(self, host, port=21, timeout=60):
-        self.host = host
-        self.port = port
-        return ftp_connect(host, port, timeout)
-        
+        self.timeout = 60
+        self.passive_mode = True
+        self.encoding = 'utf-8'
+        self.sock = None
+        self.reader = None
+        self.last_response = None
+        self.response_lines = []
+        self.features = None
+        self.user = None
+        self.passwd = None
+        self.state = {}  # CWD/TYPE/MODE hiện tại (nếu biết), dùng để khôi phục phiên
+        self.deflate_level = None  # Mức nén zlib cho MODE Z (None = Config.MODE_Z_LEVEL)
+        self.rtt = None  # RTT ước lượng trên kênh điều khiển (giây), đo từ EPSV/PASV/PORT và NOOP keepalive
+        self.last_activity = time.monotonic()  # Lần gần nhất gửi/nhận trên kênh điều khiển
+        self.keepalive = None  # Keepalive đang chạy cho phiên (ftp_keepalive.py), dừng khi close()
+        self.broken = False  # Kênh điều khiển đã hỏng (mất kết nối, timeout, 421): cần reconnect()
+        self.auto_reconnect = Config.AUTO_RECONNECT  # FTPHelpers/CLI/GUI tự reconnect() khi mất kết nối
+        self.reconnects = 0  # Số lần đã kết nối lại thành công
+        self.data_socket = None  # Kênh dữ liệu đang truyền, để abort() từ thread khác
+        self.aborting = False  # abort() đã gửi ABOR cho lần truyền hiện tại
+        self._abort_lock = threading.Lock()  # Giữa abort() và lúc kết thúc lần truyền (không dùng self.lock)
+        self.segmented = None  # SegmentedDownload đang chạy cho phiên: abort() hủy mọi đoạn của nó
+        self.large_dirs = set()  # Thư mục quá Config.STAT_LISTING_MAX_ENTRIES mục: không liệt kê qua STAT
+        self.empty_dirs = set()  # Thư mục rỗng đã biết qua kênh dữ liệu: STAT không có dòng nào là đáng tin
+        self.listings = 0  # Số lần liệt kê đã chọn cách, để thỉnh thoảng đo lại cách chậm hơn
+        self.last_transfer = {}  # Số liệu của lần truyền dữ liệu gần nhất (thời gian, thông lượng, block, ...)
+        self.connect_timing = None  # ConnectTiming của lần thiết lập phiên gần nhất
+        self.lock = threading.RLock()
+        self.tracer = wire_tracer
+        self.trace_id = wire_tracer.new_session_id()
+
+    # ---------- Kênh điều khiển ----------
+    def send_line(self, line):
+        """Gửi một dòng lệnh tới FTP server"""
+        if not isinstance(line, bytes):
+            line = line.encode(self.encoding)
+        line += b'\r\n'
+        try:
+            self.sock.sendall(line)
+        except OSError:
+            self.broken = True
+            raise
+        self.last_activity = time.monotonic()
+        if self.tracer.level:
+            self.tracer.record(self.trace_id, SENT, line)
+
+    def recv_line(self):
+        """Nhận một dòng phản hồi từ FTP server"""
+        try:
+            line = self.reader.readline()
+        except OSError:
+            self.broken = True
+            raise
+        if not line:
+            self.broken = True
+            raise EOFError("Connection closed by server")
+        self.last_activity = time.monotonic()
+        if self.tracer.level:
+            self.tracer.record(self.trace_id, RECEIVED, line)
+        return line.decode(self.encoding).rstrip('\r\n')
+
+    def get_response(self):
+        """Nhận phản hồi từ server và xử lý multi-line response"""
+        with self.lock:
+            resp = self.recv_line()
+            self.last_response = resp
+            self.response_lines = [resp]
+
+            # Xử lý multi-line response
+            if len(resp) >= 4 and resp[3] == '-':
+                code = resp[:3]
+                while True:
+                    line = self.recv_line()
+                    self.response_lines.append(line)
+                    if line.startswith(code + ' '):
+                        resp = line
+                        self.last_response = resp
+                        break
+
+            # Kiểm tra lỗi
+            if resp.startswith('421'):
+                self.broken = True  # Server sắp đóng kênh điều khiển
+            if resp.startswith('4'):
+                raise FTPTempError(resp)
+            elif resp.startswith('5'):
+                raise FTPPermError(resp)
+
+            return resp
+
+    def send_command(self, cmd):
+        """Gửi lệnh và nhận phản hồi"""
+        with self.lock:
+            self.send_line(cmd)
+            resp = self.get_response()
+            self._track_state(cmd)
+            return resp
+
+    def _track_state(self, cmd):
+        """Ghi nhớ thư mục hiện tại và TYPE/MODE sau một lệnh thành công"""
+        verb, _, arg = cmd.partition(' ')
+        verb = verb.upper()
+        if verb in ('TYPE', 'MODE'):
+            self.state[verb] = arg.strip().upper()
+        elif verb in ('CWD', 'XCWD', 'CDUP', 'XCUP'):
+            current = self.state.get('CWD')
+            target = '..' if verb in ('CDUP', 'XCUP') else arg.strip()
+            if target.startswith('/'):
+                self.state['CWD'] = posixpath.normpath(target)
+            elif current:
+                self.state['CWD'] = posixpath.normpath(posixpath.join(current, target))
+            else:
+                # Chưa biết đường dẫn tuyệt đối: nhớ đường dẫn tương đối so với thư mục lúc đăng nhập
+                self.state['CWD'] = posixpath.normpath(target)
+
+    def voidcmd(self, cmd):
+        """Gửi lệnh và trả về phản hồi"""
+        return self.send_command(cmd)
+
+    def pipeline(self, commands, max_in_flight=PIPELINE_DEPTH):
+        """Gửi nhiều lệnh điều khiển liên tiếp rồi ghép phản hồi theo thứ tự.
+
+        Tối đa max_in_flight lệnh được gửi đi khi chưa có phản hồi; mỗi khi nhận
+        một phản hồi thì gửi tiếp lệnh kế. Lỗi 4xx/5xx được ghi vào
+        CommandResult của lệnh tương ứng thay vì dừng cả lô. Lỗi kết nối vẫn
+        được raise vì các phản hồi còn lại không thể ghép được nữa.
+        """
+        commands = list(commands)
+        results = [CommandResult(cmd) for cmd in commands]
+        max_in_flight = max(1, max_in_flight)
+
+        with self.lock:
+            sent = 0
+            for received, result in enumerate(results):
+                window_end = min(len(commands), received + max_in_flight)
+                if sent < window_end:
+                    self._send_lines(commands[sent:window_end])
+                    sent = window_end
+                try:
+                    result.response = self.get_response()
+                    self._track_state(result.command)
+                except (FTPTempError, FTPPermError) as e:
+                    result.error = e
+        return results
+
+    def _send_lines(self, lines):
+        """Gửi nhiều dòng lệnh trong một lần sendall"""
+        encoded = [(line if isinstance(line, bytes) else line.encode(self.encoding)) + b'\r\n' for line in lines]
+        try:
+            self.sock.sendall(b''.join(encoded))
+        except OSError:
+            self.broken = True
+            raise
+        self.last_activity = time.monotonic()
+        if self.tracer.level:
+            for line in encoded:
+                self.tracer.record(self.trace_id, SENT, line)
+
+    # ---------- Phiên làm việc ----------
+    def connect(self, host, port=21, timeout=60, sock=None, timing=None):
+        """Kết nối tới FTP server
+
+        sock: socket điều khiển đã kết nối sẵn (từ open_control_socket) để dùng
+        luôn thay vì mở kết nối mới; timing: ConnectTiming đã ghi dns/connect
+        lúc mở socket đó. Thời gian từng giai đoạn nằm ở self.connect_timing.
+        """
+        with self.lock:
+            self.host = host
+            self.port = port
+            self.timeout = timeout
+            self.state = {}
+            self.broken = False
+            self.connect_timing = timing or ConnectTiming(host, port)
+
+            try:
+                if sock is None:
+                    sock = open_control_socket(host, port, timeout, self.connect_timing)
+                else:
+                    self.connect_timing.handoff = True
+                    tune_control_socket(sock)
+                    sock.settimeout(timeout)
+                self.sock = sock
+                self.reader = ControlReader(self.sock)
+
+                # Đọc welcome message
+                welcome = self.get_response()
+                self.connect_timing.lap('banner')
+                print(f"Connected to {host}:{port}")
+                return welcome
+
+            except socket.error as e:
+                # Không dùng close(): keepalive của phiên phải còn cho reconnect() bật lại
+                self._close_socket()
+                raise FTPError(f"Cannot connect to {host}:{port} - {e}")
+
     def login(self, user='anonymous', passwd='anonymous@'):
-        return ftp_login(user, passwd)
-        
+        """Đăng nhập FTP server"""
+        with self.lock:
+            resp = self.send_command(f'USER {user}')
+            if resp.startswith('3'):  # Cần password
+                resp = self.send_command(f'PASS {passwd}')
+            # Ghi nhớ để clone() mở thêm phiên cùng tài khoản
+            self.user = user
+            self.passwd = passwd
+            timing = self.connect_timing
+            if timing is not None and timing.login is None:
+                timing.lap('login')
+                stats_bus.publish(SESSION, timing)
+            return resp
+
+    def clone(self):
+        """Mở một phiên mới tới cùng server, cùng tài khoản và chế độ passive/active"""
+        other = FTP()
+        other.passive_mode = self.passive_mode
+        other.encoding = self.encoding
+        other.features = self.features
+        other.connect(self.host, self.port, self.timeout)
+        try:
+            other.login(self.user, self.passwd)
+        except all_errors:
+            other.close()
+            raise
+        return other
+
+    def close(self):
+        """Đóng socket điều khiển mà không gửi QUIT"""
+        if self.keepalive is not None:
+            self.keepalive.stop()
+        with self.lock:
+            self._close_socket()
+
+    def _close_socket(self):
+        if self.sock:
+            self.sock.close()
+        self.sock = None
+        self.reader = None
+
+    @property
+    def connected(self):
+        """False nếu chưa kết nối, đã đóng hoặc kênh điều khiển đã hỏng"""
+        return self.sock is not None and not self.broken
+
+    def reconnect(self, attempts=None, delay=None):
+        """Kết nối và đăng nhập lại tới cùng server, rồi khôi phục CWD, TYPE và MODE
+
+        Thử tối đa attempts lần (Config.RECONNECT_ATTEMPTS); trước lần thử thứ
+        hai chờ delay giây (Config.RECONNECT_DELAY), gấp đôi sau mỗi lần, tối đa
+        Config.RECONNECT_DELAY_MAX. Chế độ passive/active và keepalive được giữ
+        nguyên. Đăng nhập bị từ chối (5xx) thì raise ngay, không thử tiếp.
+        """
+        attempts = max(1, Config.RECONNECT_ATTEMPTS if attempts is None else attempts)
+        delay = Config.RECONNECT_DELAY if delay is None else delay
+        with self.lock:
+            state = dict(self.state)
+            keepalive = self.keepalive
+            error = None
+            for attempt in range(attempts):
+                if attempt:
+                    time.sleep(min(delay * 2 ** (attempt - 1), Config.RECONNECT_DELAY_MAX))
+                self._close_socket()
+                try:
+                    self.connect(self.host, self.port, self.timeout)
+                    self.login(self.user, self.passwd)
+                except FTPPermError:
+                    self._close_socket()
+                    raise
+                except all_errors as e:
+                    error = e
+                    logging.warning(f"Reconnect to {self.host}:{self.port} failed ({attempt + 1}/{attempts}): {e}")
+                    continue
+                self.reconnects += 1
+                self._replay_state(state)
+                logging.info(f"Reconnected to {self.host}:{self.port}, restored {self.state}")
+                if keepalive is not None:
+                    self.keepalive = keepalive
+                    keepalive.start()
+                return
+            self._close_socket()
+            raise FTPError(f"Cannot reconnect to {self.host}:{self.port} after {attempts} attempts: {error}")
+
+    def _replay_state(self, state):
+        """Gửi lại CWD/TYPE (một lô pipeline) và MODE của phiên cũ"""
+        commands = [f"{verb} {state[verb]}" for verb in ('CWD', 'TYPE') if state.get(verb)]
+        for result in self.pipeline(commands):
+            if not result.ok:
+                logging.warning(f"Cannot restore '{result.command}' after reconnect: {result.error}")
+        if state.get('MODE', 'S') != 'S':
+            self.set_mode(state['MODE'], self.deflate_level)
+
+    def ensure_connected(self):
+        """Kết nối lại nếu kênh điều khiển đã hỏng hoặc không trả lời NOOP; True nếu đã kết nối lại"""
+        with self.lock:
+            if self.connected:
+                try:
+                    self.send_command('NOOP')
+                    return False
+                except all_errors:
+                    pass
+            self.reconnect()
+            return True
+
     def quit(self):
-        return ftp_quit()
-        
+        """Thoát FTP session"""
+        with self.lock:
+            try:
+                resp = self.send_command('QUIT')
+            except (FTPError, socket.error, EOFError):
+                resp = None
+            finally:
+                self.close()
+            return resp
+
+    # ---------- Thư mục và file ----------
     def pwd(self):
-        return ftp_pwd()
-        
+        """Lấy thư mục hiện tại"""
+        resp = self.send_command('PWD')
+        timing = self.connect_timing
+        if timing is not None and timing.login is not None and timing.setup is None:
+            # PWD đầu tiên sau đăng nhập: kết thúc giai đoạn thiết lập phiên (TYPE, PASV, FEAT, ...)
+            timing.lap('setup')
+        # Trích xuất path từ response như '257 "/path" is current directory'
+        match = re.search(r'"([^"]*)"', resp)
+        if match:
+            self.state['CWD'] = match.group(1)
+            return match.group(1)
+        return '/'
+
     def cwd(self, dirname):
-        return ftp_cwd(dirname)
-        
+        """Thay đổi thư mục"""
+        return self.send_command(f'CWD {dirname}')
+
     def mkd(self, dirname):
-        return ftp_mkd(dirname)
-        
+        """Tạo thư mục"""
+        resp = self.send_command(f'MKD {dirname}')
+        match = re.search(r'"([^"]*)"', resp)
+        if match:
+            return match.group(1)
+        return dirname
+
     def rmd(self, dirname):
-        return ftp_rmd(dirname)
-        
+        """Xóa thư mục"""
+        return self.send_command(f'RMD {dirname}')
+
     def delete(self, filename):
-        return ftp_delete(filename)
-        
+        """Xóa file"""
+        return self.send_command(f'DELE {filename}')
+
     def rename(self, fromname, toname):
-        return ftp_rename(fromname, toname)
-        
+        """Đổi tên file"""
+        with self.lock:
+            resp = self.send_command(f'RNFR {fromname}')
+            if resp.startswith('3'):
+                return self.send_command(f'RNTO {toname}')
+            return resp
+
     def size(self, filename):
-        return ftp_size(filename)
-        
+        """Lấy kích thước file"""
+        resp = self.send_command(f'SIZE {filename}')
+        try:
+            return int(resp.split()[1])
+        except (IndexError, ValueError):
+            raise FTPProtoError(f"Invalid SIZE response: {resp}")
+
+    def feat(self, refresh=False):
+        """Capabilities của server (dict {TÊN_TÍNH_NĂNG: tham số})
+
+        Lấy từ phiên này, rồi từ feature_cache theo host:port; chỉ gửi FEAT khi
+        cả hai chưa có (hoặc refresh=True), và lưu kết quả lại vào cache.
+        """
+        with self.lock:
+            if self.features is not None and not refresh:
+                return self.features
+            if not refresh:
+                cached = feature_cache.get(self.host, self.port)
+                if cached is not None:
+                    self.features = cached
+                    return cached
+            try:
+                self.send_command('FEAT')
+                features = Capabilities.parse(self.response_lines[1:-1])
+            except FTPPermError:
+                features = Capabilities()  # Server không hỗ trợ FEAT
+            feature_cache.put(self.host, self.port, features)
+            self.features = features
+            return features
+
+    def has_feature(self, name):
+        return name.upper() in self.feat()
+
+    def mlst(self, path=''):
+        """Lấy thông tin một mục qua MLST trên kênh điều khiển (không cần kết nối dữ liệu)"""
+        with self.lock:
+            self.send_command(f'MLST {path}'.rstrip())
+            for line in self.response_lines[1:-1]:
+                entry = parse_mlsd_line(line[1:] if line.startswith(' ') else line)
+                if entry:
+                    return entry
+        raise FTPProtoError(f"Invalid MLST response: {self.last_response}")
+
+    def mdtm(self, filename):
+        """Lấy thời gian sửa đổi (epoch UTC) của file qua MDTM"""
+        resp = self.send_command(f'MDTM {filename}')
+        ts = parse_mdtm(resp[4:])
+        if ts is None:
+            raise FTPProtoError(f"Invalid MDTM response: {resp}")
+        return ts
+
+    # ---------- Thao tác hàng loạt (pipeline) ----------
+    def delete_many(self, filenames, max_in_flight=PIPELINE_DEPTH):
+        """Xóa nhiều file, trả về danh sách CommandResult theo thứ tự"""
+        return self.pipeline([f'DELE {name}' for name in filenames], max_in_flight)
+
+    def size_many(self, filenames, max_in_flight=PIPELINE_DEPTH):
+        """Lấy kích thước nhiều file: dict {tên: kích thước hoặc None nếu lỗi}"""
+        filenames = list(filenames)
+        results = self.pipeline([f'SIZE {name}' for name in filenames], max_in_flight)
+        sizes = {}
+        for name, result in zip(filenames, results):
+            try:
+                sizes[name] = int(result.response.split()[1]) if result.ok else None
+            except (IndexError, ValueError):
+                sizes[name] = None
+        return sizes
+
+    def rename_many(self, pairs, max_in_flight=PIPELINE_DEPTH):
+        """Đổi tên nhiều file; trả về một CommandResult (của RNTO) cho mỗi cặp
+
+        Nếu RNFR lỗi thì lỗi đó được gán cho cả cặp (RNTO khi đó cũng bị server từ chối).
+        """
+        commands = []
+        for fromname, toname in pairs:
+            commands.append(f'RNFR {fromname}')
+            commands.append(f'RNTO {toname}')
+        results = self.pipeline(commands, max_in_flight)
+        merged = []
+        for rnfr, rnto in zip(results[0::2], results[1::2]):
+            if not rnfr.ok:
+                rnto.error = rnfr.error
+            merged.append(rnto)
+        return merged
+
+    # ---------- Kênh dữ liệu ----------
     def set_pasv(self, passive):
-        return ftp_set_pasv(passive)
-        
+        """Đặt chế độ passive"""
+        self.passive_mode = passive
+
+    def set_mode(self, mode, level=None):
+        """Chọn chế độ truyền: 'S' (stream) hoặc 'Z' (nén deflate)
+
+        MODE Z chỉ được bật khi server quảng bá nó trong FEAT; nếu không, phiên
+        giữ nguyên stream mode và trả về False. level: mức nén zlib 1-9 cho dữ
+        liệu gửi đi, cũng được báo cho server qua OPTS MODE Z LEVEL.
+        """
+        with self.lock:
+            mode = mode.upper()
+            if mode == 'Z':
+                if not self.feat().mode_z:
+                    return False
+                self.deflate_level = level
+                if level:
+                    try:
+                        self.send_command(f'OPTS MODE Z LEVEL {level}')
+                    except FTPPermError:
+                        pass  # Server vẫn nén với mức mặc định của nó
+            self.send_command(f'MODE {mode}')
+            return True
+
+    @property
+    def compressed(self):
+        """True nếu phiên đang ở MODE Z"""
+        return self.state.get('MODE') == 'Z'
+
+    def _note_rtt(self, sample):
+        # Làm mượt như SRTT của TCP: rtt = 7/8 rtt + 1/8 mẫu mới
+        self.rtt = sample if self.rtt is None else self.rtt + (sample - self.rtt) / 8
+        rtt_histogram.add(sample)
+
+    def _data_methods(self, kind, extended, legacy):
+        """Thứ tự thử lệnh mở kênh dữ liệu: lệnh đã dùng được lần trước trên server này đi trước
+
+        Kênh điều khiển IPv6 chỉ dùng được lệnh mở rộng (EPSV/EPRT).
+        """
+        if self.sock.family != socket.AF_INET:
+            return [extended]
+        remembered = self.feat().data_methods.get(kind)
+        return [legacy, extended] if remembered == legacy else [extended, legacy]
+
+    def _timed_command(self, cmd):
+        start = time.monotonic()
+        resp = self.send_command(cmd)
+        self._note_rtt(time.monotonic() - start)
+        return resp
+
+    def _negotiate_data(self, kind, methods, attempt):
+        """Chạy attempt(lệnh) theo thứ tự methods; lệnh bị từ chối (5xx) thì thử lệnh kế"""
+        error = None
+        for method in methods:
+            try:
+                result = attempt(method)
+            except FTPPermError as e:
+                error = e
+                continue
+            caps = self.feat()
+            if caps.data_methods.get(kind) != method:
+                caps.data_methods[kind] = method
+                feature_cache.put(self.host, self.port, caps)  # Lưu lại nếu cache có ghi ra đĩa
+            return result
+        raise error
+
+    def make_pasv(self):
+        """Tạo kết nối passive mode (EPSV, hoặc PASV nếu server không hỗ trợ EPSV)
+
+        Kết nối dữ liệu luôn tới địa chỉ của kênh điều khiển: EPSV chỉ trả về
+        cổng, còn địa chỉ trong phản hồi PASV (thường sai khi server sau NAT)
+        chỉ được dùng khi Config.PASV_TRUST_SERVER_ADDRESS bật.
+        """
+        peer = self.sock.getpeername()[0]
+
+        def attempt(method):
+            resp = self._timed_command(method)
+            if method == 'EPSV':
+                # '229 Entering Extended Passive Mode (|||6446|)'
+                match = re.search(r'\((.)\1\1(\d+)\1\)', resp)
+                if not match:
+                    raise FTPProtoError(f"Invalid EPSV response: {resp}")
+                return peer, int(match.group(2))
+            # Parse PASV response như '227 Entering Passive Mode (192,168,1,1,20,21)'
+            match = re.search(r'(\d+),(\d+),(\d+),(\d+),(\d+),(\d+)', resp)
+            if not match:
+                raise FTPProtoError(f"Invalid PASV response: {resp}")
+            nums = [int(x) for x in match.groups()]
+            host = '.'.join(map(str, nums[:4])) if Config.PASV_TRUST_SERVER_ADDRESS else peer
+            return host, nums[4] * 256 + nums[5]
+
+        host, port = self._negotiate_data('passive', self._data_methods('passive', 'EPSV', 'PASV'), attempt)
+
+        # Tạo data connection (bộ đệm đặt trước connect để cửa sổ TCP lớn ngay từ đầu)
+        data_socket = socket.socket(self.sock.family, socket.SOCK_STREAM)
+        try:
+            tune_data_socket(data_socket)
+            data_socket.settimeout(self.timeout)
+            data_socket.connect((host, port))
+        except BaseException:
+            data_socket.close()
+            raise
+        return data_socket
+
+    def make_port(self):
+        """Tạo kết nối active mode (EPRT, hoặc PORT nếu server không hỗ trợ EPRT)
+
+        Socket lắng nghe được bind vào địa chỉ cục bộ của kênh điều khiển, là
+        địa chỉ server chắc chắn kết nối ngược lại được.
+        """
+        local = self.sock.getsockname()[0]
+        data_socket = socket.socket(self.sock.family, socket.SOCK_STREAM)
+        try:
+            tune_data_socket(data_socket)  # Socket được accept thừa hưởng bộ đệm này
+            data_socket.bind((local, 0))
+            data_socket.listen(1)
+            port = data_socket.getsockname()[1]
+
+            def attempt(method):
+                if method == 'EPRT':
+                    family = 2 if self.sock.family == socket.AF_INET6 else 1
+                    return self._timed_command(f"EPRT |{family}|{local}|{port}|")
+                return self._timed_command(f"PORT {local.replace('.', ',')},{port // 256},{port % 256}")
+
+            self._negotiate_data('active', self._data_methods('active', 'EPRT', 'PORT'), attempt)
+        except BaseException:
+            data_socket.close()
+            raise
+        return data_socket
+
+    def transfer_cmd(self, cmd, rest=None):
+        """Thiết lập kết nối truyền dữ liệu
+
+        rest: nếu có, gửi REST <rest> trước lệnh để server bắt đầu từ offset đó
+        """
+        with self.lock:
+            if self.passive_mode:
+                data_socket = self.make_pasv()
+                try:
+                    if rest:
+                        self.send_command(f'REST {rest}')
+                    self.send_command(cmd)
+                except all_errors:
+                    data_socket.close()
+                    raise
+            else:
+                listen_socket = self.make_port()
+                try:
+                    if rest:
+                        self.send_command(f'REST {rest}')
+                    self.send_command(cmd)
+                except all_errors:
+                    listen_socket.close()
+                    raise
+                data_socket, addr = listen_socket.accept()
+                listen_socket.close()
+            with self._abort_lock:
+                self.data_socket = data_socket
+                self.aborting = False
+            if self.compressed:
+                return DeflateSocket(data_socket, self.deflate_level)
+            return data_socket
+
+    def _end_transfer(self, data_socket):
+        """Đóng kênh dữ liệu và nhận phản hồi kết thúc lần truyền
+
+        Lần truyền vẫn hủy được cho tới khi có phản hồi kết thúc (upload có thể
+        đã nằm hết trong bộ đệm socket trong khi server còn đang nhận). Nếu
+        abort() đã gửi ABOR: nhận thêm phản hồi của ABOR (phản hồi của lệnh
+        truyền là 426, hoặc 226 nếu server đã xong trước khi nhận ABOR) rồi
+        raise FTPAbortedError thay cho lỗi do kênh dữ liệu bị shutdown.
+        """
+        data_socket.close()
+        error = None
+        try:
+            reply = self.get_response()
+        except (FTPTempError, FTPPermError) as e:
+            reply, error = str(e), e
+        except BaseException:
+            self._transfer_done()  # Kênh điều khiển lỗi: không còn gì để hủy
+            raise
+        if not self._transfer_done():
+            if error is not None:
+                raise error
+            return
+        try:
+            abor_reply = self.get_response()
+        except (FTPTempError, FTPPermError) as e:
+            abor_reply = str(e)
+        raise FTPAbortedError(f"Transfer aborted ({reply}; {abor_reply})")
+
+    def _transfer_done(self):
+        """Bỏ đăng ký kênh dữ liệu; True nếu abort() đã gửi ABOR cho lần truyền này"""
+        with self._abort_lock:
+            self.data_socket = None
+            aborted, self.aborting = self.aborting, False
+        return aborted
+
+    def abort(self):
+        """Hủy lần truyền đang chạy; gọi được từ thread khác (không chờ self.lock)
+
+        Gửi telnet IP + Synch (MSG_OOB) rồi ABOR trên kênh điều khiển và
+        shutdown kênh dữ liệu để vòng nhận/gửi dừng ngay. Thread đang truyền
+        nhận các phản hồi 426/226 rồi raise FTPAbortedError, sau đó phiên dùng
+        tiếp bình thường. Khi đang tải phân đoạn, lần truyền nằm trên các phiên
+        phụ: hủy tất cả qua SegmentedDownload.cancel(). Trả về True nếu vừa hủy,
+        False nếu không có lần truyền nào đang chạy hoặc đã hủy rồi.
+        """
+        download = self.segmented
+        if download is not None:
+            return download.cancel()
+        with self._abort_lock:
+            data_socket = self.data_socket
+            if data_socket is None or self.aborting:
+                return False
+            self.aborting = True
+            try:
+                self.sock.sendall(TELNET_IP_SYNCH, socket.MSG_OOB)
+                self.send_line(TELNET_DM + b'ABOR')
+            except OSError as e:
+                self.broken = True
+                logging.warning(f"Could not send ABOR: {e}")
+            try:
+                data_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # Server đã đóng kênh dữ liệu
+        return True
+
+    def iter_lines(self, cmd, blocksize=8192):
+        """Generator: trả về từng dòng của kênh dữ liệu ngay khi nhận được.
+
+        Dữ liệu được nhận vào một bộ đệm dùng lại (recv_into) và giải mã tăng
+        dần, nên bộ nhớ chỉ phụ thuộc kích thước bộ đệm chứ không phụ thuộc độ
+        lớn của danh sách. Phiên bị khóa cho tới khi generator kết thúc: không
+        gửi lệnh khác trên cùng phiên trong lúc đang duyệt.
+        """
+        with self.lock:
+            meter = TransferMeter()
+            data_socket = self.transfer_cmd(cmd)
+            meter.connected()
+            decoder = codecs.getincrementaldecoder(self.encoding)()
+            buf = bytearray(blocksize)
+            view = memoryview(buf)
+            pending = ''
+            completed = False
+
+            try:
+                while True:
+                    n = data_socket.recv_into(buf)
+                    if not n:
+                        break
+                    meter.add(n)
+                    lines = (pending + decoder.decode(view[:n])).split('\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        yield line.rstrip('\r')
+                pending += decoder.decode(b'', final=True)
+                if pending:
+                    yield pending.rstrip('\r')
+                completed = True
+            finally:
+                self._record_transfer(cmd, data_socket, None, meter)
+                if completed:
+                    self._end_transfer(data_socket)  # Nhận phản hồi hoàn thành
+                else:
+                    # Bị dừng giữa chừng: vẫn đọc phản hồi (426/226) để phiên không lệch
+                    try:
+                        self._end_transfer(data_socket)
+                    except FTPError:
+                        pass
+
+    def iter_nlst(self, *args):
+        """Generator: trả về từng tên file của NLST khi nhận được"""
+        cmd = 'NLST'
+        if args:
+            cmd += ' ' + ' '.join(args)
+        for line in self.iter_lines(cmd):
+            line = line.strip()
+            if line:
+                yield line
+
+    def stat_lines(self, path=None):
+        """Danh sách thư mục qua kênh điều khiển: STAT <path> (phản hồi 211/212/213 nhiều dòng, định dạng LIST)
+
+        Không cần mở kênh dữ liệu. Trả về None nếu server không liệt kê thư mục
+        qua STAT (lệnh bị từ chối, hoặc phản hồi chỉ là trạng thái server), []
+        nếu không có dòng nào: thư mục rỗng, nhưng cũng có thể là đường dẫn
+        không tồn tại (550, hoặc server trả phản hồi rỗng).
+        """
+        with self.lock:
+            try:
+                resp = self.send_command(f"STAT {path or '.'}")
+            except FTPPermError as e:
+                return [] if str(e).startswith('550') else None
+            code = resp[:3]
+            if code not in ('211', '212', '213') or len(self.response_lines) < 2:
+                return None
+            lines = []
+            for line in self.response_lines[1:-1]:
+                if line.startswith(code + '-'):
+                    line = line[4:]
+                elif line.startswith(' '):
+                    line = line[1:]
+                if line.strip():
+                    lines.append(line.rstrip())
+            if lines and not any(parse_list_line(line) for line in lines):
+                return None
+            return lines
+
+    def _listing_key(self, path):
+        return posixpath.normpath(posixpath.join(self.state.get('CWD') or '', path or '.'))
+
+    def _listing_method(self, path):
+        """'STAT' hoặc 'DATA' (MLSD/LIST qua kênh dữ liệu) cho lần liệt kê kế tiếp
+
+        Cách chưa đo trên server này được thử trước; sau đó chọn cách có thời
+        gian trung bình nhỏ hơn, và cứ Config.STAT_LISTING_PROBE lần thì đo lại
+        cách còn lại. Chỉ dùng với server không có MLSD (MLSD cho kiểu, kích
+        thước, thời gian chuẩn hóa mà dòng LIST của STAT không đảm bảo). Thư mục
+        lớn luôn qua kênh dữ liệu.
+        """
+        if not Config.STAT_LISTING or self._listing_key(path) in self.large_dirs:
+            return 'DATA'
+        caps = self.feat()
+        if caps.mlsd:
+            return 'DATA'
+        times = caps.listing_times
+        if 'STAT' in times and times['STAT'] is None:
+            return 'DATA'  # Server không liệt kê qua STAT
+        for method in ('STAT', 'DATA'):
+            if method not in times:
+                return method
+        self.listings += 1
+        faster = min(times, key=times.get)
+        if Config.STAT_LISTING_PROBE and self.listings % Config.STAT_LISTING_PROBE == 0:
+            return 'DATA' if faster == 'STAT' else 'STAT'
+        return faster
+
+    def _note_listing(self, method, seconds, count=0, path=None):
+        """Ghi nhận thời gian một lần liệt kê (seconds=None: server không liệt kê qua STAT)"""
+        if count > Config.STAT_LISTING_MAX_ENTRIES:
+            # Thư mục lớn: không đại diện cho các thư mục nhỏ, lần sau dùng kênh dữ liệu
+            self.large_dirs.add(self._listing_key(path))
+            return
+        if method == 'DATA' and seconds is not None:
+            if count:
+                self.empty_dirs.discard(self._listing_key(path))
+            else:
+                self.empty_dirs.add(self._listing_key(path))
+        caps = self.feat()
+        old = caps.listing_times.get(method)
+        if seconds is None or old is None:
+            caps.listing_times[method] = seconds
+            feature_cache.put(self.host, self.port, caps)  # Lưu lại nếu cache có ghi ra đĩa
+        else:
+            caps.listing_times[method] = old + LISTING_EWMA * (seconds - old)
+
+    def _stat_listing(self, path):
+        """Dòng LIST lấy qua STAT nếu STAT đang là cách nhanh hơn với server này, ngược lại None
+
+        STAT không có dòng nào chỉ được tin khi đã biết thư mục rỗng; ngược lại
+        quay về kênh dữ liệu để đường dẫn không tồn tại vẫn raise lỗi 550.
+        """
+        with self.lock:
+            if self._listing_method(path) != 'STAT':
+                return None
+            start = time.monotonic()
+            lines = self.stat_lines(path)
+            if lines is None:
+                self._note_listing('STAT', None)
+                return None
+            if not lines and self._listing_key(path) not in self.empty_dirs:
+                return None
+            self._note_listing('STAT', time.monotonic() - start, len(lines), path)
+            return lines
+
+    def _timed_listing(self, items, path):
+        """Bọc một lần liệt kê qua kênh dữ liệu để đo thời gian (không tính thời gian xử lý của bên gọi)"""
+        busy = 0.0
+        count = 0
+        start = time.monotonic()
+        for item in items:
+            busy += time.monotonic() - start
+            count += 1
+            yield item
+            start = time.monotonic()
+        busy += time.monotonic() - start
+        self._note_listing('DATA', busy, count, path)
+
+    def listing_lines(self, path=None):
+        """Generator: các dòng định dạng LIST của thư mục, qua STAT hoặc LIST (cách nhanh hơn với server)"""
+        lines = self._stat_listing(path)
+        if lines is not None:
+            yield from lines
+            return
+        yield from self._timed_listing(self.iter_dir(path), path)
+
+    def iter_dir(self, path=None):
+        """Generator: trả về từng dòng LIST khi nhận được"""
+        cmd = 'LIST'
+        if path:
+            cmd += f' {path}'
+        for line in self.iter_lines(cmd):
+            line = line.strip()
+            if line:
+                yield line
+
+    def mlsd(self, path=None):
+        """Generator: trả về RemoteEntry cho từng dòng MLSD"""
+        cmd = 'MLSD'
+        if path:
+            cmd += f' {path}'
+        for line in self.iter_lines(cmd):
+            entry = parse_mlsd_line(line)
+            if entry:
+                yield entry
+
+    def list_entries(self, path=None):
+        """Generator: RemoteEntry của thư mục
+
+        Dùng MLSD nếu server hỗ trợ; ngược lại STAT trên kênh điều khiển nếu
+        nhanh hơn với server này (xem _listing_method), hoặc phân tích LIST.
+        Bỏ qua các mục '.' và '..' (cdir/pdir).
+        """
+        lines = self._stat_listing(path)
+        if lines is not None:
+            entries = (parse_list_line(line) for line in lines)
+        elif self.feat().mlsd:
+            entries = self._timed_listing(self.mlsd(path), path)
+        else:
+            entries = self._timed_listing((parse_list_line(line) for line in self.iter_dir(path)), path)
+        for entry in entries:
+            if entry is None or entry.name in ('.', '..') or entry.type in ('cdir', 'pdir'):
+                continue
+            yield entry
+
+    def entries(self, path=None):
+        """Danh sách RemoteEntry của thư mục (xem list_entries)"""
+        return list(self.list_entries(path))
+
     def nlst(self, *args):
-        return ftp_nlst(*args)
-        
+        """Lấy danh sách tên file"""
+        return list(self.iter_nlst(*args))
+
+    def _dir(self, path=None, callback=None):
+        """Lấy danh sách chi tiết thư mục"""
+        for line in self.listing_lines(path):
+            if callback:
+                callback(line)
+            else:
+                print(line)
+
     def dir(self, *args, **kwargs):
         path = None
         callback = None
-        
+
         if args:
             if callable(args[0]):
                 callback = args[0]
@@ -433,20 +1094,314 @@ class FTP:
                 path = args[0]
                 if len(args) > 1 and callable(args[1]):
                     callback = args[1]
-        
-        return ftp_dir(path, callback)
-        
-    def retrbinary(self, cmd, callback, blocksize=8192):
-        return ftp_retrbinary(cmd, callback, blocksize)
-        
+
+        return self._dir(path, callback)
+
+    def block_sizer(self, data_socket, blocksize=None):
+        """BlockSizer cho một lần truyền; blocksize cố định (nếu có) tắt tự điều chỉnh"""
+        return BlockSizer(rtt=tcp_rtt(data_socket) or self.rtt, fixed=blocksize)
+
+    def _record_transfer(self, cmd, data_socket, sizer, meter):
+        stats = {'command': cmd.split(' ', 1)[0]}
+        stats.update(meter.stats())
+        if sizer is not None:
+            stats.update(sizer.stats())
+        stats.update(socket_buffers(data_socket))
+        if isinstance(data_socket, DeflateSocket):
+            stats['mode'] = 'Z'
+            stats['wire_bytes'] = data_socket.wire_bytes
+        self.last_transfer = stats
+
+    def retrbinary(self, cmd, callback, blocksize=None, rest=None):
+        """Tải file ở chế độ binary (rest: offset bắt đầu, dùng để tải tiếp)
+
+        blocksize=None: kích thước block tự tăng theo thông lượng và RTT.
+        """
+        with self.lock:
+            meter = TransferMeter()
+            data_socket = self.transfer_cmd(cmd, rest)
+            meter.connected()
+            sizer = self.block_sizer(data_socket, blocksize)
+
+            try:
+                size = sizer.size
+                while True:
+                    data = data_socket.recv(size)
+                    if not data:
+                        break
+                    meter.add(len(data))
+                    callback(data)
+                    size = sizer.update(len(data), len(data) == size)
+            finally:
+                self._record_transfer(cmd, data_socket, sizer, meter)
+                self._end_transfer(data_socket)
+
+    def retrfile(self, cmd, file_obj, callback=None, rest=None, blocksize=None, use_splice=False, hasher=None):
+        """Tải dữ liệu binary thẳng vào file_obj (file đã mở sẵn, mở một lần)
+
+        Dữ liệu được nhận vào một bytearray dùng lại (recv_into) thay vì tạo
+        bytes mới cho mỗi block. use_splice=True (Linux) chuyển dữ liệu socket ->
+        pipe -> file bằng os.splice mà không đi qua bộ nhớ Python; file không
+        được mở ở chế độ append. callback(số_byte) được gọi sau mỗi lần ghi.
+        blocksize=None: buffer tự lớn dần theo thông lượng và RTT. hasher (có
+        update(bytes), ví dụ BackgroundHasher) nhận bản sao từng block ngay khi
+        nhận; khi đó không dùng splice. Trả về tổng số byte đã nhận.
+        """
+        with self.lock:
+            meter = TransferMeter()
+            data_socket = self.transfer_cmd(cmd, rest)
+            meter.connected()
+            sizer = self.block_sizer(data_socket, blocksize)
+            received = 0
+
+            try:
+                if use_splice and _can_splice(file_obj) and not self.compressed and hasher is None:
+                    sizer = BlockSizer(rtt=sizer.rtt, fixed=SPLICE_CHUNK)
+
+                    def on_chunk(n):
+                        meter.add(n)
+                        if callback:
+                            callback(n)
+
+                    received = self._splice_to_file(data_socket, file_obj, on_chunk)
+                else:
+                    buf = bytearray(sizer.size)
+                    view = memoryview(buf)
+                    while True:
+                        n = data_socket.recv_into(buf)
+                        if not n:
+                            break
+                        file_obj.write(view[:n])
+                        if hasher is not None:
+                            hasher.update(bytes(view[:n]))  # buf được dùng lại ở lần recv sau
+                        received += n
+                        meter.add(n)
+                        if callback:
+                            callback(n)
+                        if sizer.update(n, n == len(buf)) > len(buf):
+                            # Chỉ cấp phát lại khi block tăng (tối đa vài lần mỗi lần truyền)
+                            buf = bytearray(sizer.size)
+                            view = memoryview(buf)
+            finally:
+                self._record_transfer(cmd, data_socket, sizer, meter)
+                self._end_transfer(data_socket)
+            return received
+
+    def _splice_to_file(self, data_socket, file_obj, callback, chunk=SPLICE_CHUNK):
+        file_obj.flush()
+        sock_fd = data_socket.fileno()
+        file_fd = file_obj.fileno()
+        pipe_r, pipe_w = os.pipe()
+        received = 0
+        try:
+            try:
+                fcntl.fcntl(pipe_w, fcntl.F_SETPIPE_SZ, chunk)
+            except (AttributeError, OSError):
+                chunk = 65536  # Dung lượng pipe mặc định
+            while True:
+                try:
+                    n = os.splice(sock_fd, pipe_w, chunk)
+                except BlockingIOError:
+                    # Socket có timeout là non-blocking ở mức fd: chờ tới khi đọc được
+                    if not select.select([data_socket], [], [], data_socket.gettimeout())[0]:
+                        raise socket.timeout("timed out")
+                    continue
+                if not n:
+                    break
+                left = n
+                while left:
+                    left -= os.splice(pipe_r, file_fd, left)
+                received += n
+                if callback:
+                    callback(n)
+        finally:
+            os.close(pipe_r)
+            os.close(pipe_w)
+            # splice ghi qua fd nên cần đồng bộ lại vị trí của file_obj
+            file_obj.seek(os.lseek(file_fd, 0, os.SEEK_CUR))
+        return received
+
     def retrlines(self, cmd, callback=None):
-        return ftp_retrlines(cmd, callback)
-        
-    def storbinary(self, cmd, file_obj, blocksize=8192):
-        return ftp_storbinary(cmd, file_obj, blocksize)
-        
+        """Tải file ở chế độ ASCII"""
+        for line in self.iter_lines(cmd):
+            if callback:
+                callback(line)
+            else:
+                print(line)
+
+    def storbinary(self, cmd, file_obj, blocksize=None, rest=None):
+        """Upload file ở chế độ binary (rest: offset trên server để ghi tiếp)
+
+        blocksize=None: kích thước block tự tăng theo thông lượng và RTT.
+        """
+        with self.lock:
+            meter = TransferMeter()
+            data_socket = self.transfer_cmd(cmd, rest)
+            meter.connected()
+            sizer = self.block_sizer(data_socket, blocksize)
+
+            try:
+                size = sizer.size
+                while True:
+                    data = file_obj.read(size)
+                    if not data:
+                        break
+                    if isinstance(data, str):
+                        data = data.encode(self.encoding)
+                    data_socket.sendall(data)
+                    meter.add(len(data))
+                    size = sizer.update(len(data))
+            finally:
+                self._record_transfer(cmd, data_socket, sizer, meter)
+                self._end_transfer(data_socket)
+
+    def storfile(self, cmd, file_obj, callback=None, rest=None, slice_size=SENDFILE_SLICE, blocksize=None,
+                 hasher=None):
+        """Upload file ở chế độ binary, dùng sendfile (zero-copy) nếu file_obj là file thường
+
+        Dữ liệu được gửi từ vị trí hiện tại của file_obj. callback(số_byte) được
+        gọi sau mỗi lát slice_size byte; nguồn không phải file thường (pipe,
+        BytesIO, ...) được đọc theo block như storbinary. Có hasher thì file
+        cũng được đọc theo block để băm đúng các byte vừa gửi (không sendfile).
+        """
+        with self.lock:
+            meter = TransferMeter()
+            data_socket = self.transfer_cmd(cmd, rest)
+            meter.connected()
+            sizer = self.block_sizer(data_socket, blocksize)
+
+            try:
+                if _is_regular_file(file_obj) and not self.compressed and hasher is None:
+                    sizer = BlockSizer(rtt=sizer.rtt, fixed=slice_size)
+                    offset = file_obj.tell()
+                    while True:
+                        sent = data_socket.sendfile(file_obj, offset, slice_size)
+                        if not sent:
+                            break
+                        offset += sent
+                        meter.add(sent)
+                        if callback:
+                            callback(sent)
+                else:
+                    size = sizer.size
+                    while True:
+                        data = file_obj.read(size)
+                        if not data:
+                            break
+                        data_socket.sendall(data)
+                        if hasher is not None:
+                            hasher.update(data)
+                        meter.add(len(data))
+                        if callback:
+                            callback(len(data))
+                        size = sizer.update(len(data))
+            finally:
+                self._record_transfer(cmd, data_socket, sizer, meter)
+                self._end_transfer(data_socket)
+
     def storlines(self, cmd, lines):
-        return ftp_storlines(cmd, lines)
-        
-    def voidcmd(self, cmd):
-        return ftp_voidcmd(cmd)
\ No newline at end of file
+        """Upload file ở chế độ ASCII"""
+        with self.lock:
+            meter = TransferMeter()
+            data_socket = self.transfer_cmd(cmd)
+            meter.connected()
+
+            try:
+                for line in lines:
+                    if isinstance(line, str):
+                        line = line.encode(self.encoding)
+                    if not line.endswith(b'\r\n'):
+                        line += b'\r\n'
+                    data_socket.sendall(line)
+                    meter.add(len(line))
+            finally:
+                self._record_transfer(cmd, data_socket, None, meter)
+                self._end_transfer(data_socket)
+
+
+# Phiên mặc định cho các hàm ftp_* cấp module (tương thích code cũ)
+default_session = FTP()
+
+def ftp_send_line(line):
+    return default_session.send_line(line)
+
+def ftp_recv_line():
+    return default_session.recv_line()
+
+def ftp_get_response():
+    return default_session.get_response()
+
+def ftp_send_command(cmd):
+    return default_session.send_command(cmd)
+
+def ftp_connect(host, port=21, timeout=60):
+    return default_session.connect(host, port, timeout)
+
+def ftp_login(user='anonymous', passwd='anonymous@'):
+    return default_session.login(user, passwd)
+
+def ftp_quit():
+    return default_session.quit()
+
+def ftp_pwd():
+    return default_session.pwd()
+
+def ftp_cwd(dirname):
+    return default_session.cwd(dirname)
+
+def ftp_mkd(dirname):
+    return default_session.mkd(dirname)
+
+def ftp_rmd(dirname):
+    return default_session.rmd(dirname)
+
+def ftp_delete(filename):
+    return default_session.delete(filename)
+
+def ftp_rename(fromname, toname):
+    return default_session.rename(fromname, toname)
+
+def ftp_size(filename):
+    return default_session.size(filename)
+
+def ftp_set_pasv(passive):
+    return default_session.set_pasv(passive)
+
+def ftp_make_pasv():
+    return default_session.make_pasv()
+
+def ftp_make_port():
+    return default_session.make_port()
+
+def ftp_transfer_cmd(cmd, rest=None):
+    return default_session.transfer_cmd(cmd, rest)
+
+def ftp_nlst(*args):
+    return default_session.nlst(*args)
+
+def ftp_dir(path=None, callback=None):
+    return default_session._dir(path, callback)
+
+def ftp_retrbinary(cmd, callback, blocksize=None, rest=None):
+    return default_session.retrbinary(cmd, callback, blocksize, rest)
+
+def ftp_retrfile(cmd, file_obj, callback=None, rest=None):
+    return default_session.retrfile(cmd, file_obj, callback, rest)
+
+def ftp_retrlines(cmd, callback=None):
+    return default_session.retrlines(cmd, callback)
+
+def ftp_storbinary(cmd, file_obj, blocksize=None, rest=None):
+    return default_session.storbinary(cmd, file_obj, blocksize, rest)
+
+def ftp_storfile(cmd, file_obj, callback=None, rest=None):
+    return default_session.storfile(cmd, file_obj, callback, rest)
+
+def ftp_storlines(cmd, lines):
+    return default_session.storlines(cmd, lines)
+
+def ftp_abort():
+    return default_session.abort()
+
+def ftp_voidcmd(cmd):
+    return default_session.voidcmd(cmd)
@@ -1,4 +1,5 @@
 import logging 
+import os
 from .config import Config
 
 # Cấu hình logging
@@ -23,4 +24,21 @@ class Utils:
         elif level == logging.CRITICAL:
             logging.critical(msg)
         else: 
-            logging.info(msg)
\ No newline at end of file
+            logging.info(msg)
+
+    @staticmethod
+    def preallocate(file_obj, size):
+        """Cấp phát trước size byte cho file (posix_fallocate nếu có, ngược lại truncate)
+
+        Sau khi cấp phát, kích thước file là size: người gọi phải truncate lại
+        về số byte thực sự đã ghi nếu việc ghi không hoàn tất.
+        """
+        file_obj.flush()
+        if size > 0 and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(file_obj.fileno(), 0, size)
+                return
+            except OSError:
+                pass  # Hệ thống file không hỗ trợ
+        if size > os.fstat(file_obj.fileno()).st_size:
+            file_obj.truncate(size)
@@ -12,10 +12,15 @@ import fnmatch
 # Thêm thư mục hiện tại vào Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from ..core.raw_socket_ftp import FTP, all_errors, error_perm, error_temp, error_proto
+from ..core.raw_socket_ftp import FTP, all_errors, error_perm, error_temp, error_proto, IDEMPOTENT_METHODS
 from ..core.ftp_command import FTPCommands
 from ..core.virus_scan import VirusScan
 from ..core.ftp_helpers import FTPHelpers
+from ..core.ftp_pool import pool_for
+from ..core.ftp_trace import tracer as wire_tracer
+from ..core.ftp_stats import bus as stats_bus, TRANSFER, summarize, connect_latency_lines, rtt_histogram
+from ..core.ftp_keepalive import Keepalive
+from ..core.ftp_retry import policy_for, retry_summary
 from ..core.utils import Utils
 from ..core.config import Config
 import logging
@@ -24,8 +29,9 @@ from datetime import datetime
 class ProgressWindow:
     """Cửa sổ hiển thị tiến trình với thanh progress bar"""
     
-    def __init__(self, parent, title="Đang xử lý..."):
+    def __init__(self, parent, title="Đang xử lý...", on_cancel=None):
         self.parent = parent
+        self.on_cancel = on_cancel  # Gọi khi bấm Hủy bỏ (ví dụ gửi ABOR để dừng lần truyền ngay)
         self.window = tk.Toplevel(parent)
         self.window.title(title)
         self.window.geometry("450x200")
@@ -99,6 +105,8 @@ class ProgressWindow:
     def cancel(self):
         """Hủy bỏ tiến trình"""
         self.is_cancelled = True
+        if self.on_cancel:
+            self.on_cancel()
         self.close()
         
     def close(self):
@@ -135,7 +143,11 @@ class FTPClientGUI:
             self.auto_scan_enabled = True
             self.connection_info = {}
 
-        self.ftp_helpers = FTPHelpers(self.ftp, self.root) if self.ftp else None
+        # Các phiên phụ (tải phân đoạn, ...) được mượn từ pool thay vì đăng nhập lại mỗi lần
+        self.ftp_helpers = FTPHelpers(self.ftp, self.root, pool=pool_for(self.ftp)) if self.ftp else None
+        if self.ftp:
+            # Giữ kết nối khi người dùng chỉ thao tác bên máy cục bộ một lúc lâu
+            Keepalive(self.ftp).start()
 
         self.virus_scanner = VirusScan()
         self.current_local_dir = os.getcwd()
@@ -145,8 +157,12 @@ class FTPClientGUI:
         # Tạo giao diện
         self.transfer_mode_var = tk.StringVar(value="binary")
         self.passive_mode_var = tk.BooleanVar(value=self.passive_mode)
+        self.compress_var = tk.BooleanVar(value=False)
+        self.verify_var = tk.BooleanVar(value=Config.VERIFY_CHECKSUMS)
         self.create_widgets()
         self.update_local_files()
+        # Mỗi lần truyền file xong, ghi một dòng thống kê vào log
+        stats_bus.subscribe(TRANSFER, self._on_transfer_stats)
 
         # Log và cập nhật giao diện nếu đã kết nối
         if self.connected:
@@ -172,6 +188,43 @@ class FTPClientGUI:
             self.ftp_cmd.set_pasv(self.passive_mode)
         self.log_message(f"Passive FTP mode: {'ON' if self.passive_mode else 'OFF'}")
 
+    def _on_transfer_stats(self, record):
+        # Được gọi từ thread truyền file: chuyển về main thread trước khi đụng tới widget
+        level = "INFO" if record.ok else "WARNING"
+        self.root.after(0, lambda: self.log_message(record.summary(), level))
+
+    def toggle_compression(self):
+        """Bật/tắt nén deflate (MODE Z) trên kênh dữ liệu"""
+        enable = self.compress_var.get()
+        if not self.connected:
+            self.compress_var.set(False)
+            return
+
+        def mode_thread():
+            # MODE gửi qua kênh điều khiển (và chờ lần truyền đang chạy): không chặn giao diện
+            try:
+                ok = self.ftp.set_mode('Z' if enable else 'S')
+            except all_errors as e:
+                ok = False
+                self.root.after(0, lambda err=e: self.log_message(f"Không thể đổi chế độ truyền: {err}", "ERROR"))
+            self.root.after(0, lambda: done(ok))
+
+        def done(ok):
+            if not ok:
+                # Giữ checkbox đúng với chế độ thật của phiên
+                self.compress_var.set(self.ftp.compressed)
+                if enable:
+                    self.log_message("Server không hỗ trợ MODE Z, giữ stream mode", "WARNING")
+                return
+            self.log_message(f"MODE Z (nén): {'ON' if enable else 'OFF'}")
+
+        threading.Thread(target=mode_thread, daemon=True).start()
+
+    def toggle_verify(self):
+        """Bật/tắt đối chiếu checksum với server sau mỗi lần truyền binary"""
+        Config.VERIFY_CHECKSUMS = self.verify_var.get()
+        self.log_message(f"Kiểm tra checksum: {'ON' if Config.VERIFY_CHECKSUMS else 'OFF'}")
+
     def create_widgets(self):
         """Tạo các widget cho giao diện"""
         # Main frame
@@ -203,6 +256,16 @@ class FTPClientGUI:
                        variable=self.passive_mode_var,
                        bg='#f0f0f0', command=self.toggle_passive_mode, state=tk.NORMAL).pack(side=tk.LEFT, padx=10)
 
+        # MODE Z (nén deflate) toggle
+        tk.Checkbutton(top_button_frame, text="Compress (MODE Z)",
+                       variable=self.compress_var,
+                       bg='#f0f0f0', command=self.toggle_compression, state=tk.NORMAL).pack(side=tk.LEFT)
+
+        # Kiểm tra checksum (HASH/XSHA256/XMD5/XCRC) toggle
+        tk.Checkbutton(top_button_frame, text="Verify checksum",
+                       variable=self.verify_var,
+                       bg='#f0f0f0', command=self.toggle_verify, state=tk.NORMAL).pack(side=tk.LEFT)
+
         # Prompt toggle
         self.prompt_btn = tk.Button(top_button_frame, text="🔁 Prompt", command=self.do_prompt, 
                                     bg='#795548', fg='white')
@@ -361,22 +424,36 @@ class FTPClientGUI:
         try:
             # Đảm bảo chế độ passive được đặt đúng trước khi truyền dữ liệu
             is_data_transfer = func.__name__ in (
-                'nlst', 'retrbinary', 'retrlines', 'storbinary', 'storlines', 'dir'
+                'nlst', 'retrbinary', 'retrlines', 'storbinary', 'storlines', 'dir', 'entries'
             )
             if is_data_transfer:
                 self.ftp.set_pasv(self.passive_mode)
 
-            return func(*args, **kwargs)
+            def attempt():
+                try:
+                    return func(*args, **kwargs)
+                except all_errors as e:
+                    # Mất kết nối: kết nối lại, khôi phục phiên rồi gọi lại lệnh chỉ đọc
+                    if not self._reconnect(e) or func.__name__ not in IDEMPOTENT_METHODS:
+                        raise
+                    return func(*args, **kwargs)
+
+            # Lỗi 4xx (lệnh chưa được thực hiện) được thử lại theo chính sách của loại thao tác
+            return policy_for(func.__name__).call(attempt)
         except error_perm as e:
+            wire_tracer.dump_to_log(e)
             self.log_message(f"FTP permission error: {e}", "ERROR")
             messagebox.showerror("Error", f"FTP permission error: {e}")
         except error_temp as e:
+            wire_tracer.dump_to_log(e)
             self.log_message(f"FTP temporary error: {e}", "ERROR")
             messagebox.showerror("Error", f"FTP temporary error: {e}")
         except error_proto as e:
+            wire_tracer.dump_to_log(e)
             self.log_message(f"FTP protocol error: {e}", "ERROR")
             messagebox.showerror("Error", f"FTP protocol error: {e}")
         except all_errors as e:
+            wire_tracer.dump_to_log(e)
             self.log_message(f"FTP error: {e}", "ERROR")
             messagebox.showerror("Error", f"FTP error: {e}")
         except Exception as e:
@@ -384,10 +461,31 @@ class FTPClientGUI:
             messagebox.showerror("Error", f"Error: {e}")
         return None
 
+    def _reconnect(self, error):
+        """Kết nối lại khi kênh điều khiển bị mất; True nếu đã kết nối lại"""
+        if self.ftp is None or isinstance(error, error_perm) or self.ftp.connected or not self.ftp.auto_reconnect:
+            return False
+        self.log_message(f"Mất kết nối ({error}), đang kết nối lại tới {self.ftp.host}...", "WARNING")
+        try:
+            self.ftp.reconnect()
+        except all_errors as e:
+            self.log_message(f"Không kết nối lại được: {e}", "ERROR")
+            return False
+        self.log_message(f"Đã kết nối lại, thư mục hiện tại {self.ftp.state.get('CWD', '/')}", "INFO")
+        return True
+
+    def _abort_transfer(self):
+        """Bấm Hủy bỏ: gửi ABOR để dừng lần truyền đang chạy ngay thay vì đợi hết file"""
+        if self.ftp is not None and self.ftp.abort():
+            self.log_message("Đang hủy lần truyền (ABOR)...", "WARNING")
+
     def disconnect_ftp(self):
         """Ngắt kết nối FTP và gọi lại màn hình đăng nhập"""
+        stats_bus.unsubscribe(TRANSFER, self._on_transfer_stats)
         if self.ftp:
             try:
+                if self.ftp_helpers and self.ftp_helpers.pool:
+                    self.ftp_helpers.pool.close()
                 self._ftp_cmd(self.ftp.quit)
                 self.log_message("Đã ngắt kết nối FTP.", "INFO")
             except Exception as e:
@@ -448,7 +546,8 @@ class FTPClientGUI:
         """Cập nhật trạng thái kết nối trong giao diện"""
         if self.connected:
             host = self.connection_info.get('host', 'Unknown')
-            self.status_var.set(f"Đã kết nối - {host}")
+            timing = self.ftp.connect_timing if self.ftp else None
+            self.status_var.set(f"Đã kết nối - {host} ({timing.phases()})" if timing else f"Đã kết nối - {host}")
             self.status_label.configure(foreground="green")
 
             # Enable các nút
@@ -489,28 +588,17 @@ class FTPClientGUI:
         def update_thread():
             try:
                 self.remote_tree.delete(*self.remote_tree.get_children())
-                files = []
-                self.ftp_cmd.dir(files.append)
-                
+
                 if self.current_remote_dir not in ("/", ""):
                     self.remote_tree.insert("", tk.END, text="📁 /..", values=("", ""))
 
-                for line in files:
-                    parts = line.split(maxsplit=8)
-                    if len(parts) < 9:
-                        continue
-
-                    permissions = parts[0]
-                    size = parts[4] if not permissions.startswith('d') else ""
-                    name = parts[8]
-
-                    if name in (".", ".."):
-                        continue
-
-                    if permissions.startswith('d'):
-                        self.remote_tree.insert("", tk.END, text=f"📁 {name}", values=("", ""))
+                # Hiển thị từng mục ngay khi nhận được thay vì chờ cả danh sách
+                for entry in self.ftp_cmd.iter_entries():
+                    if entry.is_dir:
+                        self.remote_tree.insert("", tk.END, text=f"📁 {entry.name}", values=("", entry.modify_str()))
                     else:
-                        self.remote_tree.insert("", tk.END, text=f"📄 {name}", values=(f"{size} bytes", ""))
+                        size = f"{entry.size:,} bytes" if entry.size is not None else ""
+                        self.remote_tree.insert("", tk.END, text=f"📄 {entry.name}", values=(size, entry.modify_str()))
 
                 self.current_remote_dir = self.ftp_cmd.pwd() or "/"
                 self.remote_path_var.set(self.current_remote_dir)
@@ -697,6 +785,27 @@ class FTPClientGUI:
         status_msg.append(f"Confirmation mode (prompt) for mget/mput: {mode}")
         status_msg.append(f"File transfer mode: {self.transfer_mode}")
         status_msg.append(f"Passive FTP mode: {'ON' if self.passive_mode else 'OFF'}")
+        if self.connected:
+            status_msg.append(f"Data transfer mode: {'Z (deflate)' if self.ftp.compressed else 'S (stream)'}")
+        status_msg.append(f"Checksum verification: {'ON' if Config.VERIFY_CHECKSUMS else 'OFF'}")
+        if self.connected and self.ftp.connect_timing is not None:
+            status_msg.append(f"Session setup: {self.ftp.connect_timing.phases()}")
+        if self.connected and self.ftp.keepalive is not None:
+            status_msg.append(f"Keepalive: {self.ftp.keepalive.describe()}")
+        if self.connected and self.ftp.reconnects:
+            status_msg.append(f"Reconnects: {self.ftp.reconnects}")
+        if self.connected and self.ftp.features is not None and self.ftp.features.listing_times:
+            status_msg.append(f"Directory listing: {self.ftp.features.describe_listing()}")
+        status_msg.append(f"Retries: {retry_summary()}")
+        latency = connect_latency_lines()
+        if latency:
+            status_msg.append("Session setup latency (all sessions):")
+            status_msg.extend(latency)
+        if rtt_histogram.count:
+            status_msg.append(f"Control channel RTT (all sessions): {rtt_histogram.summary()}")
+        records = stats_bus.recent(TRANSFER)
+        if records:
+            status_msg.append(f"Transfers: {summarize(records)}")
         
         messagebox.showinfo("Status", "\n".join(status_msg))
 
@@ -756,7 +865,7 @@ class FTPClientGUI:
         os.makedirs(Config.DOWNLOAD_DIR, exist_ok=True)
 
         # Tạo progress window
-        progress_window = ProgressWindow(self.root, f"Downloading {os.path.basename(remote_file)}")
+        progress_window = ProgressWindow(self.root, f"Downloading {os.path.basename(remote_file)}", on_cancel=self._abort_transfer)
 
         def download_thread():
             try:
@@ -769,6 +878,7 @@ class FTPClientGUI:
 
                 def progress_callback(transferred, total_size):
                     if progress_window.is_cancelled:
+                        self._abort_transfer()  # Bấm Hủy bỏ lúc kênh dữ liệu chưa mở: hủy từ block đầu tiên
                         return
                     percent = (transferred / total_size) * 100 if total_size else 0
                     progress_window.window.after(0, lambda p=percent, st=f"Đang download: {os.path.basename(remote_file)} ({percent:.1f}%)": progress_window.update_progress(p, st))
@@ -849,20 +959,20 @@ class FTPClientGUI:
         total_bytes_to_transfer = 0
 
         # Tính tổng kích thước file trong luồng phụ
-        progress_window = ProgressWindow(self.root, f"Downloading {total_files_to_download} file(s)")
+        progress_window = ProgressWindow(self.root, f"Downloading {total_files_to_download} file(s)", on_cancel=self._abort_transfer)
 
         def mget_thread():
             nonlocal download_count
             bytes_transferred_overall = 0
             
-            # Tính tổng kích thước file
+            # Tính tổng kích thước file (một lô SIZE pipeline cho tất cả file)
+            file_sizes = self.ftp_helpers.remote_sizes(selected_files)
             current_total_bytes = 0
-            for remote_file in selected_files:
-                try:
-                    current_total_bytes += self.ftp_cmd.size(remote_file)
-                except Exception as e:
-                    self.log_message(f"Could not get size of remote file {remote_file}: {e}", "WARNING")
-                    pass
+            for remote_file, size in file_sizes.items():
+                if size is None:
+                    self.log_message(f"Could not get size of remote file {remote_file}", "WARNING")
+                else:
+                    current_total_bytes += size
             
             if current_total_bytes == 0 and total_files_to_download > 0:
                 self.log_message("Warning: Total size of selected files is 0 or could not be determined.", "WARNING")
@@ -875,15 +985,12 @@ class FTPClientGUI:
 
                     local_file = os.path.join(dest_dir, os.path.basename(remote_file))
 
-                    total_file_size = 0
-                    try:
-                        total_file_size = self.ftp_cmd.size(remote_file)
-                    except Exception as e:
-                        self.log_message(f"Could not get size of remote file {remote_file}: {e}", "WARNING")
+                    total_file_size = file_sizes.get(remote_file) or 0
 
                     last_transferred = 0
                     def progress_callback(transferred, total=None):
                         if progress_window.is_cancelled:
+                            self._abort_transfer()  # Bấm Hủy bỏ lúc kênh dữ liệu chưa mở: hủy từ block đầu tiên
                             return
                         nonlocal bytes_transferred_overall, last_transferred
                         file_percent = (transferred / total_file_size) * 100 if total_file_size else 0
@@ -893,7 +1000,8 @@ class FTPClientGUI:
                         overall_percent = (bytes_transferred_overall / current_total_bytes) * 100 if current_total_bytes else 0
                         self.root.after(0, lambda p=overall_percent, st=f"Downloading {i+1}/{total_files_to_download}: {os.path.basename(remote_file)} ({file_percent:.1f}%)": progress_window.update_progress(min(p, 100), st))
 
-                    if self.ftp_helpers._download_file(remote_file, local_file, self.transfer_mode, progress_callback=progress_callback):
+                    if self.ftp_helpers._download_file(remote_file, local_file, self.transfer_mode, progress_callback=progress_callback,
+                                                       total_size=file_sizes.get(remote_file)):
                         self.log_message(f"Successfully downloaded {remote_file}.")
                         download_count += 1
                     else:
@@ -932,7 +1040,7 @@ class FTPClientGUI:
             return
 
         # Tạo progress window
-        progress_window = ProgressWindow(self.root, f"Uploading {os.path.basename(local_file)}")
+        progress_window = ProgressWindow(self.root, f"Uploading {os.path.basename(local_file)}", on_cancel=self._abort_transfer)
 
         def upload_thread():
             try:
@@ -946,6 +1054,7 @@ class FTPClientGUI:
 
                     def progress_callback(transferred, total):
                         if progress_window.is_cancelled:
+                            self._abort_transfer()  # Bấm Hủy bỏ lúc kênh dữ liệu chưa mở: hủy từ block đầu tiên
                             return
                         percent = (transferred / total) * 100 if total else 0
                         progress_window.window.after(0, lambda p=percent: progress_window.update_progress(p, f"Đang upload: {p:.1f}%"))
@@ -987,7 +1096,7 @@ class FTPClientGUI:
             total_bytes_to_transfer = 0
 
             # Tạo progress window trước khi quét virus
-            progress_window = ProgressWindow(self.root, f"Scanning and Uploading {total_files_to_upload} file(s)")
+            progress_window = ProgressWindow(self.root, f"Scanning and Uploading {total_files_to_upload} file(s)", on_cancel=self._abort_transfer)
 
             try:
                 self.log_message("Scanning selected files for viruses...")
@@ -1032,6 +1141,7 @@ class FTPClientGUI:
 
                     def progress_callback(transferred, total):
                         if progress_window.is_cancelled:
+                            self._abort_transfer()  # Bấm Hủy bỏ lúc kênh dữ liệu chưa mở: hủy từ block đầu tiên
                             return
                         nonlocal bytes_transferred_overall
                         delta = transferred - last_transferred[0]
@@ -1119,7 +1229,7 @@ class FTPClientGUI:
 
         self.log_message(f"Uploading directory {local_dir} to {remote_dir}...")
 
-        progress_window = ProgressWindow(self.root, f"Uploading directory {os.path.basename(local_dir)}")
+        progress_window = ProgressWindow(self.root, f"Uploading directory {os.path.basename(local_dir)}", on_cancel=self._abort_transfer)
 
         def putdir_thread():
             try:
@@ -1215,7 +1325,7 @@ class FTPClientGUI:
 
         self.log_message(f"Downloading directory {remote_dir} to {local_dir}...")  
         
-        progress_window = ProgressWindow(self.root, f"Downloading directory {os.path.basename(remote_dir)}")
+        progress_window = ProgressWindow(self.root, f"Downloading directory {os.path.basename(remote_dir)}", on_cancel=self._abort_transfer)
 
         def getdir_thread():
             try:
@@ -1225,19 +1335,10 @@ class FTPClientGUI:
                 def count_remote_items(path):
                     try:
                         self.ftp_cmd.cwd(path)
-                        items = []
-                        self.ftp_cmd.dir(items.append)
-                        for line in items:
-                            parts = line.split(maxsplit=8)
-                            if len(parts) < 9:
-                                continue
-                            name = parts[8]
-                            permissions = parts[0]
-                            if name in (".", ".."):
-                                continue
+                        for entry in self.ftp_cmd.entries():
                             total_items[0] += 1
-                            if permissions.startswith('d'):
-                                count_remote_items(name)
+                            if entry.is_dir:
+                                count_remote_items(entry.name)
                     except Exception as e:
                         self.log_message(f"Error counting remote items in {path}: {e}", "WARNING")
                     finally:
@@ -1286,34 +1387,23 @@ class FTPClientGUI:
         except all_errors as e:
             raise Exception(f"Unable to access remote directory {remote_path}: {e}")
 
-        items = []
-        self.ftp_cmd.dir(items.append) 
-
-        for line in items:
+        for entry in self.ftp_cmd.entries():
             if progress_window.is_cancelled:
                 break
 
-            parts = line.split(maxsplit=8)
-            if len(parts) < 9:
-                continue
-            
-            permissions = parts[0]
-            item_name = parts[8]
-
-            if item_name in (".", ".."): 
-                continue
-
+            item_name = entry.name
             remote_item_path = item_name
             local_item_path = os.path.join(local_path, item_name)
 
-            if permissions.startswith("d"):
+            if entry.is_dir:
                 progress_callback_recursive(local_item_path, is_dir=True)
                 self.log_message(f"  Processing subdirectory: {remote_item_path}")
                 self._recursive_download(remote_item_path, local_item_path, progress_window, progress_callback_recursive)
             else:
                 progress_callback_recursive(local_item_path)
                 self.log_message(f"  Downloading file: {remote_item_path}")
-                if self.ftp_helpers._download_file(remote_item_path, local_item_path, self.transfer_mode):
+                if self.ftp_helpers._download_file(remote_item_path, local_item_path, self.transfer_mode,
+                                                   total_size=entry.size if entry.is_file else None):
                     self.log_message(f"  Successfully downloaded {item_name}")
                 else:
                     self.log_message(f"  Unable to download {item_name}", "ERROR")
@@ -1441,26 +1531,20 @@ class FTPClientGUI:
 
         try:
             # Dùng ftp.dir để phân tích nội dung
-            lines = []
-            self.ftp_cmd.dir(path, lines.append)
-
-            for line in lines:
-                parts = line.split(maxsplit=8)
-                if len(parts) < 9:
-                    continue
-
-                name = parts[8]
-                permissions = parts[0]
-
-                if name in (".", ".."):
-                    continue
-
+            files_to_delete = []
+            for entry in self.ftp_cmd.entries(path):
+                name = entry.name
                 full_path = f"{path}/{name}" if not path.endswith("/") else f"{path}{name}"
 
-                if permissions.startswith('d'):
+                if entry.is_dir:
                     self.delete_remote_dir_recursive(full_path)
                 else:
-                    self.ftp_cmd.delete(full_path)
+                    files_to_delete.append(full_path)
+
+            # Xóa các file trong thư mục bằng một lô DELE pipeline
+            failed = [r for r in self.ftp_cmd.delete_many(files_to_delete) if not r.ok]
+            if failed:
+                raise Exception("; ".join(f"{r.command[5:]}: {r.error}" for r in failed))
 
             # Sau khi xóa hết bên trong, xóa thư mục chính
             self.ftp_cmd.rmd(path)
@@ -1476,5 +1560,6 @@ class FTPClientGUI:
         self.log_message("Đã đóng ứng dụng FTP Client.")
         if self.connected:
             self.disconnect_ftp()
+        stats_bus.unsubscribe(TRANSFER, self._on_transfer_stats)
         self.root.destroy()
         sys.exit(0)
@@ -8,7 +8,8 @@ import socket
 # Thêm thư mục hiện tại vào Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from ..core.raw_socket_ftp import FTP, all_errors
+from ..core.raw_socket_ftp import FTP, all_errors, open_control_socket
+from ..core.ftp_stats import ConnectTiming
 from ..core.config import Config
 from ..core.utils import Utils
 import logging
@@ -259,9 +260,10 @@ class LoginWindow:
             try:
                 self.safe_after(lambda: self.show_status("Đang kiểm tra kết nối mạng...", "info"))
                 
-                # Thử kết nối mạng trước
+                # Thử kết nối mạng trước; socket này được giao luôn cho phiên FTP (không bắt tay lại)
+                timing = ConnectTiming(host, port)
                 try:
-                    socket.create_connection((host, port), timeout=10)
+                    sock = open_control_socket(host, port, 10, timing)
                 except socket.error as e:
                     raise Exception(f"Không thể kết nối đến {host}:{port}. Chi tiết: {str(e)}")
                 
@@ -269,7 +271,7 @@ class LoginWindow:
                 
                 # Kết nối FTP
                 self.ftp = FTP()
-                self.ftp.connect(host, port, timeout=30)
+                self.ftp.connect(host, port, timeout=30, sock=sock, timing=timing)
                 
                 self.safe_after(lambda: self.show_status("Đang đăng nhập...", "info"))
                 
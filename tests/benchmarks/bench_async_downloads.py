@@ -0,0 +1,116 @@
+"""
+Benchmark 500 download file nhỏ đồng thời: asyncio (AsyncFTP) so với mỗi transfer một thread (FTP).
+
+Mỗi transfer là một phiên riêng: connect, login, RETR, QUIT. FTP server cục bộ
+và mỗi engine chạy ở tiến trình riêng để thời gian CPU, số thread và bộ nhớ
+đo được chỉ là của client tương ứng.
+
+Chạy:
+    python tests/benchmarks/bench_async_downloads.py [số_file] [kích_thước_byte] [độ_trễ_server_giây]
+"""
+
+import asyncio
+import contextlib
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+from client.core.async_ftp import AsyncFTP
+from local_ftp_server import make_tree
+
+HOST = '127.0.0.1'
+
+
+def fetch_threaded(port, name, results):
+    ftp = FTP()
+    ftp.connect(HOST, port, timeout=60)
+    ftp.login('user', 'secret')
+    chunks = []
+    ftp.retrbinary(f'RETR {name}', chunks.append)
+    ftp.quit()
+    results[name] = b''.join(chunks)
+
+
+def run_threads(port, names):
+    results = {}
+    peak = 0
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        threads = [threading.Thread(target=fetch_threaded, args=(port, name, results)) for name in names]
+        for t in threads:
+            t.start()
+            peak = max(peak, threading.active_count())
+        for t in threads:
+            t.join()
+    return results, peak
+
+
+async def fetch_async(port, name):
+    ftp = AsyncFTP(timeout=60)
+    await ftp.connect(HOST, port)
+    await ftp.login('user', 'secret')
+    data = await ftp.retrieve(name)
+    await ftp.quit()
+    return name, data
+
+
+def run_async(port, names):
+    async def main():
+        return dict(await asyncio.gather(*(fetch_async(port, name) for name in names)))
+
+    results = asyncio.run(main())
+    return results, threading.active_count()
+
+
+def measure(engine, port, names, size):
+    """Chạy một engine trong tiến trình hiện tại, in một dòng kết quả"""
+    func = run_threads if engine == 'threads' else run_async
+    cpu = time.process_time()
+    start = time.perf_counter()
+    results, peak = func(port, names)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    assert len(results) == len(names) and all(len(data) == size for data in results.values())
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(f"{engine:<10}{elapsed:>10.3f}{len(names) / elapsed:>10.0f}{cpu:>10.3f}{peak:>10}{max_rss:>10}")
+
+
+def main():
+    # Chế độ con: --engine <tên> <port> <số_file> <kích_thước>
+    if sys.argv[1:2] == ['--engine']:
+        engine, port, count, size = sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+        measure(engine, port, [f'file{i:04d}.bin' for i in range(count)], size)
+        return
+
+    args = sys.argv[1:]
+    count = int(args[0]) if args else 500
+    size = int(args[1]) if len(args) > 1 else 4096
+    latency = args[2] if len(args) > 2 else '0'
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, {f'file{i:04d}.bin': os.urandom(size) for i in range(count)})
+        server = subprocess.Popen([sys.executable, os.path.join(TESTS_DIR, 'local_ftp_server.py'), root, latency],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            port = server.stdout.readline().strip()
+            print(f"{count} concurrent downloads of {size} bytes, server latency {latency}s per command")
+            print(f"{'engine':<10}{'wall s':>10}{'files/s':>10}{'cpu s':>10}{'threads':>10}{'RSS MiB':>10}")
+            # Mỗi engine chạy trong một tiến trình riêng để số thread và RSS không lẫn nhau
+            for engine in ('threads', 'asyncio'):
+                subprocess.run([sys.executable, __file__, '--engine', engine, port, str(count), str(size)],
+                               check=True)
+        finally:
+            server.stdin.close()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark kích thước block khi tải binary: block cố định so với tự điều chỉnh.
+
+retrbinary được chạy với Config.FIXED_BLOCK_SIZE = 8 KiB (mặc định cũ), 64 KiB
+và None (block tự tăng theo thông lượng và RTT). FTP server cục bộ chạy ở tiến
+trình con nên thời gian CPU đo được chỉ là của client.
+
+Chạy:
+    python tests/benchmarks/bench_block_size.py [MiB]
+"""
+
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+from client.core.config import Config
+from client.core.utils import Utils
+
+
+def run(port, fixed):
+    Config.FIXED_BLOCK_SIZE = fixed
+    received = [0]
+
+    def handle_block(block):
+        received[0] += len(block)
+
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        ftp = FTP()
+        ftp.connect('127.0.0.1', port, timeout=60)
+        ftp.login('user', 'secret')
+        ftp.voidcmd('TYPE I')
+        cpu = time.process_time()
+        start = time.perf_counter()
+        ftp.retrbinary('RETR data.bin', handle_block)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        stats = ftp.last_transfer
+        ftp.quit()
+    return elapsed, cpu, stats
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 1024) * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, 'data.bin'), 'wb') as f:
+            Utils.preallocate(f, size)
+        server = subprocess.Popen([sys.executable, os.path.join(TESTS_DIR, 'local_ftp_server.py'), root],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline())
+            results = {name: run(port, fixed)
+                       for name, fixed in (('8 KiB', 8192), ('64 KiB', 65536), ('adaptive', None))}
+        finally:
+            server.stdin.close()
+            server.wait()
+
+    print(f"{size // (1024 * 1024)} MiB retrbinary over loopback")
+    print(f"{'block':<10}{'wall s':>10}{'MiB/s':>10}{'cpu s':>10}{'final':>10}{'rcvbuf':>10}")
+    for name, (elapsed, cpu, stats) in results.items():
+        print(f"{name:<10}{elapsed:>10.3f}{size / elapsed / (1024 * 1024):>10.0f}{cpu:>10.3f}"
+              f"{stats['block_size']:>10}{stats.get('rcvbuf', 0):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark băm SHA-256 trong lúc tải: không băm, băm ngay trong vòng lặp nhận, băm trên thread riêng.
+
+FTP server cục bộ chạy ở tiến trình con; không giới hạn băng thông (mặc định)
+thì cả ba cách đều bị giới hạn bởi CPU, có giới hạn thì thread băm làm việc
+trong lúc vòng lặp nhận chờ mạng. Thời gian đo tính tới khi có digest (với
+BackgroundHasher là cả thời gian chờ thread băm xong).
+
+Chạy:
+    python tests/benchmarks/bench_checksum.py [MiB] [MiB/s]
+"""
+
+import contextlib
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+from client.core.ftp_checksum import BackgroundHasher, select_algorithm
+
+
+def run(port, root, how):
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        ftp = FTP()
+        ftp.connect('127.0.0.1', port, timeout=120)
+        ftp.login('user', 'secret')
+        ftp.voidcmd('TYPE I')
+        if how == 'inline':
+            hasher = hashlib.sha256()
+        elif how == 'background':
+            hasher = BackgroundHasher(select_algorithm({'XSHA256': ''}))
+        else:
+            hasher = None
+
+        start = time.perf_counter()
+        with open(os.path.join(root, f'out-{how}.bin'), 'wb') as f:
+            ftp.retrfile('RETR data.bin', f, hasher=hasher)
+        digest = hasher.hexdigest() if hasher else None
+        elapsed = time.perf_counter() - start
+        ftp.quit()
+    return elapsed, digest
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 512 * 1024 * 1024
+    rate = int(float(sys.argv[2]) * 1024 * 1024) if len(sys.argv) > 2 else 0
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, 'data.bin'), 'wb') as f:
+            for _ in range(0, size, 1024 * 1024):
+                f.write(os.urandom(1024 * 1024))
+        server = subprocess.Popen([sys.executable, os.path.join(TESTS_DIR, 'local_ftp_server.py'), root, '0', str(rate)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline())
+            results = {how: run(port, root, how) for how in ('none', 'inline', 'background')}
+        finally:
+            server.stdin.close()
+            server.wait()
+
+    assert results['inline'][1] == results['background'][1]
+    link = f"link limited to {rate / (1024 * 1024):.0f} MiB/s" if rate else "unlimited loopback"
+    print(f"{size / (1024 * 1024):.0f} MiB download, {link}, SHA-256")
+    print(f"{'hashing':<12}{'seconds':>10}{'MiB/s':>10}")
+    for how, (elapsed, _) in results.items():
+        print(f"{how:<12}{elapsed:>10.2f}{size / (1024 * 1024) / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
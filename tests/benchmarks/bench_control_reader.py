@@ -0,0 +1,113 @@
+"""
+Microbenchmark cho kênh điều khiển: so sánh cách đọc recv(1) từng byte (cũ)
+với ControlReader có đệm (mới).
+
+Đo số lần gọi recv/recv_into và thời gian trung bình cho mỗi phản hồi trên các
+loại phản hồi ngắn (200 OK) và phản hồi nhiều dòng dài (FEAT/STAT/HELP).
+
+Chạy:
+    python tests/benchmarks/bench_control_reader.py
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from client.core.raw_socket_ftp import ControlReader
+
+
+class CountingSocket:
+    """Bọc socket để đếm số lần gọi hệ thống khi nhận dữ liệu"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.calls = 0
+
+    def recv(self, n):
+        self.calls += 1
+        return self.sock.recv(n)
+
+    def recv_into(self, buf):
+        self.calls += 1
+        return self.sock.recv_into(buf)
+
+
+def legacy_readline(sock):
+    """Cách đọc cũ của ftp_recv_line: recv(1) và nối bytes cho từng ký tự"""
+    line = b''
+    while True:
+        char = sock.recv(1)
+        if not char:
+            break
+        line += char
+        if line.endswith(b'\r\n'):
+            break
+    return line
+
+
+def read_response(readline):
+    """Đọc một phản hồi (kể cả nhiều dòng) giống ftp_get_response"""
+    resp = readline().decode('utf-8').rstrip('\r\n')
+    if len(resp) >= 4 and resp[3] == '-':
+        code = resp[:3]
+        while True:
+            line = readline().decode('utf-8').rstrip('\r\n')
+            if line.startswith(code + ' '):
+                return line
+    return resp
+
+
+def make_reply(lines):
+    if lines <= 1:
+        return b'200 Command okay.\r\n'
+    body = b''.join(b' FEATURE-%05d some additional parameters here\r\n' % i for i in range(lines - 2))
+    return b'211-Features:\r\n' + body + b'211 End\r\n'
+
+
+def run(reader_kind, reply, count):
+    server, client = socket.socketpair()
+    counting = CountingSocket(client)
+
+    def writer():
+        # Mỗi lệnh nhận được thì trả lời một phản hồi, giống vòng lệnh/phản hồi thật
+        for _ in range(count):
+            if not server.recv(64):
+                break
+            server.sendall(reply)
+
+    t = threading.Thread(target=writer, daemon=True)
+    t.start()
+
+    if reader_kind == 'legacy':
+        readline = lambda: legacy_readline(counting)
+    else:
+        readline = ControlReader(counting).readline
+
+    start = time.perf_counter()
+    for _ in range(count):
+        client.sendall(b'NOOP\r\n')
+        read_response(readline)
+    elapsed = time.perf_counter() - start
+
+    t.join()
+    server.close()
+    client.close()
+    return counting.calls / count, elapsed / count * 1e6
+
+
+def main():
+    cases = [('short reply (1 line)', 1, 5000), ('FEAT-like (20 lines)', 20, 1000), ('STAT/HELP-like (500 lines)', 500, 50)]
+    print(f"{'reply':<28}{'reader':<10}{'syscalls/reply':>16}{'us/reply':>12}")
+    for name, lines, count in cases:
+        reply = make_reply(lines)
+        for kind in ('legacy', 'buffered'):
+            calls, latency = run(kind, reply, count)
+            print(f"{name:<28}{kind:<10}{calls:>16.1f}{latency:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
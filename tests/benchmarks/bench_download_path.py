@@ -0,0 +1,95 @@
+"""
+Benchmark đường tải binary: cách cũ so với recv_into + file mở một lần, và os.splice.
+
+Cách cũ mô phỏng _download_file trước đây: retrbinary với recv(8192) tạo bytes
+mới mỗi block, callback mở file ở chế độ "ab" rồi đóng lại cho mỗi block. Cách
+mới là FTP.retrfile (recv_into vào bytearray dùng lại, file mở một lần, cấp
+phát trước bằng posix_fallocate) và biến thể os.splice (Linux). FTP server cục
+bộ chạy ở tiến trình con nên thời gian CPU đo được chỉ là của client.
+
+Chạy:
+    python tests/benchmarks/bench_download_path.py [MiB]
+"""
+
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+from client.core.utils import Utils
+
+
+def download_legacy(ftp, local_path, size):
+    def handle_block(block):
+        with open(local_path, "ab") as f:
+            f.write(block)
+
+    open(local_path, "wb").close()
+    ftp.retrbinary('RETR data.bin', handle_block, blocksize=8192)
+
+
+def download_recv_into(ftp, local_path, size, use_splice=False):
+    with open(local_path, 'wb') as f:
+        Utils.preallocate(f, size)
+        ftp.retrfile('RETR data.bin', f, use_splice=use_splice)
+
+
+def download_splice(ftp, local_path, size):
+    download_recv_into(ftp, local_path, size, use_splice=True)
+
+
+def run(port, func, local_path, size):
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        ftp = FTP()
+        ftp.connect('127.0.0.1', port, timeout=60)
+        ftp.login('user', 'secret')
+        ftp.voidcmd('TYPE I')
+        cpu = time.process_time()
+        start = time.perf_counter()
+        func(ftp, local_path, size)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        ftp.quit()
+    if os.path.getsize(local_path) != size:
+        raise RuntimeError(f"{func.__name__}: wrong size {os.path.getsize(local_path)}")
+    os.remove(local_path)
+    return elapsed, cpu
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 2048) * 1024 * 1024
+
+    paths = [('recv+ab', download_legacy), ('recv_into', download_recv_into)]
+    if hasattr(os, 'splice'):
+        paths.append(('splice', download_splice))
+
+    with tempfile.TemporaryDirectory() as root:
+        server_root = os.path.join(root, 'server')
+        os.makedirs(server_root)
+        with open(os.path.join(server_root, 'data.bin'), 'wb') as f:
+            Utils.preallocate(f, size)  # Nội dung không quan trọng, chỉ cần kích thước
+        server = subprocess.Popen([sys.executable, os.path.join(TESTS_DIR, 'local_ftp_server.py'), server_root],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline())
+            local_path = os.path.join(root, 'download.bin')
+            results = {name: run(port, func, local_path, size) for name, func in paths}
+        finally:
+            server.stdin.close()
+            server.wait()
+
+    print(f"{size // (1024 * 1024)} MiB binary download over loopback")
+    print(f"{'path':<12}{'wall s':>10}{'MiB/s':>10}{'cpu s':>10}")
+    for name, (elapsed, cpu) in results.items():
+        print(f"{name:<12}{elapsed:>10.3f}{size / elapsed / (1024 * 1024):>10.0f}{cpu:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark MODE Z (deflate) so với stream mode trên kênh dữ liệu bị giới hạn băng thông.
+
+Dữ liệu là log dạng văn bản (nén tốt, như các file log/CSV thường truyền).
+FTP server cục bộ chạy ở tiến trình con với giới hạn băng thông (byte/giây
+trên dây); mỗi chế độ tải xuống rồi tải lên cùng một file.
+
+Chạy:
+    python tests/benchmarks/bench_mode_z.py [MiB] [MiB/s]
+"""
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+
+
+def make_log(size):
+    lines = []
+    total = i = 0
+    while total < size:
+        line = b'2024-05-01 12:%02d:%02d INFO GET /api/items/%d status=200 bytes=%d ms=%d\n' % (
+            i // 60 % 60, i % 60, i % 5000, (i * 7919) % 100000, i % 250)
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return b''.join(lines)[:size]
+
+
+def run(port, mode, level, payload):
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        ftp = FTP()
+        ftp.connect('127.0.0.1', port, timeout=120)
+        ftp.login('user', 'secret')
+        ftp.voidcmd('TYPE I')
+        if mode == 'Z' and not ftp.set_mode('Z', level):
+            raise RuntimeError("server does not advertise MODE Z")
+
+        start = time.perf_counter()
+        buf = io.BytesIO()
+        ftp.retrfile('RETR data.log', buf)
+        down = time.perf_counter() - start
+        down_wire = ftp.last_transfer.get('wire_bytes', ftp.last_transfer['bytes'])
+        assert buf.getvalue() == payload
+
+        start = time.perf_counter()
+        ftp.storbinary(f'STOR up-{mode}{level or ""}.log', io.BytesIO(payload))
+        up = time.perf_counter() - start
+        up_wire = ftp.last_transfer.get('wire_bytes', ftp.last_transfer['bytes'])
+        ftp.quit()
+    return down, up, down_wire, up_wire
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 32 * 1024 * 1024
+    rate = int(float(sys.argv[2]) * 1024 * 1024) if len(sys.argv) > 2 else 8 * 1024 * 1024
+    payload = make_log(size)
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, 'data.log'), 'wb') as f:
+            f.write(payload)
+        server = subprocess.Popen([sys.executable, os.path.join(TESTS_DIR, 'local_ftp_server.py'), root, '0', str(rate)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline())
+            results = {name: run(port, mode, level, payload)
+                       for name, mode, level in (('stream', 'S', None), ('Z level 1', 'Z', 1), ('Z level 6', 'Z', 6))}
+        finally:
+            server.stdin.close()
+            server.wait()
+
+    print(f"{size / (1024 * 1024):.0f} MiB text log, link limited to {rate / (1024 * 1024):.1f} MiB/s")
+    print(f"{'mode':<12}{'down s':>10}{'up s':>10}{'down wire MiB':>15}{'up wire MiB':>13}")
+    for name, (down, up, down_wire, up_wire) in results.items():
+        print(f"{name:<12}{down:>10.2f}{up:>10.2f}{down_wire / (1024 * 1024):>15.1f}{up_wire / (1024 * 1024):>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
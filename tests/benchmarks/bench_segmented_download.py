@@ -0,0 +1,65 @@
+"""
+Benchmark tải phân đoạn song song so với một luồng RETR duy nhất.
+
+FTP server cục bộ giới hạn băng thông mỗi kết nối dữ liệu (tham số rate),
+giả lập giới hạn cửa sổ TCP của một kết nối trên đường truyền xa. Cùng một
+file được tải với 1, 2, 4 và 8 đoạn qua FTPHelpers._download_file.
+
+Chạy:
+    python tests/benchmarks/bench_segmented_download.py [MiB] [byte/giây mỗi kết nối]
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+from client.core.ftp_helpers import FTPHelpers
+from client.core.config import Config
+from local_ftp_server import LocalFTPServer, make_tree
+
+
+def run(server, local_path, segments):
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        ftp = FTP()
+        ftp.connect(server.host, server.port, timeout=30)
+        ftp.login('user', 'secret')
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+        start = time.perf_counter()
+        ok = FTPHelpers(ftp)._download_file('data.bin', local_path, 'binary', segments=segments)
+        elapsed = time.perf_counter() - start
+
+        ftp.quit()
+    if not ok:
+        raise RuntimeError(f"download with {segments} segment(s) failed")
+    return elapsed
+
+
+def main():
+    args = sys.argv[1:]
+    size = int(args[0]) * 1024 * 1024 if args else 16 * 1024 * 1024
+    rate = int(args[1]) if len(args) > 1 else 4 * 1024 * 1024
+    Config.SEGMENTED_DOWNLOAD_THRESHOLD = 0
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, {'server/data.bin': os.urandom(size)})
+        local_path = os.path.join(root, 'data.bin')
+        with LocalFTPServer(os.path.join(root, 'server'), rate=rate) as server:
+            results = {n: run(server, local_path, n) for n in (1, 2, 4, 8)}
+
+    print(f"{size // (1024 * 1024)} MiB file, {rate / (1024 * 1024):.1f} MiB/s per data connection")
+    print(f"{'segments':<10}{'wall s':>10}{'MiB/s':>10}")
+    for segments, elapsed in results.items():
+        print(f"{segments:<10}{elapsed:>10.3f}{size / elapsed / (1024 * 1024):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark upload binary: đọc 8 KiB + callback mỗi block (cách cũ) so với sendfile theo lát lớn.
+
+Cách cũ mô phỏng _upload_file trước đây: storbinary với lớp bọc FileWithCallback
+gọi callback cho mỗi block 8 KiB. Cách mới là FTP.storfile (socket.sendfile từ
+file descriptor xuống socket dữ liệu, callback mỗi lát). FTP server cục bộ chạy
+ở tiến trình con nên thời gian CPU đo được chỉ là của client.
+
+Chạy:
+    python tests/benchmarks/bench_upload_sendfile.py [MiB]
+"""
+
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+
+
+class FileWithCallback:
+    def __init__(self, file_obj, callback):
+        self.file_obj = file_obj
+        self.callback = callback
+
+    def read(self, blocksize):
+        block = self.file_obj.read(blocksize)
+        if block:
+            self.callback(block)
+        return block
+
+
+def upload_legacy(ftp, path):
+    calls = [0]
+
+    def handle_block(block):
+        calls[0] += 1
+
+    with open(path, 'rb') as f:
+        ftp.storbinary('STOR legacy.bin', FileWithCallback(f, handle_block), blocksize=8192)
+    return calls[0]
+
+
+def upload_sendfile(ftp, path):
+    calls = [0]
+
+    def handle_sent(count):
+        calls[0] += 1
+
+    with open(path, 'rb') as f:
+        ftp.storfile('STOR sendfile.bin', f, handle_sent)
+    return calls[0]
+
+
+def run(port, func, path):
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        ftp = FTP()
+        ftp.connect('127.0.0.1', port, timeout=60)
+        ftp.login('user', 'secret')
+        ftp.voidcmd('TYPE I')
+        cpu = time.process_time()
+        start = time.perf_counter()
+        calls = func(ftp, path)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        ftp.quit()
+    return elapsed, cpu, calls
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 256) * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'source.bin')
+        with open(path, 'wb') as f:
+            for _ in range(size // (1024 * 1024)):
+                f.write(os.urandom(1024 * 1024))
+        server_root = os.path.join(root, 'server')
+        os.makedirs(server_root)
+        server = subprocess.Popen([sys.executable, os.path.join(TESTS_DIR, 'local_ftp_server.py'), server_root],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline())
+            results = {name: run(port, func, path)
+                       for name, func in (('read+send', upload_legacy), ('sendfile', upload_sendfile))}
+        finally:
+            server.stdin.close()
+            server.wait()
+
+    print(f"{size // (1024 * 1024)} MiB binary upload over loopback")
+    print(f"{'path':<12}{'wall s':>10}{'MiB/s':>10}{'cpu s':>10}{'callbacks':>11}")
+    for name, (elapsed, cpu, calls) in results.items():
+        print(f"{name:<12}{elapsed:>10.3f}{size / elapsed / (1024 * 1024):>10.0f}{cpu:>10.3f}{calls:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark chi phí ghi vết kênh điều khiển (wire trace) trên workload nhiều lệnh.
+
+So sánh cùng một chuỗi lệnh điều khiển (PWD, SIZE, CWD, NOOP) với FTP server
+cục bộ ở các mức trace: off, ring (chỉ lưu ring buffer) và on (in ra như cách
+print() cũ). Ở mức on, stdout được chuyển sang terminal thật nếu chạy với
+--tty, ngược lại sang os.devnull (chỉ đo chi phí định dạng + ghi).
+
+Chạy:
+    python tests/benchmarks/bench_wire_trace.py [số_lệnh] [--tty]
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+from client.core.raw_socket_ftp import FTP
+from client.core.ftp_trace import tracer
+from local_ftp_server import LocalFTPServer, make_tree
+
+
+def workload(ftp, rounds):
+    for i in range(rounds):
+        ftp.pwd()
+        ftp.size('data.bin')
+        ftp.cwd('sub')
+        ftp.cwd('..')
+        ftp.voidcmd('NOOP')
+
+
+def run(server, level, rounds, to_tty):
+    tracer.set_level(level)
+    tracer.clear()
+    out = sys.stdout if to_tty else open(os.devnull, 'w')
+    with contextlib.redirect_stdout(out):
+        ftp = FTP()
+        ftp.connect(server.host, server.port, timeout=10)
+        ftp.login('user', 'secret')
+
+        start_cpu = time.process_time()
+        start = time.perf_counter()
+        workload(ftp, rounds)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - start_cpu
+
+        ftp.quit()
+    if not to_tty:
+        out.close()
+    tracer.set_level('off')
+    return elapsed, cpu
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    rounds = int(args[0]) if args else 2000
+    to_tty = '--tty' in sys.argv
+    commands = rounds * 5
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, {'data.bin': b'x' * 1024, 'sub/keep': b''})
+        with LocalFTPServer(root) as server:
+            results = {level: run(server, level, rounds, to_tty) for level in ('off', 'ring', 'on')}
+
+    print(f"{commands} control commands per run")
+    print(f"{'trace':<8}{'wall s':>10}{'us/cmd':>10}{'cpu s':>10}")
+    for level, (elapsed, cpu) in results.items():
+        print(f"{level:<8}{elapsed:>10.3f}{elapsed / commands * 1e6:>10.1f}{cpu:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
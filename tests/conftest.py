@@ -14,6 +14,7 @@ from collections import defaultdict
 current_dir = Path(__file__).parent
 client_dir = current_dir.parent / 'Client'
 sys.path.insert(0, str(client_dir))
+sys.path.insert(0, str(current_dir.parent))
 sys.path.insert(0, str(current_dir))
 
 from test_config import TestConfig
@@ -79,6 +80,68 @@ def check_clamav_server():
         return False
 
 
+@pytest.fixture(autouse=True)
+def fresh_feature_cache():
+    """Xóa cache FEAT giữa các test: server cục bộ mới có thể nhận lại cổng của server trước với FEAT khác"""
+    from client.core.ftp_features import feature_cache
+    feature_cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_retry_budget():
+    """Mỗi test bắt đầu với ngân sách thử lại đầy (ngân sách dùng chung cho cả tiến trình)"""
+    from client.core.ftp_retry import retry_budget
+    retry_budget.reset()
+    yield
+
+
+@pytest.fixture(scope="function")
+def local_ftp_server(temp_dir):
+    """Khởi động FTP server cục bộ (loopback) phục vụ một thư mục tạm"""
+    from local_ftp_server import LocalFTPServer
+    root = os.path.join(temp_dir, 'server_root')
+    os.makedirs(root)
+    with LocalFTPServer(root) as server:
+        yield server
+
+
+@pytest.fixture(scope="function")
+def ftp_session(request):
+    """Mở phiên FTP đã đăng nhập (TYPE I) tới server cục bộ: ftp_session() hoặc ftp_session(server, passive)
+
+    Không truyền server thì dùng local_ftp_server của test. Phiên chưa đóng được đóng sau test.
+    """
+    from client.core.raw_socket_ftp import FTP
+    opened = []
+
+    def connect(server=None, passive=True):
+        if server is None:
+            server = request.getfixturevalue('local_ftp_server')
+        ftp = FTP()
+        ftp.connect(server.host, server.port, timeout=10)
+        ftp.login('user', 'secret')
+        ftp.voidcmd('TYPE I')
+        ftp.set_pasv(passive)
+        opened.append(ftp)
+        return ftp
+
+    yield connect
+    for ftp in opened:
+        ftp.close()
+
+
+@pytest.fixture(scope="function")
+def records():
+    """Các bản ghi TransferStats được phát trên bus trong lúc chạy test"""
+    from client.core.ftp_stats import TRANSFER, bus
+    received = []
+    bus.clear(TRANSFER)  # Bus dùng chung cho cả tiến trình
+    bus.subscribe(TRANSFER, received.append)
+    yield received
+    bus.unsubscribe(TRANSFER, received.append)
+
+
 @pytest.fixture(scope="function")
 def mock_large_file():
     """Tạo thông tin file lớn giả lập mà không có file lớn thực tế"""
@@ -0,0 +1,706 @@
+"""
+FTP server tối giản chạy trong tiến trình test.
+
+Dùng cho các test và benchmark cần một server thật trên loopback mà không phụ
+thuộc FTP server bên ngoài hay thư viện ngoài (pyftpdlib). Server phục vụ một
+thư mục tạm, chấp nhận mọi user/password và hỗ trợ các lệnh client đang dùng.
+
+Sử dụng:
+    with LocalFTPServer(root_dir) as server:
+        ftp = FTP()
+        ftp.connect(server.host, server.port)
+
+Hoặc chạy như một tiến trình riêng (in ra cổng đang nghe):
+    python tests/local_ftp_server.py <root_dir> [latency_giây] [rate_byte_giây]
+"""
+
+import collections
+import hashlib
+import os
+import posixpath
+import select
+import socket
+import socketserver
+import threading
+import time
+import weakref
+import zlib
+
+# Byte lệnh telnet (IAC IP, DM, ...) client gửi trước ABOR: bỏ đi khi đọc dòng lệnh
+TELNET_BYTES = bytes(range(0xf0, 0x100))
+
+
+class FTPHandler(socketserver.StreamRequestHandler):
+    """Xử lý một kết nối điều khiển"""
+
+    def setup(self):
+        super().setup()
+        self.cwd = '/'
+        self.rename_from = None
+        self.pasv_socket = None
+        self.port_addr = None
+        self.rest = 0
+        self.logged_in = False
+        self.mode = 'S'
+        self.level = 6
+        self.hash_name = 'SHA-256'
+        self.pending = None  # Dòng lệnh đã đọc trong lúc truyền dữ liệu nhưng không phải ABOR
+        self.server.sessions += 1
+        self.server.active += 1
+        self.server.live.add(self.request)
+
+    def finish(self):
+        self.server.active -= 1
+        super().finish()
+
+    # ---------- tiện ích ----------
+    def reply(self, text):
+        self.wfile.write(text.encode('utf-8') + b'\r\n')
+        self.wfile.flush()
+
+    def real_path(self, path):
+        """Chuyển đường dẫn ảo của client thành đường dẫn thật trong root"""
+        virtual = posixpath.normpath(posixpath.join(self.cwd, path or '.'))
+        if not virtual.startswith('/'):
+            virtual = '/' + virtual
+        return os.path.join(self.server.root, virtual.lstrip('/')), virtual
+
+    def open_data(self):
+        if self.pasv_socket is not None:
+            self.pasv_socket.settimeout(10)
+            conn, _ = self.pasv_socket.accept()
+            self.pasv_socket.close()
+            self.pasv_socket = None
+        elif self.port_addr is not None:
+            conn = socket.create_connection(self.port_addr, timeout=10)
+            self.port_addr = None
+        else:
+            return None
+        self.server.live.add(conn)
+        return conn
+
+    def supports(self, name):
+        return any(f.split()[0] == name for f in self.server.features)
+
+    def compressor(self):
+        """Bộ nén cho một lần gửi dữ liệu ở MODE Z (None ở stream mode)"""
+        return zlib.compressobj(self.level) if self.mode == 'Z' else None
+
+    def file_digest(self, path, name):
+        """Digest hex của file theo tên thuật toán (SHA-256, SHA-1, MD5, CRC32)"""
+        if name == 'CRC32':
+            value = 0
+        else:
+            value = hashlib.new(name.replace('-', '').lower())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                if name == 'CRC32':
+                    value = zlib.crc32(block, value)
+                else:
+                    value.update(block)
+        digest = f'{value:08x}' if name == 'CRC32' else value.hexdigest()
+        if self.server.bad_digests:
+            # Giả lập file trên server khác với file client đã truyền
+            self.server.bad_digests -= 1
+            digest = ('0' if digest[0] != '0' else '1') + digest[1:]
+        return digest
+
+    def hash_reply(self, arg, name, template):
+        path, _ = self.real_path(arg)
+        if not os.path.isfile(path):
+            self.reply('550 No such file.')
+            return
+        self.reply(template.format(name=name, size=os.path.getsize(path), digest=self.file_digest(path, name),
+                                   path=arg))
+
+    def read_command(self):
+        """Một dòng lệnh (đã bỏ byte telnet); None khi client đóng kết nối"""
+        if self.pending is not None:
+            raw, self.pending = self.pending, None
+        else:
+            try:
+                raw = self.rfile.readline()
+            except OSError:
+                return None
+        if not raw:
+            return None
+        return raw.lstrip(TELNET_BYTES).decode('utf-8').rstrip('\r\n')
+
+    def abor_received(self):
+        """Kiểm tra kênh điều khiển trong lúc truyền: True nếu client đã gửi ABOR"""
+        if self.pending is not None or not select.select([self.request], [], [], 0)[0]:
+            return False
+        try:
+            raw = self.rfile.readline()
+        except OSError:
+            return False
+        if raw.lstrip(TELNET_BYTES)[:4].upper() == b'ABOR':
+            self.server.commands['ABOR'] += 1
+            return True
+        self.pending = raw  # Xử lý sau khi truyền xong
+        return False
+
+    def throttle(self, nbytes):
+        if self.server.rate:
+            time.sleep(nbytes / self.server.rate)
+
+    def mlsx_line(self, path, name):
+        st = os.stat(path)
+        kind = 'dir' if os.path.isdir(path) else 'file'
+        modify = time.strftime('%Y%m%d%H%M%S', time.gmtime(st.st_mtime))
+        return f"type={kind};size={st.st_size};modify={modify};unique={st.st_dev:x}U{st.st_ino:x}; {name}"
+
+    def list_line(self, path, name):
+        st = os.stat(path)
+        kind = 'd' if os.path.isdir(path) else '-'
+        mtime = time.strftime('%b %d %H:%M', time.gmtime(st.st_mtime))
+        return f"{kind}rw-r--r-- 1 owner group {st.st_size:>10} {mtime} {name}"
+
+    def send_listing(self, lines):
+        conn = self.open_data()
+        if conn is None:
+            self.reply('425 Use PORT or PASV first.')
+            return
+        self.reply('150 Here comes the directory listing.')
+        with conn:
+            payload = ''.join(line + '\r\n' for line in lines).encode('utf-8')
+            compressor = self.compressor()
+            if compressor:
+                payload = compressor.compress(payload) + compressor.flush()
+            conn.sendall(payload)
+        self.reply('226 Directory send OK.')
+
+    # ---------- vòng lặp lệnh ----------
+    def handle(self):
+        if self.server.refuse:
+            self.server.refuse -= 1
+            self.reply('421 Service not available, try again later.')
+            return
+        if self.server.max_sessions and self.server.active > self.server.max_sessions:
+            self.reply('421 Too many connections, try again later.')
+            return
+        self.reply('220 Local test FTP server ready.')
+        while True:
+            line = self.read_command()
+            if line is None:
+                break
+            cmd, _, arg = line.partition(' ')
+            cmd = cmd.upper()
+            self.server.commands[cmd] += 1
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            handler = getattr(self, 'ftp_' + cmd.lower(), None)
+            if handler is None:
+                self.reply(f'502 Command {cmd} not implemented.')
+                continue
+            if not self.logged_in and cmd not in ('USER', 'PASS', 'QUIT', 'FEAT'):
+                self.reply('530 Please login with USER and PASS.')
+                continue
+            if self.server.transient[cmd]:
+                self.server.transient[cmd] -= 1
+                self.reply(f'450 {cmd} temporarily unavailable, try again.')
+                continue
+            try:
+                if handler(arg) is False:
+                    break
+            except OSError as e:
+                self.reply(f'550 {e.strerror or e}')
+
+    def ftp_user(self, arg):
+        self.reply('331 Please specify the password.')
+
+    def ftp_pass(self, arg):
+        self.logged_in = True
+        self.reply('230 Login successful.')
+
+    def ftp_quit(self, arg):
+        self.reply('221 Goodbye.')
+        return False
+
+    def ftp_abor(self, arg):
+        # ABOR tới khi không có lần truyền nào (đã truyền xong trước khi nhận ABOR)
+        self.reply('225 No transfer to abort.')
+
+    def ftp_noop(self, arg):
+        self.reply('200 NOOP ok.')
+
+    def ftp_syst(self, arg):
+        self.reply('215 UNIX Type: L8')
+
+    def ftp_type(self, arg):
+        self.reply(f'200 Switching to {arg} mode.')
+
+    def ftp_pwd(self, arg):
+        self.reply(f'257 "{self.cwd}" is the current directory')
+
+    def ftp_cwd(self, arg):
+        path, virtual = self.real_path(arg)
+        if os.path.isdir(path):
+            self.cwd = virtual
+            self.reply('250 Directory successfully changed.')
+        else:
+            self.reply('550 Failed to change directory.')
+
+    def ftp_cdup(self, arg):
+        self.ftp_cwd('..')
+
+    def ftp_mkd(self, arg):
+        path, virtual = self.real_path(arg)
+        if os.path.exists(path):
+            self.reply('550 Create directory operation failed: File exists.')
+            return
+        os.mkdir(path)
+        self.reply(f'257 "{virtual}" created')
+
+    def ftp_rmd(self, arg):
+        path, _ = self.real_path(arg)
+        os.rmdir(path)
+        self.reply('250 Remove directory operation successful.')
+
+    def ftp_dele(self, arg):
+        path, _ = self.real_path(arg)
+        if not os.path.isfile(path):
+            self.reply('550 Delete operation failed.')
+            return
+        os.remove(path)
+        self.reply('250 Delete operation successful.')
+
+    def ftp_rnfr(self, arg):
+        path, _ = self.real_path(arg)
+        if not os.path.exists(path):
+            self.reply('550 RNFR command failed.')
+            return
+        self.rename_from = path
+        self.reply('350 Ready for RNTO.')
+
+    def ftp_rnto(self, arg):
+        if not self.rename_from:
+            self.reply('503 RNFR required first.')
+            return
+        path, _ = self.real_path(arg)
+        os.rename(self.rename_from, path)
+        self.rename_from = None
+        self.reply('250 Rename successful.')
+
+    def ftp_size(self, arg):
+        path, _ = self.real_path(arg)
+        if not os.path.isfile(path):
+            self.reply('550 Could not get file size.')
+            return
+        self.reply(f'213 {os.path.getsize(path)}')
+
+    def ftp_mdtm(self, arg):
+        path, _ = self.real_path(arg)
+        if not os.path.exists(path):
+            self.reply('550 Could not get file modification time.')
+            return
+        self.reply('213 ' + time.strftime('%Y%m%d%H%M%S', time.gmtime(os.path.getmtime(path))))
+
+    def ftp_mode(self, arg):
+        mode = arg.strip().upper()
+        if mode == 'S' or (mode == 'Z' and 'MODE Z' in self.server.features):
+            self.mode = mode
+            self.reply(f'200 Mode set to {mode}.')
+        else:
+            self.reply('504 Unsupported transfer mode.')
+
+    def ftp_opts(self, arg):
+        parts = arg.upper().split()
+        if parts[:3] == ['MODE', 'Z', 'LEVEL'] and len(parts) == 4 and parts[3].isdigit():
+            self.level = int(parts[3])
+            self.reply(f'200 MODE Z LEVEL set to {self.level}.')
+        elif parts[:1] == ['HASH'] and len(parts) == 2 and parts[1] in self.server.hash_names():
+            self.hash_name = parts[1]
+            self.reply(f'200 {self.hash_name}')
+        else:
+            self.reply('501 Option not understood.')
+
+    def ftp_hash(self, arg):
+        if not self.supports('HASH'):
+            self.reply('502 HASH not implemented.')
+            return
+        self.hash_reply(arg, self.hash_name, '213 {name} 0-{size} {digest} {path}')
+
+    def ftp_xsha256(self, arg):
+        self.x_hash(arg, 'XSHA256', 'SHA-256')
+
+    def ftp_xsha1(self, arg):
+        self.x_hash(arg, 'XSHA1', 'SHA-1')
+
+    def ftp_xmd5(self, arg):
+        self.x_hash(arg, 'XMD5', 'MD5')
+
+    def ftp_xcrc(self, arg):
+        self.x_hash(arg, 'XCRC', 'CRC32')
+
+    def x_hash(self, arg, command, name):
+        if not self.supports(command):
+            self.reply(f'502 {command} not implemented.')
+            return
+        self.hash_reply(arg, name, '250 {digest}')
+
+    def listen_data(self):
+        if self.pasv_socket is not None:
+            self.pasv_socket.close()
+        self.pasv_socket = socket.socket(self.server.address_family, socket.SOCK_STREAM)
+        self.pasv_socket.bind((self.server.host, 0))
+        self.pasv_socket.listen(1)
+        return self.pasv_socket.getsockname()[1]
+
+    def ftp_pasv(self, arg):
+        if self.server.address_family != socket.AF_INET:
+            self.reply('425 PASV is IPv4 only, use EPSV.')
+            return
+        port = self.listen_data()
+        host = self.server.pasv_address or self.server.host
+        parts = host.split('.') + [str(port // 256), str(port % 256)]
+        self.reply(f"227 Entering Passive Mode ({','.join(parts)}).")
+
+    def ftp_epsv(self, arg):
+        if not self.server.extended:
+            self.reply('502 Command EPSV not implemented.')
+            return
+        self.reply(f'229 Entering Extended Passive Mode (|||{self.listen_data()}|)')
+
+    def ftp_eprt(self, arg):
+        if not self.server.extended:
+            self.reply('502 Command EPRT not implemented.')
+            return
+        # '|1|132.235.1.2|6275|' hoặc '|2|::1|6275|'
+        fields = arg.split(arg[:1]) if arg else []
+        if len(fields) != 5 or fields[1] not in ('1', '2') or not fields[3].isdigit():
+            self.reply('501 Invalid EPRT argument.')
+            return
+        self.port_addr = (fields[2], int(fields[3]))
+        self.reply('200 EPRT command successful.')
+
+    def ftp_port(self, arg):
+        nums = arg.split(',')
+        host = '.'.join(nums[:4])
+        if host == '0.0.0.0':
+            host = self.client_address[0]
+        self.port_addr = (host, int(nums[4]) * 256 + int(nums[5]))
+        self.reply('200 PORT command successful.')
+
+    def ftp_rest(self, arg):
+        self.rest = int(arg)
+        self.reply(f'350 Restart position accepted ({self.rest}).')
+
+    def ftp_feat(self, arg):
+        if not self.server.features:
+            self.reply('502 FEAT not implemented.')
+            return
+        lines = ['211-Features:'] + [' ' + f for f in self.server.features] + ['211 End']
+        self.reply('\r\n'.join(lines))
+
+    def ftp_mlsd(self, arg):
+        if not self.supports('MLST'):
+            self.reply('502 MLSD not implemented.')
+            return
+        path, _ = self.real_path(arg)
+        if not os.path.isdir(path):
+            self.reply('550 No such directory.')
+            return
+        lines = [self.mlsx_line(path, '.').replace('type=dir', 'type=cdir', 1)]
+        lines += [self.mlsx_line(os.path.join(path, n), n) for n in sorted(os.listdir(path))]
+        self.send_listing(lines)
+
+    def ftp_mlst(self, arg):
+        if not self.supports('MLST'):
+            self.reply('502 MLST not implemented.')
+            return
+        path, virtual = self.real_path(arg)
+        if not os.path.exists(path):
+            self.reply('550 No such file or directory.')
+            return
+        self.reply('\r\n'.join(['250-Listing ' + virtual, ' ' + self.mlsx_line(path, virtual), '250 End']))
+
+    def list_lines(self, arg):
+        """Các dòng LIST của thư mục (hoặc của một file), None nếu không tồn tại"""
+        path, _ = self.real_path(arg)
+        if os.path.isdir(path):
+            return [self.list_line(os.path.join(path, n), n) for n in sorted(os.listdir(path))]
+        if os.path.exists(path):
+            return [self.list_line(path, os.path.basename(path))]
+        return None
+
+    def ftp_list(self, arg):
+        lines = self.list_lines(arg)
+        if lines is None:
+            self.reply('550 No such file or directory.')
+            return
+        self.send_listing(lines)
+
+    def ftp_stat(self, arg):
+        if not arg:
+            self.reply('211-Local test FTP server status:\r\n Logged in\r\n211 End of status')
+            return
+        if not self.server.stat_listing:
+            self.reply('502 STAT with a path not implemented.')
+            return
+        lines = self.list_lines(arg)
+        if lines is None:
+            self.reply('550 No such file or directory.')
+            return
+        self.reply('\r\n'.join([f'213-Status of {arg}:'] + lines + ['213 End of status']))
+
+    def ftp_nlst(self, arg):
+        path, _ = self.real_path(arg)
+        if not os.path.isdir(path):
+            self.reply('550 No such directory.')
+            return
+        self.send_listing(sorted(os.listdir(path)))
+
+    def ftp_retr(self, arg):
+        path, virtual = self.real_path(arg)
+        if not os.path.isfile(path):
+            self.rest = 0
+            self.reply('550 Failed to open file.')
+            return
+        conn = self.open_data()
+        if conn is None:
+            self.reply('425 Use PORT or PASV first.')
+            return
+        offset, self.rest = self.rest, 0
+        # cut_after chỉ áp dụng cho lần RETR kế tiếp (giả lập đứt kết nối dữ liệu)
+        limit, self.server.cut_after = self.server.cut_after, None
+        sent = 0
+        aborted = abor = False
+        self.reply('150 Opening BINARY mode data connection.')
+        compressor = self.compressor()
+        with conn, open(path, 'rb') as f:
+            if limit is None and not self.server.rate and not compressor:
+                # Không giới hạn: sendfile để server không là nút thắt trong benchmark
+                try:
+                    sent = conn.sendfile(f, offset)
+                except OSError:
+                    aborted = True  # Client đóng kết nối dữ liệu trước khi hết file
+            else:
+                f.seek(offset)
+                while limit is None or sent < limit:
+                    if self.abor_received():
+                        aborted = abor = True
+                        break
+                    block = f.read(self.server.block_size)
+                    if not block:
+                        break
+                    if limit is not None:
+                        block = block[:limit - sent]
+                    wire = compressor.compress(block) if compressor else block
+                    try:
+                        conn.sendall(wire)
+                    except OSError:
+                        aborted = True
+                        break
+                    sent += len(block)
+                    self.throttle(len(wire))
+                if compressor and not aborted and limit is None:
+                    # Kết thúc luồng zlib (khi bị cắt thì để luồng dở dang)
+                    try:
+                        conn.sendall(compressor.flush())
+                    except OSError:
+                        aborted = True
+        self.server.retr_log.append((virtual, offset, sent))
+        if aborted or (limit is not None and sent >= limit):
+            self.reply('426 Connection closed; transfer aborted.')
+            if abor:
+                self.reply('226 ABOR successful.')
+            return
+        self.reply('226 Transfer complete.')
+
+    def _store(self, arg, mode):
+        path, virtual = self.real_path(arg)
+        conn = self.open_data()
+        if conn is None:
+            self.reply('425 Use PORT or PASV first.')
+            return
+        offset, self.rest = self.rest, 0
+        if offset and mode == 'wb':
+            mode = 'r+b' if os.path.exists(path) else 'wb'
+        limit, self.server.cut_after = self.server.cut_after, None
+        received = 0
+        abor = False
+        self.reply('150 Ok to send data.')
+        decompressor = zlib.decompressobj() if self.mode == 'Z' else None
+        with conn, open(path, mode) as f:
+            if offset:
+                f.seek(offset)
+                f.truncate()
+            start = f.tell()
+            while limit is None or received < limit:
+                if self.abor_received():
+                    abor = True
+                    break
+                block = conn.recv(65536)
+                if not block:
+                    if decompressor:
+                        f.write(decompressor.flush())
+                    break
+                self.throttle(len(block))
+                if decompressor:
+                    block = decompressor.decompress(block)
+                if limit is not None:
+                    block = block[:limit - received]
+                f.write(block)
+                received += len(block)
+        self.server.stor_log.append((virtual, start, received))
+        if abor or (limit is not None and received >= limit):
+            self.reply('426 Connection closed; transfer aborted.')
+            if abor:
+                self.reply('226 ABOR successful.')
+            return
+        self.reply('226 Transfer complete.')
+
+    def ftp_stor(self, arg):
+        self._store(arg, 'wb')
+
+    def ftp_appe(self, arg):
+        self._store(arg, 'ab')
+
+
+class LocalFTPServer(socketserver.ThreadingTCPServer):
+    """FTP server chạy trên một thread nền, phục vụ root_dir
+
+    latency: độ trễ (giây) thêm vào trước mỗi phản hồi lệnh
+    rate: giới hạn băng thông kênh dữ liệu (byte/giây trên dây, 0 = không giới hạn)
+    features: các dòng FEAT quảng bá (rỗng = không hỗ trợ FEAT)
+    host: '::1' (hoặc địa chỉ IPv6 khác) để chạy server trên IPv6 (khi đó chỉ có EPSV/EPRT)
+    port: cổng lắng nghe (0 = cổng trống bất kỳ); đặt cổng cũ để giả lập server khởi động lại
+    extended: False = không hỗ trợ EPSV/EPRT (trả 502), để kiểm tra việc quay về PASV/PORT
+    stat_listing: False = STAT <đường_dẫn> trả 502 (server không liệt kê thư mục qua STAT)
+    pasv_address: địa chỉ IPv4 ghi trong phản hồi PASV thay cho địa chỉ thật (giả lập server sau NAT)
+    sessions: số kết nối điều khiển đã nhận
+    commands: Counter số lần server nhận mỗi lệnh (theo tên lệnh, chữ hoa)
+    bad_digests: số phản hồi HASH/X* kế tiếp trả về digest sai (giả lập file hỏng)
+    max_sessions: số phiên đồng thời tối đa, phiên vượt quá nhận '421 Too many connections' (0 = không giới hạn)
+    transient: Counter {LỆNH: n}, n lần kế tiếp của lệnh đó nhận '450' (lỗi tạm thời)
+    refuse: số kết nối điều khiển kế tiếp bị từ chối bằng 421 (giả lập server đang khởi động lại)
+    cut_after: nếu đặt, lần RETR/STOR/APPE kế tiếp chỉ truyền chừng ấy byte rồi đóng kết nối dữ liệu (426)
+    retr_log: danh sách (đường_dẫn, offset, số_byte_đã_gửi) của mỗi lần RETR
+    stor_log: danh sách (đường_dẫn, vị_trí_bắt_đầu_ghi, số_byte_đã_nhận) của mỗi lần STOR/APPE
+    """
+
+    DEFAULT_FEATURES = ('MLST type*;size*;modify*;unique*;', 'SIZE', 'MDTM', 'REST STREAM', 'UTF8', 'MODE Z',
+                        'HASH SHA-256*;SHA-1;MD5;CRC32')
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 512  # Benchmark mở hàng trăm kết nối cùng lúc
+
+    def __init__(self, root, host='127.0.0.1', latency=0.0, rate=0, block_size=65536, features=DEFAULT_FEATURES,
+                 port=0):
+        self.address_family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        super().__init__((host, port), FTPHandler)
+        self.features = list(features)
+        self.root = root
+        self.host = host
+        self.port = self.server_address[1]
+        self.latency = latency
+        self.rate = rate
+        self.block_size = block_size
+        self.cut_after = None
+        self.bad_digests = 0
+        self.extended = True
+        self.stat_listing = True
+        self.pasv_address = None
+        self.sessions = 0
+        self.refuse = 0
+        self.active = 0
+        self.max_sessions = 0
+        self.transient = collections.Counter()
+        self.live = weakref.WeakSet()  # Socket điều khiển và dữ liệu đang mở, cho drop_sessions()
+        self.commands = collections.Counter()
+        self.retr_log = []
+        self.stor_log = []
+        self._thread = None
+
+    def hash_names(self):
+        """Các thuật toán trong dòng FEAT HASH (bỏ dấu * đánh dấu thuật toán mặc định)"""
+        for feature in self.features:
+            name, _, params = feature.partition(' ')
+            if name == 'HASH':
+                return [p.rstrip('*') for p in params.split(';') if p]
+        return []
+
+    def drop_sessions(self):
+        """Cắt mọi kết nối điều khiển và dữ liệu đang mở (giả lập server khởi động lại)"""
+        for sock in list(self.live):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def kill_download(server, remote_path, local_path, segments=1, timeout=10):
+    """Tải remote_path trong một tiến trình con rồi SIGKILL nó giữa chừng (giả lập client bị tắt đột ngột)
+
+    Tiến trình bị kill ngay khi server đã nhận RETR của mọi đoạn và đã gửi một
+    phần dữ liệu; server nên đặt rate để lần tải kéo dài đủ lâu.
+    """
+    import subprocess
+    import sys
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import sys\n"
+        f"sys.path.insert(0, {repo!r})\n"
+        "from client.core.raw_socket_ftp import FTP\n"
+        "from client.core.ftp_helpers import FTPHelpers\n"
+        "from client.core.config import Config\n"
+        "Config.SEGMENTED_DOWNLOAD_THRESHOLD = 1024\n"
+        "ftp = FTP()\n"
+        f"ftp.connect({server.host!r}, {server.port}, timeout=10)\n"
+        "ftp.login('user', 'secret')\n"
+        f"FTPHelpers(ftp)._download_file({remote_path!r}, {local_path!r}, 'binary', segments={segments})\n"
+    )
+    retr = server.commands['RETR']
+    proc = subprocess.Popen([sys.executable, '-c', script], cwd=os.path.dirname(local_path),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while server.commands['RETR'] < retr + segments:
+            if time.monotonic() > deadline or proc.poll() is not None:
+                raise RuntimeError('download did not start')
+            time.sleep(0.01)
+        time.sleep(0.3)  # Để một phần dữ liệu kịp ghi xuống file
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def make_tree(root, files):
+    """Tạo các file theo dict {đường_dẫn_tương_đối: bytes}"""
+    for rel, content in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+
+
+if __name__ == '__main__':
+    import sys
+
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    rate = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    with LocalFTPServer(sys.argv[1], latency=latency, rate=rate) as server:
+        print(server.port, flush=True)
+        try:
+            sys.stdin.read()  # Chạy tới khi stdin bị đóng
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,120 @@
+"""
+Test hủy lần truyền bằng ABOR: dừng nhanh, nhận 426/226 và phiên dùng tiếp được
+"""
+
+import io
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTPAbortedError
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_pool import SessionPool
+from client.core.config import Config
+from local_ftp_server import make_tree
+
+BIG = os.urandom(4 * 1024 * 1024)
+
+
+def _abort_after(ftp, seconds):
+    """Gọi ftp.abort() từ thread khác; trả về [thời điểm gọi] khi đã gọi"""
+    called = []
+
+    def run():
+        time.sleep(seconds)
+        called.append(time.monotonic())
+        ftp.abort()
+
+    threading.Thread(target=run, daemon=True).start()
+    return called
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('passive', [True, False])
+def test_abort_stops_download_quickly(local_ftp_server, passive, ftp_session):
+    make_tree(local_ftp_server.root, {'big.bin': BIG})
+    local_ftp_server.rate = 512 * 1024  # ~8 giây nếu không hủy
+    ftp = ftp_session()
+    ftp.set_pasv(passive)
+
+    called = _abort_after(ftp, 0.3)
+    with pytest.raises(FTPAbortedError):
+        ftp.retrfile('RETR big.bin', io.BytesIO())
+    assert time.monotonic() - called[0] < 1.0
+    assert local_ftp_server.commands['ABOR'] == 1
+    assert local_ftp_server.retr_log[-1][2] < len(BIG)
+
+    # Phiên không lệch phản hồi sau 426/226
+    assert ftp.pwd() == '/' and ftp.size('big.bin') == len(BIG)
+    assert ftp.data_socket is None and not ftp.aborting
+    assert not ftp.abort()  # Không có lần truyền nào để hủy
+    ftp.quit()
+
+
+@pytest.mark.timeout(30)
+def test_abort_stops_upload(local_ftp_server, ftp_session):
+    local_ftp_server.rate = 512 * 1024
+    ftp = ftp_session()
+
+    called = _abort_after(ftp, 0.3)
+    with pytest.raises(FTPAbortedError):
+        ftp.storfile('STOR up.bin', io.BytesIO(BIG))
+    assert time.monotonic() - called[0] < 1.0
+    assert local_ftp_server.stor_log[-1][2] < len(BIG)
+    assert ftp.nlst() == ['up.bin']
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_cancelled_download_is_not_retried(local_ftp_server, temp_dir, ftp_session):
+    make_tree(local_ftp_server.root, {'big.bin': BIG, 'small.bin': b'x' * 1000})
+    local_ftp_server.rate = 512 * 1024
+    ftp = ftp_session()
+    helpers = FTPHelpers(ftp)
+
+    _abort_after(ftp, 0.3)
+    assert not helpers._download_file('big.bin', os.path.join(temp_dir, 'big.bin'), 'binary', resume=False)
+    assert local_ftp_server.commands['RETR'] == 1 and ftp.reconnects == 0
+    assert not os.path.exists(os.path.join(temp_dir, 'big.bin'))
+
+    # File kế tiếp trong lô tải bình thường trên cùng phiên
+    local_ftp_server.rate = 0
+    path = os.path.join(temp_dir, 'small.bin')
+    assert helpers._download_file('small.bin', path, 'binary')
+    assert os.path.getsize(path) == 1000
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_abort_cancels_segmented_download(local_ftp_server, temp_dir, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'SEGMENTED_DOWNLOAD_THRESHOLD', 1024)
+    make_tree(local_ftp_server.root, {'big.bin': BIG})
+    local_ftp_server.rate = 256 * 1024  # Mỗi đoạn 1 MiB: ~4 giây nếu không hủy
+    ftp = ftp_session()
+    pool = SessionPool.from_session(ftp, min_size=0, max_size=4)
+    helpers = FTPHelpers(ftp, pool=pool)
+    path = os.path.join(temp_dir, 'big.bin')
+
+    called = _abort_after(ftp, 0.5)
+    assert not helpers._download_file('big.bin', path, 'binary', resume=False, segments=4)
+    assert time.monotonic() - called[0] < 1.5
+    assert local_ftp_server.commands['ABOR'] == 4 and local_ftp_server.commands['RETR'] == 4
+    assert ftp.segmented is None and not ftp.abort()
+
+    # Các phiên phụ trả về pool không còn giữ kênh dữ liệu cũ và dùng tiếp được
+    local_ftp_server.rate = 0
+    assert pool.idle == 4
+    assert helpers._download_file('big.bin', path, 'binary', resume=False, segments=4)
+    with open(path, 'rb') as f:
+        assert f.read() == BIG
+    assert all(session.data_socket is None and not session.aborting for session, _ in pool._idle)
+    pool.close()
+    ftp.quit()
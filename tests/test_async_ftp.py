@@ -0,0 +1,138 @@
+"""
+Test engine FTP asyncio (AsyncFTP, SyncFTP) với FTP server cục bộ
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core import async_ftp
+from client.core.async_ftp import AsyncFTP, SyncFTP
+from client.core.raw_socket_ftp import FTPPermError
+from local_ftp_server import make_tree
+
+
+async def _login(server, timeout=10):
+    ftp = AsyncFTP(timeout=timeout)
+    await ftp.connect(server.host, server.port)
+    await ftp.login('user', 'secret')
+    return ftp
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_async_commands(local_ftp_server):
+    make_tree(local_ftp_server.root, {'docs/a.txt': b'hello', 'b.bin': b'\x00' * 5000})
+
+    async def scenario():
+        ftp = await _login(local_ftp_server)
+        assert await ftp.pwd() == '/'
+        assert await ftp.retrieve('b.bin') == b'\x00' * 5000
+        await ftp.store('docs/new.txt', b'uploaded')
+        await ftp.rename('docs/new.txt', 'docs/renamed.txt')
+        await ftp.cwd('docs')
+        names = sorted(e.name for e in await ftp.entries())
+        assert names == ['a.txt', 'renamed.txt']
+        assert await ftp.size('renamed.txt') == 8
+        await ftp.delete('a.txt')
+        with pytest.raises(FTPPermError):
+            await ftp.cwd('missing')
+        assert await ftp.nlst() == ['renamed.txt']
+        await ftp.quit()
+
+    asyncio.run(scenario())
+    assert not os.path.exists(os.path.join(local_ftp_server.root, 'docs', 'a.txt'))
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_many_sessions_concurrently(local_ftp_server):
+    files = {f'f{i:03d}.txt': f'content {i}'.encode() for i in range(50)}
+    make_tree(local_ftp_server.root, files)
+
+    async def fetch(name):
+        ftp = await _login(local_ftp_server)
+        try:
+            return name, await ftp.retrieve(name)
+        finally:
+            await ftp.quit()
+
+    async def scenario():
+        return dict(await asyncio.gather(*(fetch(name) for name in files)))
+
+    assert asyncio.run(scenario()) == files
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_listing_is_streamed(local_ftp_server):
+    make_tree(local_ftp_server.root, {f'f{i:04d}.txt': b'' for i in range(2000)})
+
+    async def scenario():
+        ftp = await _login(local_ftp_server)
+        seen = []
+        assert await ftp.retrlines('NLST', seen.append) is None  # Từng dòng, không giữ cả danh sách
+        assert seen == await ftp.nlst() and len(seen) == 2000
+        assert len(await ftp.entries()) == 2000
+
+        stream = ftp.iter_lines('LIST')
+        assert (await stream.__anext__()).endswith('f0000.txt')
+        await stream.aclose()
+        assert ftp.writer is None  # Dừng giữa chừng: phiên bị đóng thay vì lệch phản hồi
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('use_wait_for', [False, True])
+def test_cancel_and_timeout_close_session(local_ftp_server, monkeypatch, use_wait_for):
+    if use_wait_for:
+        monkeypatch.setattr(async_ftp, '_timeout', None)  # Đường asyncio.wait_for như Python < 3.11
+    make_tree(local_ftp_server.root, {'slow.bin': b'x' * (1024 * 1024)})
+    local_ftp_server.rate = 256 * 1024
+    local_ftp_server.block_size = 16384
+
+    async def scenario():
+        ftp = await _login(local_ftp_server)
+        task = asyncio.create_task(ftp.retrieve('slow.bin'))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert ftp.writer is None  # Phiên bị đóng vì phản hồi RETR không còn ghép được
+
+        ftp = await _login(local_ftp_server)
+        ftp.timeout = 0.2
+        local_ftp_server.latency = 0.5  # Server trả lời chậm hơn timeout của phiên
+        with pytest.raises(asyncio.TimeoutError):
+            await ftp.pwd()
+        assert ftp.writer is None
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_sync_facade(local_ftp_server):
+    make_tree(local_ftp_server.root, {'sub/c.txt': b'facade'})
+    ftp = SyncFTP(timeout=10)
+    assert ftp.aftp.lock is None  # Tạo trong connect(), trên event loop nền
+    ftp.connect(local_ftp_server.host, local_ftp_server.port)
+    ftp.login('user', 'secret')
+    ftp.cwd('sub')
+    chunks = []
+    ftp.retrbinary('RETR c.txt', chunks.append)
+    assert b''.join(chunks) == b'facade'
+    assert [e.name for e in ftp.entries()] == ['c.txt']
+
+    # Nhiều thread dùng chung phiên: các lệnh tranh nhau lock trên event loop nền
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(lambda _: ftp.pwd(), range(16))) == ['/sub'] * 16
+    ftp.quit()
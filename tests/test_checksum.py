@@ -0,0 +1,141 @@
+"""
+Test kiểm tra checksum với server (HASH / XSHA256 / XMD5 / XCRC) khi truyền file
+"""
+
+import hashlib
+import os
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_checksum import BackgroundHasher, select_algorithm, server_digest
+from client.core.config import Config
+from local_ftp_server import LocalFTPServer, make_tree
+
+PAYLOAD = os.urandom(2 * 1024 * 1024 + 13)
+BASE_FEATURES = [f for f in LocalFTPServer.DEFAULT_FEATURES if not f.startswith('HASH')]
+
+
+@pytest.fixture
+def ftp(local_ftp_server, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'VERIFY_CHECKSUMS', True)
+    make_tree(local_ftp_server.root, {'data.bin': PAYLOAD})
+    ftp = ftp_session()
+    yield ftp
+    ftp.quit()
+
+
+
+def test_algorithm_selection():
+    assert select_algorithm({}) is None
+    algorithm = select_algorithm({'HASH': 'SHA-1*;MD5;SHA-256'})
+    assert (algorithm.name, algorithm.command, algorithm.select) == ('SHA-256', 'HASH', True)
+    algorithm = select_algorithm({'HASH': 'CRC32*', 'XMD5': ''})
+    assert (algorithm.name, algorithm.command) == ('MD5', 'XMD5')
+    assert select_algorithm({'XCRC': ''}).name == 'CRC32'
+
+
+def test_background_hasher_matches_hashlib(temp_dir):
+    path = os.path.join(temp_dir, 'prefix.bin')
+    with open(path, 'wb') as f:
+        f.write(PAYLOAD)
+    hasher = BackgroundHasher(select_algorithm({'XSHA256': ''}), max_pending=2)
+    hasher.update_file(path, 1000)
+    for start in range(1000, len(PAYLOAD), 65536):
+        hasher.update(PAYLOAD[start:start + 65536])
+    assert hasher.hexdigest() == hashlib.sha256(PAYLOAD).hexdigest()
+
+
+@pytest.mark.parametrize('feature, expected', [
+    ('XSHA256', hashlib.sha256(PAYLOAD).hexdigest()),
+    ('XSHA1', hashlib.sha1(PAYLOAD).hexdigest()),
+    ('XMD5', hashlib.md5(PAYLOAD).hexdigest()),
+    ('XCRC', f'{zlib.crc32(PAYLOAD):08x}'),
+    ('HASH MD5;CRC32*', hashlib.md5(PAYLOAD).hexdigest()),
+])
+@pytest.mark.timeout(30)
+def test_server_digest_commands(temp_dir, feature, expected, ftp_session):
+    make_tree(temp_dir, {'data.bin': PAYLOAD})
+    with LocalFTPServer(temp_dir, features=BASE_FEATURES + [feature]) as server:
+        ftp = ftp_session(server)
+        assert server_digest(ftp, 'data.bin', select_algorithm(ftp.feat())) == expected
+        ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_verified_download_and_upload(ftp, local_ftp_server, temp_dir, records):
+    path = os.path.join(temp_dir, 'data.bin')
+    helpers = FTPHelpers(ftp)
+    assert helpers._download_file('data.bin', path, 'binary')
+    assert helpers._upload_file(path, 'copy.bin', 'binary')
+
+    download, upload = records
+    assert download.checksum == upload.checksum == 'SHA-256'
+    assert 'SHA-256 verified' in download.summary()
+    with open(os.path.join(local_ftp_server.root, 'copy.bin'), 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_resumed_download_hashes_existing_prefix(ftp, local_ftp_server, temp_dir, records, monkeypatch):
+    monkeypatch.setattr(Config, 'TRANSFER_RETRIES', 1)
+    local_ftp_server.cut_after = 1024 * 1024
+    assert FTPHelpers(ftp)._download_file('data.bin', os.path.join(temp_dir, 'data.bin'), 'binary')
+
+    [record] = records
+    assert record.retries == 1 and record.checksum == 'SHA-256'
+    assert local_ftp_server.retr_log[-1][1] == 1024 * 1024
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_mismatch_triggers_full_retry(ftp, local_ftp_server, temp_dir, records):
+    path = os.path.join(temp_dir, 'data.bin')
+    helpers = FTPHelpers(ftp)
+    local_ftp_server.bad_digests = 1
+    assert helpers._download_file('data.bin', path, 'binary')
+    # Lần thử lại tải từ đầu, không tải tiếp từ file đã bị coi là sai
+    assert [entry[1] for entry in local_ftp_server.retr_log] == [0, 0]
+
+    local_ftp_server.bad_digests = 1
+    assert helpers._upload_file(path, 'copy.bin', 'binary', resume=True)
+    assert [entry[1] for entry in local_ftp_server.stor_log] == [0, 0]
+
+    download, upload = records
+    assert download.retries == upload.retries == 1
+    assert download.ok and upload.ok and download.checksum == 'SHA-256'
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_persistent_mismatch_fails(ftp, local_ftp_server, temp_dir, records, monkeypatch):
+    monkeypatch.setattr(Config, 'TRANSFER_RETRIES', 1)
+    local_ftp_server.bad_digests = 2
+    path = os.path.join(temp_dir, 'data.bin')
+    assert not FTPHelpers(ftp)._download_file('data.bin', path, 'binary')
+
+    [record] = records
+    assert not record.ok and 'mismatch' in record.error and record.checksum is None
+    assert not os.path.exists(path)
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_server_without_checksum_is_not_verified(temp_dir, records, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'VERIFY_CHECKSUMS', True)
+    server_dir = os.path.join(temp_dir, 'server')
+    make_tree(server_dir, {'data.bin': PAYLOAD})
+    with LocalFTPServer(server_dir, features=BASE_FEATURES) as server:
+        ftp = ftp_session(server)
+        assert FTPHelpers(ftp)._download_file('data.bin', os.path.join(temp_dir, 'data.bin'), 'binary')
+        ftp.quit()
+
+    [record] = records
+    assert record.ok and record.checksum is None
@@ -0,0 +1,91 @@
+"""
+Test đo thời gian thiết lập phiên (DNS, TCP connect, banner, đăng nhập, PWD đầu tiên)
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP, open_control_socket
+from client.core.ftp_command import FTPCommands
+from client.core.ftp_stats import ConnectTiming, LatencyHistogram, SESSION, bus, connect_histograms
+from local_ftp_server import LocalFTPServer
+
+
+@pytest.fixture
+def sessions():
+    received = []
+    bus.clear(SESSION)
+    bus.subscribe(SESSION, received.append)
+    yield received
+    bus.unsubscribe(SESSION, received.append)
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_phases_are_recorded(temp_dir, sessions):
+    before = connect_histograms['login'].count
+    with LocalFTPServer(temp_dir, latency=0.05) as server:
+        ftp = FTP()
+        ftp.connect(server.host, server.port, timeout=10)
+        ftp.login('user', 'secret')
+        [timing] = sessions
+        assert timing is ftp.connect_timing and timing.setup is None
+        ftp.voidcmd('TYPE I')
+        ftp.pwd()
+        ftp.pwd()  # Chỉ PWD đầu tiên chốt giai đoạn setup
+        ftp.quit()
+
+    assert not timing.handoff
+    assert all(getattr(timing, phase) is not None for phase in ('dns', 'connect', 'banner'))
+    assert timing.login >= 0.1      # USER + PASS, mỗi phản hồi trễ 0.05 giây
+    assert 0.1 <= timing.setup < 0.2  # TYPE + PWD
+    assert connect_histograms['login'].count == before + 1
+    assert 'tcp' in timing.summary() and 'setup' in timing.phases()
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_probe_socket_is_handed_to_session(temp_dir, sessions):
+    with LocalFTPServer(temp_dir) as server:
+        timing = ConnectTiming(server.host, server.port)
+        sock = open_control_socket(server.host, server.port, 10, timing)
+        ftp = FTP()
+        ftp.connect(server.host, server.port, timeout=10, sock=sock, timing=timing)
+        ftp.login('user', 'secret')
+        assert ftp.pwd() == '/'
+        ftp.quit()
+        # Kết nối kiểm tra chính là kết nối của phiên: server chỉ thấy một kết nối
+        assert server.sessions == 1
+
+    assert ftp.connect_timing is timing and timing.handoff
+    assert timing.connect is not None and timing.login is not None
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None and histogram.summary() == 'no samples'
+    for seconds in [0.0004] * 90 + [0.03] * 9 + [7.0]:
+        histogram.add(seconds)
+    assert histogram.percentile(50) == 0.001
+    assert histogram.percentile(95) == 0.05
+    assert histogram.percentile(100) == 7.0
+    assert histogram.count == 100 and 'p95 <= 50 ms' in histogram.summary()
+
+
+@pytest.mark.timeout(30)
+def test_cli_status_shows_timing(temp_dir, capsys):
+    with LocalFTPServer(temp_dir) as server:
+        ftp = FTP()
+        ftp.connect(server.host, server.port, timeout=10)
+        ftp.login('user', 'secret')
+        client = FTPCommands(ftp)
+        client.connected = True
+        client.do_status('')
+        ftp.quit()
+
+    out = capsys.readouterr().out
+    assert 'Session setup: dns' in out and 'Session setup latency (all sessions):' in out
@@ -0,0 +1,120 @@
+"""
+Test mở kênh dữ liệu: EPSV/EPRT, quay về PASV/PORT, ghi nhớ lệnh đã dùng được, IPv6
+"""
+
+import os
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.async_ftp import SyncFTP
+from client.core.ftp_features import feature_cache
+from local_ftp_server import LocalFTPServer, make_tree
+
+PAYLOAD = os.urandom(300 * 1024)
+
+
+def _download(ftp, path):
+    with open(path, 'wb') as f:
+        ftp.retrfile('RETR data.bin', f)
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+@pytest.fixture
+def server(local_ftp_server):
+    make_tree(local_ftp_server.root, {'data.bin': PAYLOAD})
+    return local_ftp_server
+
+
+@pytest.mark.timeout(30)
+def test_epsv_is_used_and_remembered(server, temp_dir, ftp_session):
+    ftp = ftp_session(server)
+    _download(ftp, os.path.join(temp_dir, 'a.bin'))
+    _download(ftp, os.path.join(temp_dir, 'b.bin'))
+    ftp.quit()
+
+    assert server.commands['EPSV'] == 2 and server.commands['PASV'] == 0
+    assert feature_cache.get(server.host, server.port).data_methods == {'passive': 'EPSV'}
+
+
+@pytest.mark.timeout(30)
+def test_fallback_to_pasv_is_remembered(server, temp_dir, ftp_session):
+    server.extended = False
+    ftp = ftp_session(server)
+    _download(ftp, os.path.join(temp_dir, 'a.bin'))
+    ftp.quit()
+    assert server.commands['EPSV'] == 1 and server.commands['PASV'] == 1
+
+    # Phiên sau dùng thẳng PASV, không gửi EPSV nữa
+    ftp = ftp_session(server)
+    _download(ftp, os.path.join(temp_dir, 'b.bin'))
+    ftp.quit()
+    assert server.commands['EPSV'] == 1 and server.commands['PASV'] == 2
+
+
+@pytest.mark.timeout(30)
+def test_pasv_address_is_ignored(server, temp_dir, ftp_session):
+    # Server sau NAT quảng bá địa chỉ không kết nối được
+    server.extended = False
+    server.pasv_address = '192.0.2.1'
+    ftp = ftp_session(server)
+    _download(ftp, os.path.join(temp_dir, 'a.bin'))
+    ftp.quit()
+
+
+@pytest.mark.timeout(30)
+def test_active_mode_eprt_and_port(server, temp_dir, ftp_session):
+    ftp = ftp_session(server, passive=False)
+    _download(ftp, os.path.join(temp_dir, 'a.bin'))
+    ftp.quit()
+    assert server.commands['EPRT'] == 1 and server.commands['PORT'] == 0
+
+    server.extended = False
+    feature_cache.clear()
+    ftp = ftp_session(server, passive=False)
+    _download(ftp, os.path.join(temp_dir, 'b.bin'))
+    _download(ftp, os.path.join(temp_dir, 'c.bin'))
+    ftp.quit()
+    assert server.commands['EPRT'] == 2 and server.commands['PORT'] == 2
+
+
+@pytest.mark.timeout(30)
+def test_async_engine_falls_back_to_pasv(server):
+    server.extended = False
+    server.pasv_address = '192.0.2.1'
+    for _ in range(2):
+        ftp = SyncFTP(timeout=10)
+        ftp.connect(server.host, server.port)
+        ftp.login('user', 'secret')
+        chunks = []
+        ftp.retrbinary('RETR data.bin', chunks.append)
+        assert b''.join(chunks) == PAYLOAD
+        ftp.quit()
+    assert server.commands['EPSV'] == 1 and server.commands['PASV'] == 2
+
+
+def _ipv6_available():
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as s:
+            s.bind(('::1', 0))
+        return True
+    except OSError:
+        return False
+
+
+@pytest.mark.skipif(not _ipv6_available(), reason="IPv6 loopback not available")
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('passive', [True, False])
+def test_ipv6(temp_dir, passive, ftp_session):
+    server_dir = os.path.join(temp_dir, 'server')
+    make_tree(server_dir, {'data.bin': PAYLOAD})
+    with LocalFTPServer(server_dir, host='::1') as server:
+        ftp = ftp_session(server, passive)
+        _download(ftp, os.path.join(temp_dir, 'a.bin'))
+        ftp.quit()
+        assert server.commands['PASV'] == server.commands['PORT'] == 0
@@ -0,0 +1,88 @@
+"""
+Test đường tải binary ít cấp phát: recv_into vào buffer dùng lại, os.splice và cấp phát trước
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_segmented import is_unfinished
+from client.core.config import Config
+from local_ftp_server import make_tree, kill_download
+
+PAYLOAD = os.urandom(5 * 1024 * 1024 + 321)
+CUT = 2 * 1024 * 1024 + 5
+
+
+@pytest.fixture
+def ftp(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, {'data.bin': PAYLOAD})
+    ftp = ftp_session()
+    yield ftp
+    ftp.quit()
+
+
+SPLICE_MODES = [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(not hasattr(os, 'splice'), reason='os.splice requires Linux')),
+]
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('use_splice', SPLICE_MODES)
+def test_retrfile_writes_into_open_file(ftp, temp_dir, use_splice):
+    path = os.path.join(temp_dir, 'data.bin')
+    counts = []
+    with open(path, 'wb') as f:
+        f.write(b'header')
+        received = ftp.retrfile('RETR data.bin', f, counts.append, use_splice=use_splice)
+        # Vị trí của file_obj vẫn đúng sau khi splice ghi qua fd
+        assert f.tell() == len(b'header') + len(PAYLOAD)
+
+    assert received == sum(counts) == len(PAYLOAD)
+    with open(path, 'rb') as f:
+        assert f.read() == b'header' + PAYLOAD
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('use_splice', SPLICE_MODES)
+def test_failed_download_drops_preallocated_tail(ftp, local_ftp_server, temp_dir, monkeypatch, use_splice):
+    monkeypatch.setattr(Config, 'TRANSFER_RETRIES', 0)
+    monkeypatch.setattr(Config, 'DOWNLOAD_USE_SPLICE', use_splice)
+    local_ftp_server.cut_after = CUT
+    path = os.path.join(temp_dir, 'data.bin')
+
+    assert not FTPHelpers(ftp)._download_file('data.bin', path, 'binary', segments=1)
+    # File được cấp phát trước đủ kích thước nhưng bị cắt về đúng số byte đã nhận
+    assert os.path.getsize(path) == CUT
+
+    assert FTPHelpers(ftp)._download_file('data.bin', path, 'binary', segments=1)
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert local_ftp_server.retr_log[-1] == ('/data.bin', CUT, len(PAYLOAD) - CUT)
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(60)
+def test_killed_download_is_not_trusted(ftp, local_ftp_server, temp_dir):
+    path = os.path.join(temp_dir, 'data.bin')
+    local_ftp_server.rate = 2 * 1024 * 1024
+    kill_download(local_ftp_server, 'data.bin', path)
+
+    # File dở đã được cấp phát trước tới đủ kích thước nhưng còn file đánh dấu:
+    # lần get sau không coi là đã xong mà tải lại từ đầu
+    assert os.path.getsize(path) == len(PAYLOAD) and is_unfinished(path)
+    local_ftp_server.rate = 0
+    assert FTPHelpers(ftp)._download_file('data.bin', path, 'binary')
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    # Tiến trình bị kill được server ghi log muộn: không nhất thiết là mục cuối
+    assert ('/data.bin', 0, len(PAYLOAD)) in local_ftp_server.retr_log and not is_unfinished(path)
+
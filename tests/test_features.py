@@ -0,0 +1,108 @@
+"""
+Test khả năng server theo FEAT và cache FEAT theo host:port
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_command import FTPCommands
+from client.core.ftp_features import Capabilities, FeatureCache
+from client.core.config import Config
+from local_ftp_server import LocalFTPServer, make_tree
+
+PAYLOAD = os.urandom(256 * 1024)
+
+
+def test_capabilities_parse():
+    caps = Capabilities.parse([' MLST type*;size*;modify;', ' REST STREAM', ' SIZE', ' MODE Z', ' HASH SHA-256*;MD5',
+                               ' UTF8', ' EPSV'])
+    assert caps.mlsd and caps.size and caps.rest_stream and caps.mode_z and caps.utf8 and caps.epsv
+    assert not caps.mdtm
+    assert caps.mlst_facts == ['type', 'size', 'modify']
+    assert caps.hash_algorithms == ['SHA-256', 'MD5']
+    assert caps['MODE'] == 'Z' and caps.supports('size')
+    assert not Capabilities({'REST': 'BLOCK'}).rest_stream
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_later_sessions_skip_feat(local_ftp_server, ftp_session):
+    first = ftp_session()
+    assert first.feat().mode_z
+    second = ftp_session()
+    assert second.feat() is first.feat()
+    assert local_ftp_server.commands['FEAT'] == 1
+
+    # refresh=True luôn hỏi lại server và cập nhật cache
+    local_ftp_server.features.remove('MODE Z')
+    assert not second.feat(refresh=True).mode_z
+    assert not ftp_session().feat().mode_z
+    assert local_ftp_server.commands['FEAT'] == 2
+    for ftp in (first, second):
+        ftp.quit()
+
+
+def test_cache_ttl_and_disk(temp_dir, monkeypatch):
+    path = os.path.join(temp_dir, 'feat.json')
+    monkeypatch.setattr(Config, 'FEAT_CACHE_FILE', path)
+    cache = FeatureCache(ttl=60)
+    cache.put('ftp.example', 21, Capabilities({'SIZE': ''}))
+    cache.put('old.example', 21, Capabilities({'MDTM': ''}, fetched=1.0))
+
+    # Tiến trình khác (cache mới) đọc lại từ file
+    other = FeatureCache(ttl=60)
+    assert other.get('ftp.example', 21).size
+    assert other.get('old.example', 21) is None  # Hết hạn
+    assert other.get('ftp.example', 2121) is None
+    other.invalidate('ftp.example', 21)
+    assert FeatureCache(ttl=60).get('ftp.example', 21) is None
+    # TTL = 0 tắt cache
+    assert FeatureCache(ttl=0).get('ftp.example', 21) is None
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_helpers_use_mlst_when_size_is_missing(temp_dir, ftp_session):
+    features = ['MLST type*;size*;modify*;', 'REST STREAM']
+    server_dir = os.path.join(temp_dir, 'server')
+    make_tree(server_dir, {'a.bin': PAYLOAD})
+    with LocalFTPServer(server_dir, features=features) as server:
+        ftp = ftp_session(server)
+        helpers = FTPHelpers(ftp)
+        assert helpers.remote_sizes(['a.bin', 'missing.bin']) == {'a.bin': len(PAYLOAD), 'missing.bin': None}
+        path = os.path.join(temp_dir, 'a.bin')
+        with open(path, 'wb') as f:
+            f.write(PAYLOAD[:1000])  # File tải dở
+        assert helpers._download_file('a.bin', path, 'binary')
+        ftp.quit()
+
+        # Không SIZE/MDTM nào bị gửi đi chỉ để nhận 502
+        assert server.commands['SIZE'] == server.commands['MDTM'] == 0
+        assert server.retr_log[-1][1] == 1000
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_mget_lists_with_mlsd(local_ftp_server, temp_dir, monkeypatch, ftp_session):
+    make_tree(local_ftp_server.root, {'a.bin': PAYLOAD, 'b.bin': PAYLOAD[:10], 'notes.txt': b'x', 'sub/c.bin': b'y'})
+    downloads = os.path.join(temp_dir, 'downloads')
+    monkeypatch.setattr(Config, 'DOWNLOAD_DIR', downloads)
+    monkeypatch.setattr(Config, 'STAT_LISTING', False)  # Kiểm tra MLSD qua kênh dữ liệu
+    client = FTPCommands(ftp_session())
+    client.connected = True
+    client.prompt_on_mget_mput = False
+    client.ftp_helpers = FTPHelpers(client.ftp)
+    client.do_mget('*.bin')
+    client.ftp.quit()
+
+    assert sorted(os.listdir(downloads)) == ['a.bin', 'b.bin']
+    assert local_ftp_server.commands['MLSD'] == 1
+    assert local_ftp_server.commands['NLST'] == local_ftp_server.commands['SIZE'] == 0
@@ -0,0 +1,86 @@
+"""
+Test keepalive NOOP trên kênh điều khiển nhàn rỗi
+"""
+
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.ftp_keepalive import Keepalive
+from client.core.ftp_stats import rtt_histogram
+from local_ftp_server import make_tree
+
+PAYLOAD = os.urandom(512 * 1024)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.mark.timeout(30)
+def test_idle_session_sends_noop_and_samples_rtt(local_ftp_server, ftp_session):
+    ftp = ftp_session()
+    before = rtt_histogram.count
+    keepalive = Keepalive(ftp, interval=0.1).start()
+    assert _wait_for(lambda: local_ftp_server.commands['NOOP'] >= 2)
+    assert keepalive.sent >= 2 and ftp.rtt is not None
+    assert rtt_histogram.count >= before + 2
+
+    ftp.quit()
+    assert not keepalive.running and ftp.keepalive is None
+
+
+@pytest.mark.timeout(30)
+def test_noop_waits_while_session_is_busy(local_ftp_server, temp_dir, ftp_session):
+    make_tree(local_ftp_server.root, {'data.bin': PAYLOAD})
+    ftp = ftp_session()
+    keepalive = Keepalive(ftp, interval=0.05).start()
+
+    # Đang giữ phiên (như một lần truyền dữ liệu): không có NOOP nào được gửi
+    with ftp.lock:
+        time.sleep(0.5)
+        assert local_ftp_server.commands['NOOP'] == 0
+    assert keepalive.skipped > 0
+
+    # Truyền chậm trong khi keepalive chạy: phản hồi không bị lệch
+    local_ftp_server.rate = 1024 * 1024
+    path = os.path.join(temp_dir, 'data.bin')
+    with open(path, 'wb') as f:
+        ftp.retrfile('RETR data.bin', f)
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert ftp.pwd() == '/'
+    assert _wait_for(lambda: local_ftp_server.commands['NOOP'] >= 1)
+    ftp.quit()
+
+
+@pytest.mark.timeout(30)
+def test_active_session_is_not_pinged(local_ftp_server, ftp_session):
+    ftp = ftp_session()
+    Keepalive(ftp, interval=0.3).start()
+    for _ in range(10):
+        ftp.pwd()
+        time.sleep(0.05)
+    assert local_ftp_server.commands['NOOP'] == 0
+    ftp.quit()
+
+
+@pytest.mark.timeout(30)
+def test_dropped_connection_stops_keepalive(local_ftp_server, ftp_session):
+    ftp = ftp_session()
+    keepalive = Keepalive(ftp, interval=0.05).start()
+    ftp.sock.shutdown(socket.SHUT_RDWR)
+    assert _wait_for(lambda: not keepalive.running)
+    assert keepalive.error is not None and keepalive.describe().startswith('stopped')
+    ftp.close()
@@ -0,0 +1,97 @@
+"""
+Test liệt kê thư mục (NLST/LIST dạng stream) với FTP server cục bộ
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP
+from client.core.config import Config
+from local_ftp_server import make_tree
+
+
+@pytest.fixture
+def ftp(local_ftp_server):
+    make_tree(local_ftp_server.root, {f'file{i:05d}.txt': b'' for i in range(3000)})
+    make_tree(local_ftp_server.root, {'sub/nested.txt': b'hello'})
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    yield ftp
+    ftp.quit()
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_streaming_listing_matches_full_listing(ftp):
+    names = list(ftp.iter_nlst())
+    assert names == ftp.nlst()
+    assert len(names) == 3001
+
+    lines = []
+    ftp.dir(lines.append)
+    assert lines == list(ftp.iter_dir())
+    assert lines[-1].endswith(' sub') and lines[-1].startswith('d')
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_abandoned_stream_leaves_session_usable(ftp):
+    stream = ftp.iter_dir()
+    first = next(stream)
+    assert first.endswith('file00000.txt')
+    stream.close()
+
+    # Phản hồi của lệnh LIST bị dừng đã được đọc, phiên vẫn đồng bộ
+    assert ftp.pwd() == '/'
+    ftp.cwd('sub')
+    assert ftp.nlst() == ['nested.txt']
+
+
+@pytest.mark.directory_ops
+def test_list_parser_handles_unix_and_dos_formats():
+    from client.core.ftp_listing import parse_list_line
+
+    unix = parse_list_line('-rw-r--r--   1 owner group     1048576 Jan 02  2023 report 2023.csv')
+    assert (unix.name, unix.type, unix.size) == ('report 2023.csv', 'file', 1048576)
+
+    link = parse_list_line('lrwxrwxrwx 1 owner group 7 Mar 04 10:15 latest -> data.bin')
+    assert (link.name, link.type) == ('latest', 'link')
+
+    dos_dir = parse_list_line('07-18-24  03:21PM       <DIR>          Backups')
+    assert (dos_dir.name, dos_dir.is_dir, dos_dir.size) == ('Backups', True, None)
+
+    dos_file = parse_list_line('07-18-24  09:05AM             12345 notes.txt')
+    assert (dos_file.name, dos_file.size) == ('notes.txt', 12345)
+    assert dos_file.modify_str('%Y-%m-%d %H:%M') != ''
+
+    assert parse_list_line('total 12') is None
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('features', [None, ()], ids=['mlsd', 'list-fallback'])
+def test_list_entries_with_and_without_mlsd(local_ftp_server, features, monkeypatch):
+    monkeypatch.setattr(Config, 'STAT_LISTING', False)  # Kiểm tra MLSD/LIST qua kênh dữ liệu
+    if features is not None:
+        local_ftp_server.features = list(features)
+    make_tree(local_ftp_server.root, {'a.bin': b'x' * 1234, 'dir1/b.txt': b'hi'})
+
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    try:
+        entries = {e.name: e for e in ftp.entries()}
+        assert set(entries) == {'a.bin', 'dir1'}
+        assert entries['a.bin'].size == 1234 and entries['a.bin'].is_file
+        assert entries['dir1'].is_dir
+        assert entries['a.bin'].modify is not None
+        if features is None:
+            assert entries['a.bin'].unique is not None
+            assert ftp.mlst('a.bin').size == 1234
+    finally:
+        ftp.quit()
@@ -0,0 +1,101 @@
+"""
+Test MODE Z: nén deflate trên kênh dữ liệu khi server quảng bá trong FEAT
+"""
+
+import io
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.ftp_helpers import FTPHelpers
+from client.core.config import Config
+from local_ftp_server import LocalFTPServer, make_tree
+
+# Log dạng văn bản, nén tốt như dữ liệu thật
+PAYLOAD = b''.join(b'2024-05-01 12:00:%02d INFO request id=%06d status=200 bytes=%d\n' % (i % 60, i, i * 7)
+                   for i in range(60000))
+
+
+@pytest.fixture
+def ftp(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, {'app.log': PAYLOAD})
+    ftp = ftp_session()
+    assert ftp.set_mode('Z', level=9)
+    yield ftp
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_download_is_decompressed(ftp, temp_dir):
+    path = os.path.join(temp_dir, 'app.log')
+    with open(path, 'wb') as f:
+        received = ftp.retrfile('RETR app.log', f, use_splice=True)
+
+    assert received == len(PAYLOAD)
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    stats = ftp.last_transfer
+    assert stats['mode'] == 'Z' and stats['wire_bytes'] * 5 < len(PAYLOAD)
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_uploads_are_compressed(ftp, local_ftp_server, temp_dir):
+    path = os.path.join(temp_dir, 'up.log')
+    with open(path, 'wb') as f:
+        f.write(PAYLOAD)
+    with open(path, 'rb') as f:
+        ftp.storfile('STOR up.log', f)  # File thường nhưng không dùng sendfile ở MODE Z
+    assert ftp.last_transfer['wire_bytes'] * 5 < len(PAYLOAD)
+    ftp.storbinary('STOR mem.log', io.BytesIO(PAYLOAD))
+
+    for name in ('up.log', 'mem.log'):
+        with open(os.path.join(local_ftp_server.root, name), 'rb') as f:
+            assert f.read() == PAYLOAD
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_listing_in_mode_z(ftp):
+    assert ftp.nlst() == ['app.log']
+    ftp.set_mode('S')
+    assert not ftp.compressed and ftp.nlst() == ['app.log']
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_resume_in_mode_z(ftp, local_ftp_server, temp_dir, monkeypatch):
+    monkeypatch.setattr(Config, 'TRANSFER_RETRIES', 0)
+    local_ftp_server.cut_after = len(PAYLOAD) // 2
+    path = os.path.join(temp_dir, 'app.log')
+    helpers = FTPHelpers(ftp)
+
+    assert not helpers._download_file('app.log', path, 'binary')
+    partial = os.path.getsize(path)
+    assert 0 < partial < len(PAYLOAD)
+
+    assert helpers._download_file('app.log', path, 'binary')
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert local_ftp_server.retr_log[-1][1] == partial
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_falls_back_when_server_lacks_mode_z(temp_dir, ftp_session):
+    features = [f for f in LocalFTPServer.DEFAULT_FEATURES if f != 'MODE Z']
+    make_tree(temp_dir, {'app.log': PAYLOAD})
+    with LocalFTPServer(temp_dir, features=features) as server:
+        ftp = ftp_session(server)
+        assert ftp.set_mode('Z') is False
+        assert not ftp.compressed
+        chunks = []
+        ftp.retrbinary('RETR app.log', chunks.append)
+        assert b''.join(chunks) == PAYLOAD
+        assert 'mode' not in ftp.last_transfer
+        ftp.quit()
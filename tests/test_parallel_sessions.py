@@ -0,0 +1,102 @@
+"""
+Test nhiều phiên FTP độc lập chạy song song trong cùng một tiến trình
+(dùng FTP server cục bộ trên loopback, không cần server thật)
+"""
+
+import io
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP
+from local_ftp_server import make_tree
+
+
+def open_session(server):
+    ftp = FTP()
+    ftp.connect(server.host, server.port, timeout=10)
+    ftp.login('user', 'secret')
+    return ftp
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_parallel_sessions_are_isolated(local_ftp_server):
+    """Mỗi phiên có thư mục làm việc và kết nối dữ liệu riêng"""
+    sessions_count = 6
+    for i in range(sessions_count):
+        os.makedirs(os.path.join(local_ftp_server.root, f'dir{i}'))
+
+    errors = []
+    barrier = threading.Barrier(sessions_count)
+
+    def worker(i):
+        try:
+            ftp = open_session(local_ftp_server)
+            barrier.wait()
+            ftp.cwd(f'dir{i}')
+            payload = os.urandom(50000 + i)
+            ftp.storbinary(f'STOR file{i}.bin', io.BytesIO(payload))
+            assert ftp.pwd() == f'/dir{i}'
+            assert ftp.nlst() == [f'file{i}.bin']
+
+            received = bytearray()
+            ftp.retrbinary(f'RETR file{i}.bin', received.extend)
+            assert bytes(received) == payload
+            assert ftp.size(f'file{i}.bin') == len(payload)
+            ftp.quit()
+        except Exception as e:
+            errors.append((i, e))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(20)
+
+    assert not errors, errors
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_shared_session_serializes_threads(local_ftp_server):
+    """Hai thread dùng chung một phiên không ghi xen kẽ lên cùng socket"""
+    content = os.urandom(2 * 1024 * 1024)
+    make_tree(local_ftp_server.root, {'big.bin': content, 'a.txt': b'a', 'b.txt': b'b'})
+
+    ftp = open_session(local_ftp_server)
+    errors = []
+    listings = []
+    received = bytearray()
+
+    def transfer():
+        try:
+            ftp.retrbinary('RETR big.bin', received.extend)
+        except Exception as e:
+            errors.append(e)
+
+    def browse():
+        try:
+            for _ in range(20):
+                lines = []
+                ftp.dir(lines.append)
+                listings.append(len(lines))
+                ftp.pwd()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=transfer), threading.Thread(target=browse)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(20)
+
+    assert not errors, errors
+    assert bytes(received) == content
+    assert listings == [3] * 20
+    ftp.quit()
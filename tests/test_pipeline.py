@@ -0,0 +1,51 @@
+"""
+Test pipeline lệnh điều khiển (DELE/SIZE/RNFR+RNTO hàng loạt) với FTP server cục bộ
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP, FTPPermError
+from local_ftp_server import make_tree
+
+
+@pytest.fixture
+def ftp(local_ftp_server):
+    make_tree(local_ftp_server.root, {f'f{i}.txt': b'x' * i for i in range(1, 41)})
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    yield ftp
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('depth', [1, 4, 64])
+def test_pipeline_matches_replies_in_order(ftp, depth):
+    names = [f'f{i}.txt' for i in range(1, 41)] + ['missing.txt']
+    sizes = ftp.size_many(names, max_in_flight=depth)
+    assert sizes == {**{f'f{i}.txt': i for i in range(1, 41)}, 'missing.txt': None}
+
+    # Phiên vẫn đồng bộ sau pipeline
+    assert ftp.pwd() == '/'
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_bulk_delete_and_rename_report_errors_per_command(ftp, local_ftp_server):
+    results = ftp.delete_many(['f1.txt', 'nope.txt', 'f2.txt'])
+    assert [r.ok for r in results] == [True, False, True]
+    assert isinstance(results[1].error, FTPPermError)
+
+    renamed = ftp.rename_many([('f3.txt', 'g3.txt'), ('nope.txt', 'g4.txt'), ('f5.txt', 'g5.txt')])
+    assert [r.ok for r in renamed] == [True, False, True]
+
+    remaining = set(os.listdir(local_ftp_server.root))
+    assert {'g3.txt', 'g5.txt'} <= remaining
+    assert not {'f1.txt', 'f2.txt', 'f3.txt', 'f5.txt', 'g4.txt'} & remaining
@@ -0,0 +1,157 @@
+"""
+Test tự kết nối lại khi mất kết nối điều khiển: khôi phục phiên, tải tiếp, lô nhiều file
+"""
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTPError
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_command import FTPCommands
+from client.core.ftp_keepalive import Keepalive
+from client.core.config import Config
+from local_ftp_server import LocalFTPServer, make_tree
+
+BIG = os.urandom(2 * 1024 * 1024)
+SMALL = {f'batch/f{i:02d}.bin': os.urandom(16 * 1024 + i) for i in range(20)}
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(Config, 'RECONNECT_DELAY', 0.01)
+    monkeypatch.setattr(Config, 'RECONNECT_DELAY_MAX', 0.05)
+
+
+@pytest.mark.timeout(30)
+def test_reconnect_replays_session_state(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, {'sub/a.txt': b'a'})
+    ftp = ftp_session()
+    ftp.cwd('sub')
+    assert ftp.pwd() == '/sub'
+    assert ftp.set_mode('Z')
+    ftp.set_pasv(False)
+    keepalive = Keepalive(ftp, interval=30).start()
+
+    local_ftp_server.drop_sessions()
+    with pytest.raises((OSError, EOFError)):
+        ftp.pwd()
+    assert not ftp.connected
+
+    ftp.reconnect()
+    assert ftp.connected and ftp.reconnects == 1
+    assert ftp.pwd() == '/sub' and ftp.compressed and not ftp.passive_mode
+    assert ftp.state['TYPE'] == 'I'
+    assert ftp.nlst() == ['a.txt']
+    assert ftp.keepalive is keepalive and keepalive.running
+    ftp.quit()
+
+
+@pytest.mark.timeout(30)
+def test_reconnect_backs_off_until_server_is_back(local_ftp_server, ftp_session):
+    ftp = ftp_session()
+    sessions = local_ftp_server.sessions
+    local_ftp_server.drop_sessions()
+    local_ftp_server.refuse = 2
+    ftp.reconnect(attempts=3)
+    assert local_ftp_server.sessions == sessions + 3 and ftp.pwd() == '/'
+
+    local_ftp_server.drop_sessions()
+    local_ftp_server.refuse = 5
+    with pytest.raises(FTPError):
+        ftp.reconnect(attempts=2)
+    assert not ftp.connected
+    local_ftp_server.refuse = 0
+
+
+@pytest.mark.timeout(30)
+def test_keepalive_survives_refused_reconnect_attempts(temp_dir, ftp_session):
+    server = LocalFTPServer(temp_dir).start()
+    ftp = ftp_session(server)
+    keepalive = Keepalive(ftp, interval=30).start()
+
+    # Server tắt hẳn (cổng bị từ chối), rồi chạy lại trên cùng cổng
+    server.drop_sessions()
+    server.stop()
+    restarted = []
+
+    def restart():
+        time.sleep(0.3)
+        restarted.append(LocalFTPServer(temp_dir, port=server.port).start())
+
+    threading.Thread(target=restart, daemon=True).start()
+    ftp.reconnect(attempts=40)
+    assert restarted and ftp.reconnects == 1 and ftp.pwd() == '/'
+    assert ftp.keepalive is keepalive and keepalive.running
+    ftp.quit()
+    restarted[0].stop()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_download_resumes_after_connection_loss(local_ftp_server, temp_dir, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'TRANSFER_RETRIES', 1)
+    make_tree(local_ftp_server.root, {'big.bin': BIG})
+    local_ftp_server.rate = 4 * 1024 * 1024
+    ftp = ftp_session()
+    path = os.path.join(temp_dir, 'big.bin')
+
+    timer = threading.Timer(0.2, local_ftp_server.drop_sessions)
+    timer.start()
+    try:
+        assert FTPHelpers(ftp)._download_file('big.bin', path, 'binary')
+    finally:
+        timer.cancel()
+
+    with open(path, 'rb') as f:
+        assert f.read() == BIG
+    assert ftp.reconnects == 1
+    assert len(local_ftp_server.retr_log) == 2 and local_ftp_server.retr_log[-1][1] > 0
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(60)
+def test_batch_survives_server_restarts(local_ftp_server, temp_dir, ftp_session):
+    make_tree(local_ftp_server.root, SMALL)
+    ftp = ftp_session()
+    ftp.cwd('batch')
+    helpers = FTPHelpers(ftp)
+    down_dir = os.path.join(temp_dir, 'down')
+    os.makedirs(down_dir)
+
+    for i, rel in enumerate(sorted(SMALL)):
+        if i in (5, 12):
+            local_ftp_server.drop_sessions()
+            local_ftp_server.refuse = 1
+        name = os.path.basename(rel)
+        assert helpers._download_file(name, os.path.join(down_dir, name), 'binary')
+        assert helpers._upload_file(os.path.join(down_dir, name), f'copy-{name}', 'binary')
+
+    for rel, content in SMALL.items():
+        name = os.path.basename(rel)
+        with open(os.path.join(local_ftp_server.root, 'batch', f'copy-{name}'), 'rb') as f:
+            assert f.read() == content
+    assert ftp.reconnects == 2 and ftp.pwd() == '/batch'
+    ftp.quit()
+
+
+@pytest.mark.timeout(30)
+def test_cli_retries_read_only_command_after_reconnect(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, {'sub/a.txt': b'a'})
+    ftp = ftp_session()
+    ftp.cwd('sub')
+    client = FTPCommands(ftp)
+    client.connected = True
+
+    local_ftp_server.drop_sessions()
+    ftp.broken = True  # Như sau một lệnh trước đó đã gặp lỗi kết nối
+    assert client._ftp_cmd(ftp.pwd) == '/sub'
+    assert ftp.reconnects == 1 and client.connected
+    ftp.quit()
@@ -0,0 +1,139 @@
+"""
+Test tải tiếp download (REST + RETR) và upload (REST + STOR / APPE) khi truyền dở
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP
+from client.core.ftp_helpers import FTPHelpers
+from local_ftp_server import make_tree
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MiB, nội dung không lặp theo block
+CUT = 300000
+
+
+@pytest.fixture
+def helpers(local_ftp_server):
+    make_tree(local_ftp_server.root, {'big.bin': PAYLOAD})
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    yield FTPHelpers(ftp)
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_cut_transfer_fetches_only_missing_bytes(helpers, local_ftp_server, temp_dir):
+    local_path = os.path.join(temp_dir, 'big.bin')
+    local_ftp_server.cut_after = CUT
+    progress = []
+
+    assert helpers._download_file('big.bin', local_path, 'binary',
+                                  progress_callback=lambda done, total: progress.append(done))
+
+    with open(local_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    # Lần đầu bị cắt sau CUT byte, lần thử lại chỉ lấy phần còn thiếu
+    assert local_ftp_server.retr_log == [('/big.bin', 0, CUT), ('/big.bin', CUT, len(PAYLOAD) - CUT)]
+    assert progress[-1] == len(PAYLOAD)
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_partial_file_from_previous_run_is_resumed(helpers, local_ftp_server, temp_dir):
+    local_path = os.path.join(temp_dir, 'big.bin')
+    with open(local_path, 'wb') as f:
+        f.write(PAYLOAD[:CUT])
+
+    assert helpers._download_file('big.bin', local_path, 'binary')
+    with open(local_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert local_ftp_server.retr_log == [('/big.bin', CUT, len(PAYLOAD) - CUT)]
+
+    # File đã đủ: không tải lại
+    assert helpers._download_file('big.bin', local_path, 'binary')
+    assert len(local_ftp_server.retr_log) == 1
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_remote_change_restarts_from_zero(helpers, local_ftp_server, temp_dir):
+    local_path = os.path.join(temp_dir, 'big.bin')
+    with open(local_path, 'wb') as f:
+        f.write(b'stale content')
+    # File từ xa được sửa sau khi file cục bộ được ghi
+    future = time.time() + 120
+    os.utime(os.path.join(local_ftp_server.root, 'big.bin'), (future, future))
+
+    assert helpers._download_file('big.bin', local_path, 'binary')
+    with open(local_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert local_ftp_server.retr_log == [('/big.bin', 0, len(PAYLOAD))]
+
+
+@pytest.fixture
+def local_payload(temp_dir):
+    path = os.path.join(temp_dir, 'upload.bin')
+    with open(path, 'wb') as f:
+        f.write(PAYLOAD)
+    return path
+
+
+def _server_bytes(server, name):
+    with open(os.path.join(server.root, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize('features,command', [
+    (('SIZE', 'REST STREAM'), 'REST+STOR'),
+    (('SIZE',), 'APPE'),
+])
+def test_resume_upload_sends_only_missing_bytes(local_ftp_server, local_payload, features, command):
+    local_ftp_server.features = list(features)
+    make_tree(local_ftp_server.root, {'upload.bin': PAYLOAD[:CUT]})
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    progress = []
+    try:
+        assert FTPHelpers(ftp)._upload_file(local_payload, 'upload.bin', 'binary', resume=True,
+                                            progress_callback=lambda done, total: progress.append(done))
+    finally:
+        ftp.quit()
+
+    assert _server_bytes(local_ftp_server, 'upload.bin') == PAYLOAD
+    assert local_ftp_server.stor_log == [('/upload.bin', CUT, len(PAYLOAD) - CUT)]
+    # Tiến độ bắt đầu từ offset đã có trên server
+    assert progress[0] == CUT and progress[-1] == len(PAYLOAD)
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_upload_retry_resumes_after_cut(helpers, local_ftp_server, local_payload):
+    local_ftp_server.cut_after = CUT
+
+    assert helpers._upload_file(local_payload, 'upload.bin', 'binary')
+
+    assert _server_bytes(local_ftp_server, 'upload.bin') == PAYLOAD
+    assert local_ftp_server.stor_log == [('/upload.bin', 0, CUT), ('/upload.bin', CUT, len(PAYLOAD) - CUT)]
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_upload_without_resume_overwrites(helpers, local_ftp_server, local_payload):
+    make_tree(local_ftp_server.root, {'upload.bin': b'x' * CUT})
+
+    assert helpers._upload_file(local_payload, 'upload.bin', 'binary')
+
+    assert _server_bytes(local_ftp_server, 'upload.bin') == PAYLOAD
+    assert local_ftp_server.stor_log == [('/upload.bin', 0, len(PAYLOAD))]
@@ -0,0 +1,178 @@
+"""
+Test chính sách thử lại lỗi 4xx: backoff ngẫu nhiên, ngân sách thử lại, giảm số phiên khi server báo quá tải
+"""
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTPTempError, FTPPermError
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_command import FTPCommands
+from client.core.ftp_pool import SessionPool
+from client.core.ftp_retry import RetryBudget, RetryPolicy, retry_budget, retry_policies
+from client.core.config import Config
+from local_ftp_server import make_tree
+
+PAYLOAD = os.urandom(128 * 1024)
+
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(Config, 'RETRY_BASE_DELAY', 0.01)
+
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy('test', attempts=10, base_delay=0.1, max_delay=0.5)
+    for retry in range(8):
+        delays = [policy.delay(retry) for _ in range(200)]
+        assert all(0 <= d <= min(0.5, 0.1 * 2 ** retry) for d in delays)
+        assert len(set(delays)) > 1
+
+
+def test_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw() and budget.denied == 1
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw() and not budget.withdraw()
+
+    calls = []
+
+    def busy():
+        calls.append(1)
+        raise FTPTempError('450 busy')
+
+    policy = RetryPolicy('test', attempts=5, base_delay=0, budget=RetryBudget(ratio=0, reserve=1))
+    with pytest.raises(FTPTempError):
+        policy.call(busy)
+    assert len(calls) == 2  # Lần đầu + một lần thử lại còn trong ngân sách
+
+
+def test_only_transient_errors_are_retried():
+    policy = RetryPolicy('test', attempts=3, base_delay=0)
+    for error in (FTPPermError('550 no such file'), FTPTempError('426 transfer aborted')):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise error
+
+        with pytest.raises(type(error)):
+            policy.call(fail)
+        assert len(calls) == 1
+
+
+@pytest.mark.timeout(30)
+def test_cli_retries_listing_and_control(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, {'a.txt': b'a'})
+    ftp = ftp_session()
+    client = FTPCommands(ftp)
+    client.connected = True
+    listing = retry_policies['listing'].retries
+    control = retry_policies['control'].retries
+
+    local_ftp_server.transient['NLST'] = 2
+    assert client._ftp_cmd(ftp.nlst) == ['a.txt']
+    local_ftp_server.transient['MKD'] = 1
+    assert client._ftp_cmd(ftp.mkd, 'new') == '/new'
+    assert retry_policies['listing'].retries == listing + 2
+    assert retry_policies['control'].retries == control + 1
+
+    # Hết lượt thử lại: lỗi được báo như trước (không raise ra ngoài _ftp_cmd)
+    local_ftp_server.transient['NLST'] = Config.RETRY_LISTING_ATTEMPTS + 1
+    assert client._ftp_cmd(ftp.nlst) is None
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_transfer_retry_counts_in_stats(local_ftp_server, temp_dir, records, ftp_session):
+    make_tree(local_ftp_server.root, {'data.bin': PAYLOAD})
+    ftp = ftp_session()
+    helpers = FTPHelpers(ftp)
+    path = os.path.join(temp_dir, 'data.bin')
+
+    local_ftp_server.transient['RETR'] = 1
+    assert helpers._download_file('data.bin', path, 'binary')
+    local_ftp_server.transient['STOR'] = 2
+    assert helpers._upload_file(path, 'copy.bin', 'binary')
+
+    download, upload = records
+    assert download.retries == 1 and upload.retries == 2
+    assert download.retry_wait > 0 and 'backoff' in upload.summary()
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_exhausted_budget_stops_retry_storm(local_ftp_server, temp_dir, records, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'RETRY_BUDGET_RESERVE', 1)
+    monkeypatch.setattr(Config, 'RETRY_BUDGET_RATIO', 0)
+    retry_budget.reset()
+    make_tree(local_ftp_server.root, {'a.bin': PAYLOAD, 'b.bin': PAYLOAD})
+    ftp = ftp_session()
+    helpers = FTPHelpers(ftp)
+
+    local_ftp_server.transient['RETR'] = 10
+    assert not helpers._download_file('a.bin', os.path.join(temp_dir, 'a.bin'), 'binary')
+    assert not helpers._download_file('b.bin', os.path.join(temp_dir, 'b.bin'), 'binary')
+    # Một lần thử lại trong ngân sách, sau đó mỗi file chỉ được thử một lần
+    assert local_ftp_server.commands['RETR'] == 3
+    assert retry_budget.denied == 2
+    ftp.quit()
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_pool_shrinks_on_too_many_connections(local_ftp_server):
+    make_tree(local_ftp_server.root, {'a.txt': b'a'})
+    local_ftp_server.max_sessions = 2
+    pool = SessionPool(local_ftp_server.host, local_ftp_server.port, 'user', 'secret', min_size=0, max_size=4)
+    results = []
+
+    def work():
+        with pool.session() as ftp:
+            results.append(ftp.nlst())
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pool.close()
+
+    assert results == [['a.txt']] * 4
+    assert pool.max_size == 2 and pool.limited >= 1
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_pool_limit_is_lifted_after_cooldown(local_ftp_server):
+    local_ftp_server.max_sessions = 1
+    pool = SessionPool(local_ftp_server.host, local_ftp_server.port, 'user', 'secret', min_size=0, max_size=4,
+                       limit_cooldown=0.5)
+    first = pool.acquire()
+    second = []
+    threading.Thread(target=lambda: second.append(pool.acquire()), daemon=True).start()
+    time.sleep(0.2)
+    assert pool.max_size == 1 and pool.limited == 1 and not second  # Chờ phiên đầu được trả lại
+
+    # Server hết quá tải: sau thời gian giới hạn, pool mở thêm phiên thay vì chờ mãi
+    local_ftp_server.max_sessions = 0
+    time.sleep(0.8)
+    assert second and pool.max_size == pool.configured_max == 4
+    sessions = [second[0]] + [pool.acquire(timeout=5) for _ in range(2)]
+    assert pool.size == 4
+    for ftp in [first] + sessions:
+        pool.release(ftp)
+    pool.close()
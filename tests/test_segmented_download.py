@@ -0,0 +1,84 @@
+"""
+Test tải phân đoạn song song (nhiều phiên REST + RETR) với FTP server cục bộ
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_segmented import split_ranges, is_unfinished
+from client.core.config import Config
+from local_ftp_server import make_tree, kill_download
+
+PAYLOAD = os.urandom(1024 * 1024 + 7)  # Không chia hết cho số đoạn
+
+
+@pytest.fixture
+def helpers(local_ftp_server, monkeypatch):
+    monkeypatch.setattr(Config, 'SEGMENTED_DOWNLOAD_THRESHOLD', 1024)
+    make_tree(local_ftp_server.root, {'big.bin': PAYLOAD})
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    yield FTPHelpers(ftp)
+    ftp.quit()
+
+
+@pytest.mark.file_ops
+def test_split_ranges_covers_file():
+    ranges = split_ranges(10, 3)
+    assert ranges == [(0, 3), (3, 6), (6, 10)]
+    assert split_ranges(2, 8) == [(0, 1), (1, 2)]
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_segments_are_fetched_in_parallel_ranges(helpers, local_ftp_server, temp_dir):
+    local_path = os.path.join(temp_dir, 'big.bin')
+    progress = []
+
+    assert helpers._download_file('big.bin', local_path, 'binary', segments=4,
+                                  progress_callback=lambda done, total: progress.append(done))
+
+    with open(local_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    offsets = sorted(offset for _, offset, _ in local_ftp_server.retr_log)
+    assert offsets == [start for start, _ in split_ranges(len(PAYLOAD), 4)]
+    assert progress[-1] == len(PAYLOAD)
+    # Phiên chính vẫn dùng được sau khi các phiên phụ đã đóng
+    assert helpers.ftp.pwd() == '/'
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_failed_segment_falls_back_to_resume(helpers, local_ftp_server, temp_dir):
+    local_path = os.path.join(temp_dir, 'big.bin')
+    local_ftp_server.cut_after = 1000  # Một trong các đoạn bị cắt
+
+    assert helpers._download_file('big.bin', local_path, 'binary', segments=4)
+
+    with open(local_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(60)
+def test_killed_segmented_download_is_not_trusted(helpers, local_ftp_server, temp_dir):
+    local_path = os.path.join(temp_dir, 'big.bin')
+    local_ftp_server.rate = 256 * 1024
+    kill_download(local_ftp_server, 'big.bin', local_path, segments=4)
+
+    # File đã được cấp phát đủ kích thước nhưng còn lỗ: lần get sau phải tải lại từ đầu
+    assert os.path.getsize(local_path) == len(PAYLOAD) and is_unfinished(local_path)
+    local_ftp_server.rate = 0
+    retr = local_ftp_server.commands['RETR']
+    assert helpers._download_file('big.bin', local_path, 'binary', segments=4)
+    with open(local_path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert local_ftp_server.commands['RETR'] == retr + 4 and not is_unfinished(local_path)
@@ -0,0 +1,116 @@
+"""
+Test pool phiên FTP đã đăng nhập với FTP server cục bộ
+"""
+
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP, FTPTempError, FTPPermError
+from client.core.ftp_pool import SessionPool
+from client.core.ftp_helpers import FTPHelpers
+from client.core.config import Config
+from local_ftp_server import make_tree
+
+
+@pytest.fixture
+def pool(local_ftp_server):
+    make_tree(local_ftp_server.root, {'sub/a.txt': b'a', 'big.bin': os.urandom(256 * 1024)})
+    pool = SessionPool(local_ftp_server.host, local_ftp_server.port, 'user', 'secret',
+                       min_size=0, max_size=2, timeout=10)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_session_is_reused_and_state_restored(pool):
+    with pool.session() as ftp:
+        ftp.cwd('sub')
+        ftp.voidcmd('TYPE A')
+        first = ftp
+
+    with pool.session() as ftp:
+        assert ftp is first
+        assert ftp.pwd() == '/'
+        assert ftp.state['TYPE'] == 'I'
+
+    with pool.session(cwd='sub') as ftp:
+        assert ftp.nlst() == ['a.txt']
+    assert pool.created == 1
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_pool_never_exceeds_max_size(pool):
+    barrier = threading.Barrier(3)
+    release = threading.Event()
+
+    def hold():
+        with pool.session():
+            barrier.wait()
+            release.wait(10)
+
+    threads = [threading.Thread(target=hold) for _ in range(2)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    with pytest.raises(FTPTempError):
+        pool.acquire(timeout=0.2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert pool.size == 2 and pool.idle == 2
+    assert pool.created == 2
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_broken_sessions_are_recycled(pool):
+    pool.idle_check = 0
+    with pool.session() as ftp:
+        broken = ftp
+    broken.sock.close()  # Kết nối chết khi đang nhàn rỗi
+
+    with pool.session() as ftp:
+        assert ftp is not broken
+        assert ftp.pwd() == '/'
+    assert pool.created == 2 and pool.size == 1
+
+    # Lỗi mất kết nối trong khối with: phiên bị đóng thay vì trả lại pool
+    with pytest.raises(EOFError):
+        with pool.session():
+            raise EOFError('connection lost')
+    assert pool.size == 0
+
+    # Lỗi 5xx không làm hỏng phiên
+    with pytest.raises(FTPPermError):
+        with pool.session() as ftp:
+            ftp.cwd('missing')
+    assert pool.size == 1 and pool.idle == 1
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_segmented_downloads_borrow_pooled_sessions(pool, local_ftp_server, temp_dir, monkeypatch):
+    monkeypatch.setattr(Config, 'SEGMENTED_DOWNLOAD_THRESHOLD', 1024)
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    helpers = FTPHelpers(ftp, pool=pool)
+    try:
+        for i in range(3):
+            local_path = os.path.join(temp_dir, f'big{i}.bin')
+            assert helpers._download_file('big.bin', local_path, 'binary', segments=2)
+            assert os.path.getsize(local_path) == 256 * 1024
+    finally:
+        ftp.quit()
+
+    # Đăng nhập chỉ tốn một lần cho mỗi phiên phụ, không phải mỗi lần tải
+    assert pool.created == 2
@@ -0,0 +1,84 @@
+"""
+Test tinh chỉnh socket (TCP_NODELAY, bộ đệm dữ liệu) và kích thước block tự điều chỉnh
+"""
+
+import os
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP
+from client.core.ftp_tuning import BlockSizer, SAMPLE_CALLS
+from client.core.config import Config
+from local_ftp_server import make_tree
+
+PAYLOAD = os.urandom(8 * 1024 * 1024 + 17)
+
+
+@pytest.fixture
+def ftp(local_ftp_server):
+    make_tree(local_ftp_server.root, {'data.bin': PAYLOAD})
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    ftp.voidcmd('TYPE I')
+    yield ftp
+    ftp.quit()
+
+
+@pytest.mark.session
+@pytest.mark.timeout(30)
+def test_control_socket_has_nagle_disabled(ftp):
+    assert ftp.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_download_grows_block_and_reports_stats(ftp):
+    chunks = []
+    ftp.retrbinary('RETR data.bin', chunks.append)
+
+    assert b''.join(chunks) == PAYLOAD
+    stats = ftp.last_transfer
+    assert stats['command'] == 'RETR' and stats['bytes'] == len(PAYLOAD)
+    assert stats['adaptive']
+    assert Config.BLOCK_SIZE_MIN <= stats['block_size'] <= Config.BLOCK_SIZE_MAX
+    # Block có thể đã thử lớn hơn rồi quay lại nếu thông lượng không tăng
+    assert max(len(c) for c in chunks) <= Config.BLOCK_SIZE_MAX
+    assert stats['rcvbuf'] > 0 and ftp.rtt is not None
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_fixed_block_size_override(ftp, monkeypatch):
+    monkeypatch.setattr(Config, 'FIXED_BLOCK_SIZE', 16384)
+    chunks = []
+    ftp.retrbinary('RETR data.bin', chunks.append)
+
+    assert b''.join(chunks) == PAYLOAD
+    assert max(len(c) for c in chunks) <= 16384
+    assert ftp.last_transfer['block_size'] == 16384 and not ftp.last_transfer['adaptive']
+
+
+def test_block_sizer_grows_on_full_reads_and_bdp():
+    sizer = BlockSizer(minimum=65536, maximum=1024 * 1024)
+    for _ in range(SAMPLE_CALLS):
+        sizer.update(sizer.size, full=True)
+    assert sizer.size == 131072
+
+    # Thông lượng x RTT lớn: nhảy thẳng lên lũy thừa của 2 phủ được BDP
+    sizer = BlockSizer(rtt=10.0, minimum=65536, maximum=1024 * 1024)
+    sizer._start -= 10.0
+    for _ in range(SAMPLE_CALLS):
+        sizer.update(65536 + 1)  # BDP ~ 8 x 64 KiB + 8 byte
+    assert sizer.size == 1024 * 1024
+
+    # Các lần đọc không đầy và RTT nhỏ: giữ nguyên
+    sizer = BlockSizer(minimum=65536, maximum=1024 * 1024)
+    for _ in range(SAMPLE_CALLS):
+        sizer.update(100)
+    assert sizer.size == 65536
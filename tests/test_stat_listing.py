@@ -0,0 +1,159 @@
+"""
+Test liệt kê thư mục qua STAT trên kênh điều khiển (server không có MLSD): chọn cách nhanh hơn, quay về LIST
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTPPermError
+from client.core.config import Config
+from local_ftp_server import LocalFTPServer, make_tree
+
+TREE = {'a.bin': b'x' * 1234, 'dir1/b.txt': b'hi', 'dir1/deep/c.txt': b'c', 'dir2/d.txt': b'dd'}
+NO_MLSD = [f for f in LocalFTPServer.DEFAULT_FEATURES if not f.startswith('MLST')]
+
+
+@pytest.fixture(autouse=True)
+def no_mlsd(local_ftp_server):
+    local_ftp_server.features = NO_MLSD
+
+
+def _walk(ftp, path='/'):
+    found = []
+    for entry in ftp.entries(path):
+        full = f"{path.rstrip('/')}/{entry.name}"
+        found.append(full)
+        if entry.is_dir:
+            found += _walk(ftp, full)
+    return found
+
+
+def _summary(entries):
+    return sorted((e.name, e.type, e.size) for e in entries)
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_faster_method_is_chosen_per_server(local_ftp_server, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'STAT_LISTING_PROBE', 0)
+    make_tree(local_ftp_server.root, TREE)
+    local_ftp_server.latency = 0.02  # Mỗi lệnh thêm một "RTT": STAT cần 1, LIST cần EPSV + LIST
+    ftp = ftp_session()
+
+    by_stat = ftp.entries()   # Lần đầu đo STAT
+    by_data = ftp.entries()   # Lần hai đo kênh dữ liệu
+    assert local_ftp_server.commands['STAT'] == local_ftp_server.commands['LIST'] == 1
+    assert _summary(by_stat) == _summary(by_data)
+    assert {e.name for e in by_stat} == {'a.bin', 'dir1', 'dir2'}
+
+    times = ftp.feat().listing_times
+    assert times['STAT'] < times['DATA']
+    for _ in range(3):
+        ftp.entries('dir1')
+    assert local_ftp_server.commands['STAT'] == 4 and local_ftp_server.commands['LIST'] == 1
+
+    # CLI ls: cùng các dòng như LIST
+    lines = []
+    ftp.dir('dir1', lines.append)
+    assert lines == list(ftp.iter_dir('dir1'))
+    ftp.quit()
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_servers_without_stat_listing_fall_back(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, TREE)
+    local_ftp_server.stat_listing = False
+    ftp = ftp_session()
+    assert {e.name for e in ftp.entries()} == {'a.bin', 'dir1', 'dir2'}
+    assert ftp.feat().listing_times['STAT'] is None
+    ftp.entries('dir1')
+    assert local_ftp_server.commands['STAT'] == 1 and local_ftp_server.commands['LIST'] == 2
+    ftp.quit()
+
+    # Phiên sau tới cùng server dùng kết quả đã ghi nhớ (feature_cache): không thử STAT nữa
+    ftp = ftp_session()
+    ftp.entries()
+    assert local_ftp_server.commands['STAT'] == 1
+    ftp.quit()
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_large_directories_use_data_channel(local_ftp_server, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'STAT_LISTING_MAX_ENTRIES', 5)
+    make_tree(local_ftp_server.root, {f'big/f{i:02d}': b'' for i in range(10)})
+    ftp = ftp_session()
+    ftp.feat().listing_times.update({'STAT': 0.001, 'DATA': 0.01})
+
+    assert len(ftp.entries('big')) == 10
+    assert len(ftp.entries('big')) == 10
+    assert local_ftp_server.commands['STAT'] == local_ftp_server.commands['LIST'] == 1
+    ftp.entries()  # Thư mục nhỏ vẫn qua STAT
+    assert local_ftp_server.commands['STAT'] == 2
+    ftp.quit()
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_recursive_walk_halves_round_trips(local_ftp_server, monkeypatch, ftp_session):
+    monkeypatch.setattr(Config, 'STAT_LISTING_PROBE', 0)
+    make_tree(local_ftp_server.root, {f'd{i}/e{j}/f.txt': b'f' for i in range(4) for j in range(3)})
+    ftp = ftp_session()
+    ftp.feat()
+
+    monkeypatch.setattr(Config, 'STAT_LISTING', False)
+    before = sum(local_ftp_server.commands.values())
+    by_data = _walk(ftp)
+    data_commands = sum(local_ftp_server.commands.values()) - before
+
+    monkeypatch.setattr(Config, 'STAT_LISTING', True)
+    ftp.feat().listing_times.update({'STAT': 0.001, 'DATA': 0.01})
+    before = sum(local_ftp_server.commands.values())
+    by_stat = _walk(ftp)
+    stat_commands = sum(local_ftp_server.commands.values()) - before
+
+    assert sorted(by_stat) == sorted(by_data) and len(by_stat) == 4 + 12 + 12
+    assert stat_commands * 2 <= data_commands
+    ftp.quit()
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_servers_with_mlsd_do_not_use_stat(local_ftp_server, ftp_session):
+    local_ftp_server.features = list(LocalFTPServer.DEFAULT_FEATURES)
+    make_tree(local_ftp_server.root, TREE)
+    ftp = ftp_session()
+    for _ in range(3):
+        assert {e.name for e in ftp.entries()} == {'a.bin', 'dir1', 'dir2'}
+    lines = []
+    ftp.dir(lines.append)
+    assert local_ftp_server.commands['STAT'] == 0 and local_ftp_server.commands['MLSD'] == 3
+    assert len(lines) == 3
+    ftp.quit()
+
+
+@pytest.mark.directory_ops
+@pytest.mark.timeout(30)
+def test_missing_path_still_raises(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, TREE)
+    os.makedirs(os.path.join(local_ftp_server.root, 'empty'))
+    ftp = ftp_session()
+    ftp.feat().listing_times.update({'STAT': 0.001, 'DATA': 0.01})
+
+    with pytest.raises(FTPPermError, match='550'):
+        ftp.entries('missing')
+    with pytest.raises(FTPPermError, match='550'):
+        ftp.dir('missing', lambda line: None)
+    assert ftp.feat().listing_times['STAT'] == 0.001  # 550 không làm tắt STAT
+
+    # Thư mục rỗng: lần đầu xác nhận qua kênh dữ liệu, sau đó STAT rỗng là đáng tin
+    assert ftp.entries('empty') == [] and local_ftp_server.commands['LIST'] == 3
+    assert ftp.entries('empty') == [] and local_ftp_server.commands['LIST'] == 3
+    assert local_ftp_server.commands['STAT'] == 4
+    ftp.quit()
@@ -0,0 +1,108 @@
+"""
+Test thống kê từng lần truyền file và bus sự kiện
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.ftp_helpers import FTPHelpers
+from client.core.ftp_command import FTPCommands
+from client.core.ftp_stats import EventBus, TRANSFER, bus
+from client.core.config import Config
+from local_ftp_server import make_tree
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 7)
+
+
+@pytest.fixture
+def ftp(local_ftp_server, ftp_session):
+    make_tree(local_ftp_server.root, {'data.bin': PAYLOAD})
+    ftp = ftp_session()
+    yield ftp
+    ftp.quit()
+
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_download_publishes_stats(ftp, temp_dir, records):
+    assert FTPHelpers(ftp)._download_file('data.bin', os.path.join(temp_dir, 'data.bin'), 'binary')
+
+    [record] = records
+    assert record.ok and record.error is None
+    assert record.direction == 'download' and record.remote_path == 'data.bin'
+    assert record.bytes == len(PAYLOAD) and record.retries == 0
+    assert 0 <= record.connect_time <= record.ttfb <= record.seconds
+    assert 0 < record.mean_bps <= record.peak_bps
+    assert bus.recent(TRANSFER)[-1] is record
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_retries_are_counted(ftp, local_ftp_server, temp_dir, records, monkeypatch):
+    monkeypatch.setattr(Config, 'TRANSFER_RETRIES', 1)
+    local_ftp_server.cut_after = 1024 * 1024
+    assert FTPHelpers(ftp)._download_file('data.bin', os.path.join(temp_dir, 'data.bin'), 'binary')
+
+    [record] = records
+    assert record.ok and record.retries == 1
+    # Lần thử đầu được 1 MiB, lần sau tải tiếp phần còn lại
+    assert record.bytes == len(PAYLOAD)
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_failed_transfer_is_published(ftp, temp_dir, records):
+    assert not FTPHelpers(ftp)._download_file('missing.bin', os.path.join(temp_dir, 'missing.bin'), 'binary')
+
+    [record] = records
+    assert not record.ok and record.error
+    assert record.bytes == 0 and record.connect_time is None
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_stalls_and_upload_stats(ftp, local_ftp_server, temp_dir, records, monkeypatch):
+    monkeypatch.setattr(Config, 'STALL_THRESHOLD', 0.05)
+    make_tree(local_ftp_server.root, {'slow.bin': PAYLOAD[:512 * 1024]})
+    local_ftp_server.rate = 640 * 1024  # Mỗi block 64 KiB cách nhau ~0.1 giây
+    path = os.path.join(temp_dir, 'slow.bin')
+    assert FTPHelpers(ftp)._download_file('slow.bin', path, 'binary')
+    local_ftp_server.rate = 0
+    assert FTPHelpers(ftp)._upload_file(path, 'copy.bin', 'binary')
+
+    download, upload = records
+    assert download.stalls >= 3
+    assert upload.ok and upload.direction == 'upload' and upload.bytes == 512 * 1024
+
+
+def test_event_bus_isolates_failing_subscribers():
+    events = EventBus(history=2)
+    seen = []
+
+    def broken(event):
+        raise RuntimeError('boom')
+
+    events.subscribe('topic', broken)
+    events.subscribe('topic', seen.append)
+    for i in range(3):
+        events.publish('topic', i)
+    events.unsubscribe('topic', seen.append)
+    events.publish('topic', 3)
+
+    assert seen == [0, 1, 2]
+    assert events.recent('topic') == [2, 3]
+
+
+@pytest.mark.timeout(30)
+def test_cli_stats_command(ftp, temp_dir, records, capsys):
+    FTPHelpers(ftp)._download_file('data.bin', os.path.join(temp_dir, 'data.bin'), 'binary')
+    FTPCommands(ftp).do_stats('1')
+
+    out = capsys.readouterr().out
+    assert 'download data.bin: 3.00 MiB' in out and 'transfers (0 failed)' in out
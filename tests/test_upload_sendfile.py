@@ -0,0 +1,57 @@
+"""
+Test upload binary qua sendfile (zero-copy) và đường dự phòng đọc theo block
+"""
+
+import io
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client.core.raw_socket_ftp import FTP
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 123)
+
+
+@pytest.fixture
+def ftp(local_ftp_server):
+    ftp = FTP()
+    ftp.connect(local_ftp_server.host, local_ftp_server.port, timeout=10)
+    ftp.login('user', 'secret')
+    ftp.voidcmd('TYPE I')
+    yield ftp
+    ftp.quit()
+
+
+def _server_bytes(server, name):
+    with open(os.path.join(server.root, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_regular_file_is_sent_in_slices(ftp, local_ftp_server, temp_dir):
+    path = os.path.join(temp_dir, 'up.bin')
+    with open(path, 'wb') as f:
+        f.write(PAYLOAD)
+
+    counts = []
+    with open(path, 'rb') as f:
+        ftp.storfile('STOR up.bin', f, counts.append, slice_size=1024 * 1024)
+
+    assert _server_bytes(local_ftp_server, 'up.bin') == PAYLOAD
+    # Tiến độ theo từng lát 1 MiB thay vì từng block 8 KiB
+    assert counts == [1024 * 1024] * 3 + [123]
+
+
+@pytest.mark.file_ops
+@pytest.mark.timeout(30)
+def test_non_file_source_falls_back_to_buffered_path(ftp, local_ftp_server):
+    counts = []
+    ftp.storfile('STOR mem.bin', io.BytesIO(PAYLOAD), counts.append)
+
+    assert _server_bytes(local_ftp_server, 'mem.bin') == PAYLOAD
+    assert sum(counts) == len(PAYLOAD)